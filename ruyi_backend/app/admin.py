@@ -1,37 +1,32 @@
 import datetime
-import sys
-import traceback
 
 from fastapi import APIRouter
-from sqlalchemy.sql.expression import select
-from sqlalchemy.sql.expression import update
-
-from ..cache import (
-    DICacheStore,
-    KEY_GITHUB_ORG_STATS_RUYISDK,
-    KEY_GITHUB_RELEASE_STATS,
-    KEY_GITHUB_RELEASE_STATS_RUYI_IDE_ECLIPSE,
-    KEY_GITHUB_RELEASE_STATS_RUYI_IDE_VSCODE,
-    KEY_PYPI_DOWNLOAD_TOTAL_PM,
-    KEY_TELEMETRY_DATA_LAST_PROCESSED,
+
+from ..cache import DICacheStore
+from ..components.admin_jobs import (
+    process_telemetry,
+    refresh_dashboard,
+    refresh_github_stats,
+    refresh_pypi_stats,
 )
 from ..components.auth import DIAdmin
-from ..components.frontend_dashboard_processor import crunch_and_cache_dashboard_numbers
 from ..components.news_items import refresh_news_items
-from ..components.pypi_stats import (
-    fetch_pypi_download_stats,
-    persist_pypi_download_stats,
-    sum_pypi_download_stats,
-)
-from ..components.telemetry_processor import process_telemetry_data
+from ..components.ruyi_version_stats import query_ruyi_version_adoption
+from ..components.telemetry_admission import DITelemetryAdmission
+from ..components.telemetry_dedup import DITelemetryNonceFilter
+from ..components.telemetry_ingest import DITelemetryWriteBuffer
+from ..components.telemetry_installation_cache import DITelemetryInstallationCache
+from ..components.telemetry_spool import DITelemetrySpool
 from ..config.env import DIEnvConfig
 from ..db.conn import DIMainDB
-from ..db.schema import telemetry_raw_uploads, ModelTelemetryRawUpload
 from ..es import DIMainES
 from ..gh import DIGitHub
-from ..schema.admin import ReqProcessTelemetry
-from ..schema.client_telemetry import UploadPayload
-from ..components.github_stats import query_org_stats, query_release_downloads
+from ..schema.admin import (
+    ReqProcessTelemetry,
+    RuyiVersionAdoptionV1,
+    RuyiVersionCountV1,
+    TelemetryIngestStatsV1,
+)
 
 router = APIRouter(prefix="/admin")
 
@@ -39,6 +34,7 @@ router = APIRouter(prefix="/admin")
 @router.post("/process-telemetry-v1", status_code=204)
 async def admin_process_telemetry(
     req: ReqProcessTelemetry,
+    cfg: DIEnvConfig,
     main_db: DIMainDB,
     es: DIMainES,
     cache: DICacheStore,
@@ -46,50 +42,13 @@ async def admin_process_telemetry(
 ) -> None:
     """Processes collected raw telemetry data so far."""
 
-    async with main_db.connect() as conn:
-        async with conn.begin() as txn:
-            sel = select(
-                telemetry_raw_uploads.c.id,
-                telemetry_raw_uploads.c.raw_events,
-            ).where(
-                telemetry_raw_uploads.c.created_at >= req.time_start,
-                telemetry_raw_uploads.c.created_at < req.time_end,
-                telemetry_raw_uploads.c.is_processed == False,  # noqa: E712  # DSL usage
-            )
-            raw_events: list[ModelTelemetryRawUpload] = []
-            upload_ids: list[int] = []
-            async for row in await conn.stream(sel):
-                upload_ids.append(row[0])
-                raw_events.append(row[1])
-
-            events = [UploadPayload.model_validate(x) for x in raw_events]
-
-            # Process the telemetry data
-            await process_telemetry_data(conn, events)
-
-            # Mark the raw events as processed
-            if upload_ids:
-                upd = (
-                    update(telemetry_raw_uploads)
-                    .where(telemetry_raw_uploads.c.id.in_(upload_ids))
-                    .values(is_processed=True)
-                )
-                await conn.execute(upd)
-
-            # Commit the transaction
-            await txn.commit()
-
-    last_processed = datetime.datetime.now(datetime.timezone.utc)
-    await cache.set(KEY_TELEMETRY_DATA_LAST_PROCESSED, last_processed)
-
-    # refresh frontend dashboard numbers
-    try:
-        async with main_db.connect() as conn:
-            await crunch_and_cache_dashboard_numbers(conn, es, cache)
-    except Exception as e:
-        # ignore cache errors
-        traceback.print_exception(e, file=sys.stderr)
-        print("Failed to cache dashboard data; ignoring", file=sys.stderr)
+    await process_telemetry(
+        main_db,
+        es,
+        cache,
+        req.time_end,
+        cfg.telemetry.processing,
+    )
 
 
 @router.post("/refresh-github-stats-v1", status_code=204)
@@ -103,32 +62,10 @@ async def admin_refresh_github_stats(
 ) -> None:
     """Refreshes the cached GitHub stats."""
 
-    stats = await query_release_downloads(github, cfg.github.ruyi_pm_repo)
-    await cache.set(KEY_GITHUB_RELEASE_STATS, stats)
-
-    stats_ide_eclipse = await query_release_downloads(
-        github,
-        cfg.github.ruyi_ide_eclipse_repo,
-    )
-    await cache.set(KEY_GITHUB_RELEASE_STATS_RUYI_IDE_ECLIPSE, stats_ide_eclipse)
-
-    stats_ide_vscode = await query_release_downloads(
-        github,
-        cfg.github.ruyi_ide_vscode_repo,
-    )
-    await cache.set(KEY_GITHUB_RELEASE_STATS_RUYI_IDE_VSCODE, stats_ide_vscode)
-
-    org_stats = await query_org_stats(github, cfg.github.ruyi_org)
-    await cache.set(KEY_GITHUB_ORG_STATS_RUYISDK, org_stats.model_dump())
+    await refresh_github_stats(github, cache, cfg.github)
 
     # refresh frontend dashboard numbers
-    try:
-        async with db.connect() as conn:
-            await crunch_and_cache_dashboard_numbers(conn, es, cache)
-    except Exception as e:
-        # ignore cache errors
-        traceback.print_exception(e, file=sys.stderr)
-        print("Failed to cache dashboard data; ignoring", file=sys.stderr)
+    await refresh_dashboard(db, es, cache)
 
 
 @router.post("/refresh-pypi-stats-v1", status_code=204)
@@ -141,31 +78,10 @@ async def admin_refresh_pypi_stats(
 ) -> None:
     """Refreshes the cached PyPI stats."""
 
-    pkg = cfg.pypi.ruyi_pm_package
-    stats = await fetch_pypi_download_stats(pkg)
-    new_total = 0
-    async with db.connect() as conn:
-        await persist_pypi_download_stats(conn, pkg, stats)
-
-        new_total = await sum_pypi_download_stats(
-            conn,
-            date_start=datetime.date(2025, 7, 30),  # our PyPI launch date - 1
-            date_end=datetime.date.today() + datetime.timedelta(days=1),
-            package_name=pkg,
-        )
-
-    # update total download count in cache
-    if new_total > 0:
-        await cache.set(KEY_PYPI_DOWNLOAD_TOTAL_PM, new_total)
+    await refresh_pypi_stats(db, cache, cfg.pypi.ruyi_pm_package)
 
     # refresh frontend dashboard numbers
-    try:
-        async with db.connect() as conn:
-            await crunch_and_cache_dashboard_numbers(conn, es, cache)
-    except Exception as e:
-        # ignore cache errors
-        traceback.print_exception(e, file=sys.stderr)
-        print("Failed to cache dashboard data; ignoring", file=sys.stderr)
+    await refresh_dashboard(db, es, cache)
 
 
 @router.post("/refresh-repo-news-v1", status_code=204)
@@ -178,3 +94,48 @@ async def admin_refresh_repo_news(
     """Refreshes the cached RuyiSDK repository news items."""
 
     await refresh_news_items(github, cache, cfg.github.ruyi_packages_index_repo)
+
+
+@router.get("/telemetry-ingest-stats-v1")
+async def admin_telemetry_ingest_stats(
+    cfg: DIEnvConfig,
+    admission: DITelemetryAdmission,
+    write_buffer: DITelemetryWriteBuffer,
+    nonce_filter: DITelemetryNonceFilter,
+    ins_info_cache: DITelemetryInstallationCache,
+    spool: DITelemetrySpool,
+    admin: DIAdmin,
+) -> TelemetryIngestStatsV1:
+    """Returns telemetry ingestion statistics of the worker serving the request."""
+
+    return TelemetryIngestStatsV1(
+        ingest_mode=cfg.telemetry.ingest_mode,
+        admission=admission.stats if admission is not None else None,
+        write_buffer=write_buffer.stats if write_buffer is not None else None,
+        installation_cache=(
+            ins_info_cache.stats if ins_info_cache is not None else None
+        ),
+        nonce_dedup=nonce_filter.stats if nonce_filter is not None else None,
+        spool=spool.stats if spool is not None else None,
+    )
+
+
+@router.get("/ruyi-version-adoption-v1")
+async def admin_ruyi_version_adoption(
+    time_start: datetime.datetime,
+    time_end: datetime.datetime,
+    main_db: DIMainDB,
+    admin: DIAdmin,
+) -> RuyiVersionAdoptionV1:
+    """Returns the number of telemetry uploads per ruyi version in the given
+    time range, which is widened to whole hours."""
+
+    async with main_db.connect() as conn:
+        counts = await query_ruyi_version_adoption(conn, time_start, time_end)
+
+    return RuyiVersionAdoptionV1(
+        time_start=time_start,
+        time_end=time_end,
+        total=sum(counts.values()),
+        versions=[RuyiVersionCountV1(version=k, count=v) for k, v in counts.items()],
+    )
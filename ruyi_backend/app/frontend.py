@@ -1,17 +1,58 @@
-from typing import cast
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from pydantic import ValidationError
 
-from fastapi import APIRouter
-
-from ..cache import DICacheStore, KEY_FRONTEND_DASHBOARD
+from ..cache import (
+    DICacheStore,
+    KEY_FRONTEND_DASHBOARD,
+    KEY_FRONTEND_DASHBOARD_PAYLOAD,
+)
+from ..components.dashboard_payload import DASHBOARD_CACHE_CONTROL, DashboardPayload
 from ..schema.frontend import DashboardDataV1
 
 router = APIRouter(prefix="/fe")
 
 
-@router.get("/dashboard")
-@router.post("/dashboard")
+@router.get("/dashboard", response_model=DashboardDataV1)
+@router.post("/dashboard", response_model=DashboardDataV1)
 async def get_dashboard_data_v1(
+    request: Request,
     cache: DICacheStore,
-) -> DashboardDataV1:
-    # only consume cached results for performance
-    return cast(DashboardDataV1, await cache.get(KEY_FRONTEND_DASHBOARD))
+) -> Response:
+    # only consume cached results for performance, serving the bytes as
+    # serialized by the dashboard refresh
+    payload = DashboardPayload.from_cache(
+        await cache.get(KEY_FRONTEND_DASHBOARD_PAYLOAD),
+    )
+    if payload is None:
+        # fall back to the data cached before payloads were, so that the
+        # dashboard stays available between a deploy and the next refresh
+        payload = await _legacy_dashboard_payload(cache)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Dashboard data not available yet",
+        )
+
+    encoding, body = payload.negotiate(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": payload.etag(encoding),
+        "Last-Modified": payload.last_modified,
+        "Cache-Control": DASHBOARD_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if payload.is_not_modified(request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _legacy_dashboard_payload(cache: DICacheStore) -> DashboardPayload | None:
+    if not (cached := await cache.get(KEY_FRONTEND_DASHBOARD)):
+        return None
+    try:
+        return DashboardPayload.from_data(DashboardDataV1.model_validate(cached))
+    except ValidationError:
+        # ignore malformed cache entries
+        return None
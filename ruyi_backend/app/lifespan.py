@@ -3,8 +3,26 @@ from typing import AsyncGenerator
 
 from fastapi import FastAPI
 
+from ..components.telemetry_admission import init_telemetry_admission
+from ..components.telemetry_dedup import (
+    get_telemetry_nonce_filter,
+    init_telemetry_nonce_filter,
+)
+from ..components.telemetry_ingest import (
+    dispose_telemetry_write_buffer,
+    init_telemetry_write_buffer,
+)
+from ..components.telemetry_installation_cache import (
+    get_telemetry_installation_cache,
+    init_telemetry_installation_cache,
+)
+from ..components.telemetry_spool import (
+    dispose_telemetry_spool,
+    get_telemetry_spool,
+    init_telemetry_spool,
+)
 from ..config import get_env_config, init
-from ..db.conn import dispose_main_db
+from ..db.conn import dispose_main_db, get_main_db
 
 
 @asynccontextmanager
@@ -18,7 +36,25 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
         app.redoc_url = None
         app.openapi_url = None
 
+    init_telemetry_admission(cfg)
+    init_telemetry_installation_cache(cfg)
+    if cfg.cache_main.host:
+        init_telemetry_nonce_filter(cfg)
+    if cfg.db_main.dsn:
+        init_telemetry_spool(cfg, get_main_db(), get_telemetry_installation_cache())
+        spool = get_telemetry_spool()
+        init_telemetry_write_buffer(
+            cfg,
+            get_main_db(),
+            get_telemetry_installation_cache(),
+            spool.append if spool is not None else None,
+            get_telemetry_nonce_filter(),
+        )
+
     try:
         yield
     finally:
+        # drain buffered uploads while the DB is still available
+        await dispose_telemetry_write_buffer()
+        await dispose_telemetry_spool()
         await dispose_main_db()
@@ -1,56 +1,317 @@
-from fastapi import APIRouter
-from sqlalchemy import text
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+import logging
 
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..cache.store import CacheStore
+from ..components.content_encoding import (
+    BodyDecoder,
+    BodyTooLargeError,
+    MalformedBodyError,
+    UnsupportedEncodingError,
+    make_body_decoder,
+)
+from ..components.telemetry_admission import admit_telemetry_request
+from ..components.telemetry_dedup import DITelemetryNonceFilter, NonceFilter
+from ..components.telemetry_ingest import (
+    DITelemetryWriteBuffer,
+    TelemetryWriteBuffer,
+    UploadRecord,
+    UploadTooLargeError,
+    WriteBufferFullError,
+    parse_upload,
+    persist_new_upload_records,
+    persist_upload_records,
+)
+from ..components.telemetry_installation_cache import (
+    DITelemetryInstallationCache,
+    InstallationInfoCache,
+)
+from ..components.telemetry_spool import DITelemetrySpool, TelemetrySpool
+from ..components.telemetry_stream import (
+    DITelemetryUploadStream,
+    UploadStreamFullError,
+    enqueue_upload,
+)
+from ..config.env import DIEnvConfig, EnvConfig
 from ..db.conn import DIMainDB
-from ..schema.client_telemetry import UploadPayload
+from ..schema.client_telemetry import (
+    UploadBatchResultV1,
+    UploadEnvelope,
+    UploadStatusV1,
+)
 
-router = APIRouter(prefix="/telemetry")
+logger = logging.getLogger(__name__)
 
+router = APIRouter(
+    prefix="/telemetry",
+    dependencies=[Depends(admit_telemetry_request)],
+)
 
-@router.post("/pm/upload-v1", status_code=204)
-async def telemetry_pm_upload_v1(payload: UploadPayload, main_db: DIMainDB) -> None:
-    if payload.fmt != 1:
-        raise ValueError("Invalid telemetry format version")
-
-    async with main_db.connect() as conn:
-        # Record payload.ruyi_version into telemetry_ruyi_versions
-        await conn.execute(
-            text("INSERT INTO `telemetry_ruyi_versions` (version) VALUES (:version)"),
-            {"version": payload.ruyi_version},
+
+def _make_body_decoder(request: Request, cfg: EnvConfig) -> BodyDecoder:
+    max_bytes = cfg.telemetry.max_upload_bytes
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes:
+        raise UploadTooLargeError(f"request body too large (max {max_bytes} bytes)")
+
+    return make_body_decoder(
+        request.headers.get("content-encoding", ""),
+        cfg.telemetry.max_decompressed_bytes,
+    )
+
+
+async def _iter_body(request: Request, cfg: EnvConfig) -> AsyncIterator[bytes]:
+    """Iterates over the chunks of the request body as sent, up to the size
+    limit."""
+
+    max_bytes = cfg.telemetry.max_upload_bytes
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadTooLargeError(
+                f"request body too large (max {max_bytes} bytes)",
+            )
+        yield chunk
+
+
+def _too_large(e: Exception) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=str(e),
+    )
+
+
+@contextmanager
+def _body_errors() -> Iterator[None]:
+    """Turns the errors of reading and decoding request bodies into the
+    respective HTTP errors."""
+
+    try:
+        yield
+    except (UploadTooLargeError, BodyTooLargeError) as e:
+        raise _too_large(e)
+    except UnsupportedEncodingError as e:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"unsupported content encoding: {e}",
         )
+    except MalformedBodyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"malformed request body: {e}",
+        )
+
+
+async def _accept_upload(
+    request: Request,
+    cfg: DIEnvConfig,
+) -> tuple[UploadEnvelope, bytes]:
+    """Reads and checks an upload, returning its envelope and the JSON document
+    to be stored verbatim.
+
+    The request body is decoded on the fly, so that neither the body as sent
+    nor the decoded body are ever held beyond their size limits. The payload
+    is not validated as a whole here; that happens at processing time
+    anyway."""
+
+    with _body_errors():
+        decoder = _make_body_decoder(request, cfg)
+        async for chunk in _iter_body(request, cfg):
+            decoder.feed(chunk)
+        body = decoder.finish()
+
+        try:
+            return parse_upload(body, cfg.telemetry.max_events_per_upload)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors(include_url=False))
 
-        # Record payload.installation into telemetry_raw_installation_infos
-        report_uuid = payload.report_uuid
-        ins_info_json = "{}"
-        if ins := payload.installation:
-            report_uuid = ins.report_uuid
-            ins_info_json = ins.model_dump_json()
-
-        if report_uuid is not None:
-            # Upsert the given report_uuid's installation info
-            await conn.execute(
-                text(
-                    "INSERT INTO `telemetry_raw_installation_infos` (`report_uuid`, `raw`) VALUES (:report_uuid, :raw) ON DUPLICATE KEY UPDATE `raw` = :raw"
-                ),
-                {
-                    "report_uuid": report_uuid,
-                    "raw": ins_info_json,
+
+async def _persist_uploads(
+    cfg: EnvConfig,
+    records: list[UploadRecord],
+    main_db: AsyncEngine,
+    write_buffer: TelemetryWriteBuffer | None,
+    upload_stream: CacheStore | None,
+    nonce_filter: NonceFilter | None,
+    ins_info_cache: InstallationInfoCache | None,
+    spool: TelemetrySpool | None,
+    check_new: bool = False,
+) -> list[bool]:
+    """Persists accepted uploads according to the configured ingest mode,
+    spooling them if that fails, and settles their nonces.
+
+    Returns whether each upload was new. Only known with ``check_new`` and
+    uploads written to the DB directly; otherwise they are all reported new,
+    and duplicates are left to the DB to skip."""
+
+    is_new = [True] * len(records)
+    # the write-behind buffer settles the nonces once the uploads are flushed
+    buffered = upload_stream is None and write_buffer is not None
+    try:
+        try:
+            if upload_stream is not None:
+                for r in records:
+                    await enqueue_upload(
+                        upload_stream,
+                        r.raw_events.encode("utf-8"),
+                        cfg.telemetry.stream.max_len,
+                    )
+            elif write_buffer is not None:
+                for r in records:
+                    write_buffer.put(r)
+            elif check_new:
+                is_new = await persist_new_upload_records(
+                    main_db,
+                    records,
+                    ins_info_cache,
+                )
+            else:
+                await persist_upload_records(main_db, records, ins_info_cache)
+        except Exception:
+            if spool is None:
+                raise
+            logger.warning(
+                "failed to persist %d telemetry uploads, spooling",
+                len(records),
+                exc_info=True,
+            )
+            # duplicates are left to be skipped on replay
+            await spool.append(records)
+            buffered = False
+    except BaseException as e:
+        if nonce_filter is not None:
+            for r in records:
+                await nonce_filter.rollback(r.nonce)
+        if isinstance(e, (WriteBufferFullError, UploadStreamFullError)):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Telemetry ingestion is overloaded, please retry later",
+                headers={
+                    "Retry-After": str(cfg.telemetry.admission.retry_after_seconds),
                 },
             )
+        raise
 
-        # Record the raw aggregated events into telemetry_raw_uploads
-        # De-duping is achieved by using INSERT IGNORE INTO and the unique
-        # constraint on the nonce column
-        await conn.execute(
-            text(
-                "INSERT IGNORE INTO `telemetry_raw_uploads` (`nonce`, `raw_events`) VALUES (:nonce, :raw_events)"
-            ),
-            {
-                "nonce": payload.nonce,
-                "raw_events": payload.model_dump_json(),
-            },
-        )
+    if nonce_filter is not None and not buffered:
+        for r in records:
+            await nonce_filter.commit(r.nonce)
+    return is_new
 
-        await conn.commit()
 
+@router.post("/pm/upload-v1", status_code=204)
+async def telemetry_pm_upload_v1(
+    request: Request,
+    cfg: DIEnvConfig,
+    main_db: DIMainDB,
+    write_buffer: DITelemetryWriteBuffer,
+    upload_stream: DITelemetryUploadStream,
+    nonce_filter: DITelemetryNonceFilter,
+    ins_info_cache: DITelemetryInstallationCache,
+    spool: DITelemetrySpool,
+) -> None:
+    envelope, doc = await _accept_upload(request, cfg)
+
+    if nonce_filter is not None and await nonce_filter.check(envelope.nonce, main_db):
+        # a retry of an upload already accepted
+        return None
+
+    await _persist_uploads(
+        cfg,
+        [UploadRecord.from_envelope(envelope, doc)],
+        main_db,
+        write_buffer,
+        upload_stream,
+        nonce_filter,
+        ins_info_cache,
+        spool,
+    )
     return None
+
+
+@router.post("/pm/upload-batch-v1")
+async def telemetry_pm_upload_batch_v1(
+    request: Request,
+    cfg: DIEnvConfig,
+    main_db: DIMainDB,
+    write_buffer: DITelemetryWriteBuffer,
+    upload_stream: DITelemetryUploadStream,
+    nonce_filter: DITelemetryNonceFilter,
+    ins_info_cache: DITelemetryInstallationCache,
+    spool: DITelemetrySpool,
+) -> UploadBatchResultV1:
+    """Accepts multiple uploads at once as newline-delimited JSON, one upload
+    payload per line, reporting the outcome of every upload.
+
+    Lines are parsed as they arrive, and the uploads then go through the
+    configured ingest mode like single uploads do. Uploads written to the DB
+    directly are written in one transaction."""
+
+    max_uploads = cfg.telemetry.max_uploads_per_batch
+    result = UploadBatchResultV1()
+    records: list[UploadRecord] = []
+    statuses: list[UploadStatusV1] = []
+
+    async def accept_line(line: bytes) -> None:
+        if not line.strip():
+            return
+        if len(result.results) >= max_uploads:
+            raise UploadTooLargeError(
+                f"too many uploads in one batch (max {max_uploads})",
+            )
+
+        try:
+            envelope, doc = parse_upload(line, cfg.telemetry.max_events_per_upload)
+        except (UploadTooLargeError, ValidationError) as e:
+            result.results.append(UploadStatusV1(status="invalid", detail=str(e)))
+            result.invalid += 1
+            return
+
+        st = UploadStatusV1(status="accepted", nonce=envelope.nonce)
+        result.results.append(st)
+        if nonce_filter is not None and await nonce_filter.check(
+            envelope.nonce,
+            main_db,
+        ):
+            st.status = "duplicate"
+            return
+        records.append(UploadRecord.from_envelope(envelope, doc))
+        statuses.append(st)
+
+    try:
+        with _body_errors():
+            decoder = _make_body_decoder(request, cfg)
+            async for chunk in _iter_body(request, cfg):
+                decoder.feed(chunk)
+                for line in decoder.take_lines():
+                    await accept_line(line)
+            await accept_line(decoder.finish())
+    except BaseException:
+        # the uploads accepted so far are not persisted after all
+        if nonce_filter is not None:
+            for r in records:
+                await nonce_filter.rollback(r.nonce)
+        raise
+
+    is_new = await _persist_uploads(
+        cfg,
+        records,
+        main_db,
+        write_buffer,
+        upload_stream,
+        nonce_filter,
+        ins_info_cache,
+        spool,
+        check_new=True,
+    )
+    for st, new in zip(statuses, is_new):
+        if not new:
+            st.status = "duplicate"
+    result.duplicate = sum(r.status == "duplicate" for r in result.results)
+    result.accepted = sum(r.status == "accepted" for r in result.results)
+    return result
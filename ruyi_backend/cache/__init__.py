@@ -52,6 +52,43 @@ DICacheStore: TypeAlias = Annotated[CacheStore, Depends(get_cache_store)]
 KEY_TELEMETRY_DATA_LAST_PROCESSED = "telemetry:last-processed"
 """Last processed time of raw telemetry data."""
 
+KEY_TELEMETRY_UPLOAD_STREAM = "telemetry:upload-stream"
+"""Redis stream of accepted telemetry uploads pending to be written to the DB."""
+
+KEY_PREFIX_TELEMETRY_NONCE = "telemetry:nonce:"
+"""Prefix for markers of recently accepted telemetry upload nonces."""
+
+KEY_PREFIX_TELEMETRY_NONCE_BLOOM = "telemetry:nonce-bloom:"
+"""Prefix for time-rotated Bloom filters of recently accepted telemetry upload
+nonces."""
+
+KEY_PREFIX_TELEMETRY_INSTALLATION_FP = "telemetry:installation-fp:"
+"""Prefix for fingerprints of the last persisted installation info of every
+report UUID."""
+
+KEY_TELEMETRY_COMMAND_TOTALS = "telemetry:command-totals"
+"""Hash of the all-time invocation counts of every ruyi command."""
+
+KEY_TELEMETRY_COMMAND_TOP = "telemetry:command-top"
+"""Sorted set of the all-time invocation counts of every ruyi command, for
+reading the most invoked ones."""
+
+KEY_TELEMETRY_COMMAND_COUNTERS_BOOTSTRAPPED = "telemetry:command-counters:bootstrapped"
+"""Time the live command counters were last rebuilt from the DB; until they
+have been, they only hold what was processed since, and are not to be read."""
+
+KEY_TELEMETRY_INSTALLS = "telemetry:installs"
+"""HyperLogLog of the report UUIDs of all installations ever seen."""
+
+KEY_PREFIX_TELEMETRY_ACTIVE_INSTALLS = "telemetry:active-installs:"
+"""Prefix for per-day (``YYYYMMDD``) HyperLogLogs of the report UUIDs of the
+installations seen that day."""
+
+KEY_TELEMETRY_INSTALL_COUNTERS_BOOTSTRAPPED = "telemetry:install-counters:bootstrapped"
+"""Time the installation HyperLogLogs were last rebuilt from the DB; until
+they have been, they only hold the installations processed since, and are
+not to be read."""
+
 KEY_GITHUB_ORG_STATS_RUYISDK = "github:org-stats:ruyisdk"
 """GitHub organization stats for the RuyiSDK organization."""
 
@@ -65,7 +102,11 @@ KEY_GITHUB_RELEASE_STATS_RUYI_IDE_VSCODE = "github:release-stats:ruyi-ide-vscode
 """GitHub release stats data for RuyiSDK IDE VSCode plugins."""
 
 KEY_FRONTEND_DASHBOARD = "frontend:dashboard"
-"""Frontend dashboard data."""
+"""Frontend dashboard data, as cached before pre-serialized payloads; only
+read until the first refresh caches :data:`KEY_FRONTEND_DASHBOARD_PAYLOAD`."""
+
+KEY_FRONTEND_DASHBOARD_PAYLOAD = "frontend:dashboard:payload"
+"""Frontend dashboard data, pre-serialized for serving."""
 
 KEY_PREFIX_NEWS_ITEM_CONTENT = "news:item:content:"
 """Prefix for cached news item contents."""
@@ -1,8 +1,13 @@
 from inspect import isawaitable
-from typing import Any
+from typing import Any, Collection, Mapping, TypeAlias, cast
 
 import msgpack
 from redis.asyncio.client import Redis
+from redis.exceptions import ResponseError
+
+StreamEntry: TypeAlias = tuple[bytes, dict[bytes, bytes] | None]
+"""A Redis stream entry as ``(id, fields)``, with fields being None if the
+entry was deleted while pending."""
 
 
 class CacheStore:
@@ -31,6 +36,7 @@ class CacheStore:
         val: Any,
         nx: bool = False,
         xx: bool = False,
+        ex: int | None = None,
     ) -> Any:
         key = self._get_prefixed_key(key)
         payload = msgpack.dumps(val, datetime=True)
@@ -40,8 +46,30 @@ class CacheStore:
             payload,
             nx=nx,
             xx=xx,
+            ex=ex,
         )
 
+    async def delete(self, *keys: str) -> int:
+        v = self._redis.delete(*(self._get_prefixed_key(k) for k in keys))
+        return cast(int, await v if isawaitable(v) else v)
+
+    async def mget(self, keys: list[str]) -> list[Any | None]:
+        v = self._redis.mget([self._get_prefixed_key(k) for k in keys])
+        vals = await v if isawaitable(v) else v
+        return [None if x is None else msgpack.loads(x, timestamp=3) for x in vals]
+
+    async def mset_ex(self, mapping: dict[str, Any], ex: int) -> None:
+        """Sets multiple keys with the same expiry, in one round trip."""
+
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for k, val in mapping.items():
+                pipe.set(
+                    self._get_prefixed_key(k),
+                    msgpack.dumps(val, datetime=True),
+                    ex=ex,
+                )
+            await pipe.execute()
+
     async def hget(self, name: str, key: str) -> Any:
         name = self._get_prefixed_key(name)
         v = self._redis.hget(name, key)
@@ -73,3 +101,212 @@ class CacheStore:
             payload,  # type: ignore[arg-type]  # bytes is actually accepted
         )
         return await v if isawaitable(v) else v
+
+    # Counters.
+    #
+    # Integer counters kept both in a hash, for reading any of them, and in a
+    # sorted set, for reading the top ones.
+
+    async def incr_counters(
+        self,
+        name: str,
+        top_name: str,
+        deltas: Mapping[str, int],
+    ) -> None:
+        """Adds the deltas to the counters, in one round trip."""
+
+        if not deltas:
+            return
+        name = self._get_prefixed_key(name)
+        top_name = self._get_prefixed_key(top_name)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for k, delta in deltas.items():
+                pipe.hincrby(name, k, delta)
+                pipe.zincrby(top_name, delta, k)
+            await pipe.execute()
+
+    async def replace_counters(
+        self,
+        name: str,
+        top_name: str,
+        totals: Mapping[str, int],
+    ) -> None:
+        """Atomically replaces all counters with the given totals."""
+
+        name = self._get_prefixed_key(name)
+        top_name = self._get_prefixed_key(top_name)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(name, top_name)
+            if totals:
+                pipe.hset(name, mapping=dict(totals))
+                pipe.zadd(top_name, dict(totals))
+            await pipe.execute()
+
+    async def top_counters(self, top_name: str, n: int) -> list[tuple[str, int]]:
+        """Returns the ``n`` largest counters, largest first."""
+
+        top_name = self._get_prefixed_key(top_name)
+        v = self._redis.zrevrange(top_name, 0, n - 1, withscores=True)
+        resp = await v if isawaitable(v) else v
+        return [(k.decode("utf-8"), int(score)) for k, score in resp]
+
+    # HyperLogLogs.
+
+    async def pfadd(
+        self,
+        name: str,
+        values: Collection[str],
+        ex: int | None = None,
+    ) -> None:
+        """Adds the values to the HyperLogLog, (re-)setting its expiry if
+        ``ex`` is given."""
+
+        if not values:
+            return
+        name = self._get_prefixed_key(name)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.pfadd(name, *values)
+            if ex is not None:
+                pipe.expire(name, ex)
+            await pipe.execute()
+
+    async def pfcount(self, *names: str) -> int:
+        """Estimates the number of distinct values added to any of the given
+        HyperLogLogs."""
+
+        v = self._redis.pfcount(*(self._get_prefixed_key(n) for n in names))
+        return cast(int, await v if isawaitable(v) else v)
+
+    async def rename(self, src: str, dst: str) -> None:
+        v = self._redis.rename(
+            self._get_prefixed_key(src),
+            self._get_prefixed_key(dst),
+        )
+        await v if isawaitable(v) else v
+
+    # Bitmaps.
+
+    async def getbits(self, names: list[str], offsets: list[int]) -> list[list[int]]:
+        """Returns the given bits of each of the given keys, in one round trip."""
+
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for name in names:
+                name = self._get_prefixed_key(name)
+                for off in offsets:
+                    pipe.getbit(name, off)
+            bits = cast(list[int], await pipe.execute())
+        n = len(offsets)
+        return [bits[i * n : (i + 1) * n] for i in range(len(names))]
+
+    async def setbits(self, name: str, offsets: list[int], ttl: int) -> None:
+        """Sets the given bits to 1, also (re-)setting the expiry of the key."""
+
+        name = self._get_prefixed_key(name)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for off in offsets:
+                pipe.setbit(name, off, 1)
+            pipe.expire(name, ttl)
+            await pipe.execute()
+
+    # Streams.
+    #
+    # Stream entries carry raw bytes as-is, without the msgpack (de)serialization
+    # done for the K/V operations above.
+
+    async def xadd(
+        self,
+        name: str,
+        fields: dict[str, bytes],
+        maxlen: int | None = None,
+    ) -> bytes:
+        """Appends an entry to the stream, trimming the stream to about
+        ``maxlen`` entries (``MAXLEN ~``) if given."""
+
+        name = self._get_prefixed_key(name)
+        v = self._redis.xadd(
+            name,
+            fields,  # type: ignore[arg-type]  # bytes is actually accepted
+            maxlen=maxlen,
+            approximate=True,
+        )
+        return cast(bytes, await v if isawaitable(v) else v)
+
+    async def xlen(self, name: str) -> int:
+        name = self._get_prefixed_key(name)
+        v = self._redis.xlen(name)
+        return cast(int, await v if isawaitable(v) else v)
+
+    async def xgroup_ensure(self, name: str, group: str) -> None:
+        """Creates the consumer group on the stream if it does not exist yet,
+        creating the stream too if necessary."""
+
+        name = self._get_prefixed_key(name)
+        try:
+            v = self._redis.xgroup_create(name, group, id="0", mkstream=True)
+            await v if isawaitable(v) else v
+        except ResponseError as e:
+            if not str(e).startswith("BUSYGROUP"):
+                raise
+
+    async def xreadgroup(
+        self,
+        name: str,
+        group: str,
+        consumer: str,
+        count: int,
+        block_ms: int | None = None,
+    ) -> list[StreamEntry]:
+        """Reads new entries on behalf of the given consumer."""
+
+        name = self._get_prefixed_key(name)
+        v = self._redis.xreadgroup(
+            group,
+            consumer,
+            {name: ">"},
+            count=count,
+            block=block_ms,
+        )
+        resp = await v if isawaitable(v) else v
+        if not resp:
+            return []
+        if isinstance(resp, dict):
+            # RESP3: {name: [[(id, fields), ...]]}
+            return [e for v in resp.values() for e in v[0]]
+        # RESP2: [[name, [(id, fields), ...]]]
+        return [e for r in resp for e in r[1]]
+
+    async def xautoclaim(
+        self,
+        name: str,
+        group: str,
+        consumer: str,
+        min_idle_ms: int,
+        count: int,
+        start_id: bytes | str = "0-0",
+    ) -> tuple[bytes, list[StreamEntry]]:
+        """Transfers ownership of entries pending for longer than ``min_idle_ms``
+        to the given consumer, returning the cursor for the next call together
+        with the claimed entries."""
+
+        name = self._get_prefixed_key(name)
+        v = self._redis.xautoclaim(
+            name,
+            group,
+            consumer,
+            min_idle_ms,
+            start_id=start_id,
+            count=count,
+        )
+        resp = await v if isawaitable(v) else v
+        return resp[0], resp[1]
+
+    async def xack_and_delete(self, name: str, group: str, ids: list[bytes]) -> None:
+        """Acknowledges the given entries and removes them from the stream."""
+
+        if not ids:
+            return
+        name = self._get_prefixed_key(name)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.xack(name, group, *ids)
+            pipe.xdel(name, *ids)
+            await pipe.execute()
@@ -4,11 +4,21 @@ CLI management tool for the ruyi-backend package.
 
 import argparse
 import asyncio
+import datetime
 import logging
 import sys
 from typing import Callable, NoReturn
 
 from ..config import get_env_config, init
+from .cmd_admin_jobs import (
+    do_process_telemetry,
+    do_reconcile_telemetry_counters,
+    do_refresh_github_stats,
+    do_refresh_news,
+    do_refresh_pypi_stats,
+)
+from .cmd_archive_telemetry import do_archive_telemetry, do_replay_telemetry_archive
+from .cmd_consume_telemetry import do_consume_telemetry
 from .cmd_password import do_hash_password, do_test_password
 from .cmd_sync_releases import do_sync_releases
 
@@ -50,6 +60,130 @@ def main(argv: list[str]) -> int:
         help="The hash to test against.",
     )
 
+    consume_telemetry = sp.add_parser(
+        "consume-telemetry",
+        help="Drain the telemetry upload stream into the database.",
+    )
+    consume_telemetry.set_defaults(
+        func=lambda args: asyncio.run(
+            do_consume_telemetry(
+                cfg.telemetry,
+                args.consumer,
+                args.drain,
+            )
+        ),
+    )
+    consume_telemetry.add_argument(
+        "--consumer",
+        help="Consumer name within the consumer group (default: <hostname>-<pid>).",
+    )
+    consume_telemetry.add_argument(
+        "--drain",
+        action="store_true",
+        help="Exit once the stream is drained instead of waiting for more uploads.",
+    )
+
+    # options common to the batch jobs otherwise run by the admin API
+    job_opts = argparse.ArgumentParser(add_help=False)
+    job_opts.add_argument(
+        "--db-pool-size",
+        type=int,
+        help="Number of DB connections kept by the pool (default: from config).",
+    )
+
+    process_telemetry = sp.add_parser(
+        "process-telemetry",
+        parents=[job_opts],
+        help="Process the raw telemetry uploads received so far, and refresh the dashboard.",
+    )
+    process_telemetry.set_defaults(
+        func=lambda args: asyncio.run(
+            do_process_telemetry(
+                cfg,
+                args.time_end,
+                args.concurrency,
+                args.validation_processes,
+                args.db_pool_size,
+            )
+        ),
+    )
+    process_telemetry.add_argument(
+        "--time-end",
+        type=datetime.datetime.fromisoformat,
+        help="Only process uploads received before this ISO 8601 time (default: now).",
+    )
+    process_telemetry.add_argument(
+        "--concurrency",
+        type=int,
+        help="Number of partitions processed concurrently (default: from config).",
+    )
+    process_telemetry.add_argument(
+        "--validation-processes",
+        type=int,
+        help="Number of worker processes validating uploads (default: from config).",
+    )
+
+    sp.add_parser(
+        "reconcile-telemetry-counters",
+        help="Rebuild the live telemetry counters in Redis from the database.",
+    ).set_defaults(
+        func=lambda _: asyncio.run(do_reconcile_telemetry_counters(cfg)),
+    )
+
+    sp.add_parser(
+        "refresh-github-stats",
+        parents=[job_opts],
+        help="Refresh the cached GitHub stats, and the dashboard.",
+    ).set_defaults(
+        func=lambda args: asyncio.run(do_refresh_github_stats(cfg, args.db_pool_size)),
+    )
+
+    sp.add_parser(
+        "refresh-pypi-stats",
+        parents=[job_opts],
+        help="Refresh the PyPI download stats, and the dashboard.",
+    ).set_defaults(
+        func=lambda args: asyncio.run(do_refresh_pypi_stats(cfg, args.db_pool_size)),
+    )
+
+    sp.add_parser(
+        "refresh-news",
+        help="Refresh the cached RuyiSDK repository news items.",
+    ).set_defaults(
+        func=lambda _: asyncio.run(do_refresh_news(cfg)),
+    )
+
+    sp.add_parser(
+        "archive-telemetry",
+        help="Move processed raw telemetry uploads past retention out of the database into the archive.",
+    ).set_defaults(
+        func=lambda _: asyncio.run(do_archive_telemetry(cfg.telemetry)),
+    )
+
+    replay_telemetry_archive = sp.add_parser(
+        "replay-telemetry-archive",
+        help="Process archived raw telemetry uploads again.",
+    )
+    replay_telemetry_archive.set_defaults(
+        func=lambda args: asyncio.run(
+            do_replay_telemetry_archive(
+                cfg.telemetry,
+                args.since,
+                args.until,
+            )
+        ),
+    )
+    replay_telemetry_archive.add_argument(
+        "--since",
+        type=datetime.date.fromisoformat,
+        help="Replay uploads received on or after this date (YYYY-MM-DD).",
+    )
+    replay_telemetry_archive.add_argument(
+        "--until",
+        type=datetime.date.fromisoformat,
+        help="Replay uploads received before this date (YYYY-MM-DD).",
+    )
+
     sp.add_parser(
         "sync-releases",
         help="Release worker: sync releases from GitHub to the configured rsync destination.",
@@ -0,0 +1,145 @@
+import datetime
+import logging
+import time
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..cache import get_cache_store
+from ..components.admin_jobs import (
+    process_telemetry,
+    refresh_dashboard,
+    refresh_github_stats,
+    refresh_pypi_stats,
+)
+from ..components.news_items import refresh_news_items
+from ..components.telemetry_counters import (
+    reconcile_command_counters,
+    reconcile_installation_counters,
+)
+from ..config.env import EnvConfig
+from ..db.conn import dispose_main_db, get_main_db, init_main_db
+from ..es import get_main_es
+from ..gh import get_github
+
+logger = logging.getLogger("ruyi_backend.cli.cmd_admin_jobs")
+
+
+def _job_db(cfg: EnvConfig, pool_size: int | None) -> AsyncEngine:
+    if pool_size is not None:
+        # the engine made by init() has not connected yet, so it can simply
+        # be replaced
+        db_cfg = cfg.db_main.model_copy(update={"pool_size": pool_size})
+        init_main_db(cfg.model_copy(update={"db_main": db_cfg}))
+    return get_main_db()
+
+
+async def do_process_telemetry(
+    cfg: EnvConfig,
+    time_end: datetime.datetime | None,
+    concurrency: int | None,
+    validation_processes: int | None,
+    pool_size: int | None,
+) -> int:
+    processing_cfg = cfg.telemetry.processing
+    if concurrency is not None:
+        processing_cfg = processing_cfg.model_copy(update={"concurrency": concurrency})
+    if validation_processes is not None:
+        processing_cfg = processing_cfg.model_copy(
+            update={"validation_processes": validation_processes},
+        )
+    if time_end is None:
+        time_end = datetime.datetime.now()
+
+    es = get_main_es()
+    t0 = time.monotonic()
+    try:
+        n = await process_telemetry(
+            _job_db(cfg, pool_size),
+            es,
+            get_cache_store(),
+            time_end,
+            processing_cfg,
+        )
+    finally:
+        await es.close()
+        await dispose_main_db()
+
+    elapsed = time.monotonic() - t0
+    logger.info(
+        "processed %d raw telemetry uploads in %.1fs (%.0f uploads/s)",
+        n,
+        elapsed,
+        n / elapsed if elapsed > 0 else 0.0,
+    )
+    return 0
+
+
+async def do_refresh_github_stats(cfg: EnvConfig, pool_size: int | None) -> int:
+    es = get_main_es()
+    cache = get_cache_store()
+    t0 = time.monotonic()
+    try:
+        await refresh_github_stats(get_github(), cache, cfg.github)
+        await refresh_dashboard(_job_db(cfg, pool_size), es, cache)
+    finally:
+        await es.close()
+        await dispose_main_db()
+
+    logger.info("refreshed GitHub stats in %.1fs", time.monotonic() - t0)
+    return 0
+
+
+async def do_refresh_pypi_stats(cfg: EnvConfig, pool_size: int | None) -> int:
+    es = get_main_es()
+    cache = get_cache_store()
+    db = _job_db(cfg, pool_size)
+    t0 = time.monotonic()
+    try:
+        total = await refresh_pypi_stats(db, cache, cfg.pypi.ruyi_pm_package)
+        await refresh_dashboard(db, es, cache)
+    finally:
+        await es.close()
+        await dispose_main_db()
+
+    logger.info(
+        "refreshed PyPI stats in %.1fs, %d downloads in total",
+        time.monotonic() - t0,
+        total,
+    )
+    return 0
+
+
+async def do_refresh_news(cfg: EnvConfig) -> int:
+    t0 = time.monotonic()
+    await refresh_news_items(
+        get_github(),
+        get_cache_store(),
+        cfg.github.ruyi_packages_index_repo,
+    )
+    logger.info("refreshed news items in %.1fs", time.monotonic() - t0)
+    return 0
+
+
+async def do_reconcile_telemetry_counters(cfg: EnvConfig) -> int:
+    db = _job_db(cfg, None)
+    cache = get_cache_store()
+    t0 = time.monotonic()
+    try:
+        totals = await reconcile_command_counters(db, cache)
+        logger.info(
+            "rebuilt live counters of %d commands in %.1fs",
+            len(totals),
+            time.monotonic() - t0,
+        )
+
+        t0 = time.monotonic()
+        installs = await reconcile_installation_counters(db, cache)
+        logger.info(
+            "rebuilt live counters of ~%d installations in %.1fs",
+            installs,
+            time.monotonic() - t0,
+        )
+    finally:
+        await dispose_main_db()
+
+    return 0
@@ -0,0 +1,50 @@
+import datetime
+import logging
+
+from ..cache import get_cache_store
+from ..components.telemetry_archive import TelemetryArchiver, replay_archive
+from ..config.env import TelemetryConfig
+from ..db.conn import dispose_main_db, get_main_db
+
+
+async def do_archive_telemetry(cfg: TelemetryConfig) -> int:
+    logger = logging.getLogger("ruyi_backend.cli.cmd_archive_telemetry")
+
+    if not cfg.archive.directory:
+        logger.error("telemetry archival is disabled: no archive directory configured")
+        return 1
+
+    try:
+        n = await TelemetryArchiver(get_main_db(), cfg.archive).run()
+    finally:
+        await dispose_main_db()
+
+    logger.info("archived %d raw telemetry uploads in total", n)
+    return 0
+
+
+async def do_replay_telemetry_archive(
+    cfg: TelemetryConfig,
+    date_start: datetime.date | None,
+    date_end: datetime.date | None,
+) -> int:
+    logger = logging.getLogger("ruyi_backend.cli.cmd_archive_telemetry")
+
+    if not cfg.archive.directory:
+        logger.error("telemetry archival is disabled: no archive directory configured")
+        return 1
+
+    try:
+        n = await replay_archive(
+            get_main_db(),
+            cfg.archive.directory,
+            cfg.processing,
+            date_start,
+            date_end,
+            get_cache_store(),
+        )
+    finally:
+        await dispose_main_db()
+
+    logger.info("replayed %d archived telemetry uploads in total", n)
+    return 0
@@ -0,0 +1,42 @@
+import asyncio
+import logging
+import os
+import signal
+import socket
+
+from ..cache import get_cache_store
+from ..components.telemetry_installation_cache import make_installation_info_cache
+from ..components.telemetry_stream import TelemetryStreamConsumer
+from ..config.env import TelemetryConfig
+from ..db.conn import dispose_main_db, get_main_db
+
+
+def default_consumer_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+async def do_consume_telemetry(
+    cfg: TelemetryConfig,
+    consumer: str | None,
+    drain: bool,
+) -> int:
+    logger = logging.getLogger("ruyi_backend.cli.cmd_consume_telemetry")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    cache = get_cache_store()
+    c = TelemetryStreamConsumer(
+        logger,
+        cache,
+        get_main_db(),
+        cfg.stream,
+        consumer or default_consumer_name(),
+        make_installation_info_cache(cfg.installation_cache, cache),
+    )
+    try:
+        return await c.run(stop, drain=drain)
+    finally:
+        await dispose_main_db()
@@ -0,0 +1,122 @@
+"""
+Bodies of the periodic admin jobs, run either by the admin API endpoints or
+in-process by the ``ruyi-backend`` CLI.
+"""
+
+import datetime
+import logging
+import sys
+import traceback
+from typing import Any
+
+from elasticsearch import AsyncElasticsearch
+from githubkit import GitHub
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..cache import (
+    KEY_GITHUB_ORG_STATS_RUYISDK,
+    KEY_GITHUB_RELEASE_STATS,
+    KEY_GITHUB_RELEASE_STATS_RUYI_IDE_ECLIPSE,
+    KEY_GITHUB_RELEASE_STATS_RUYI_IDE_VSCODE,
+    KEY_PYPI_DOWNLOAD_TOTAL_PM,
+    KEY_TELEMETRY_DATA_LAST_PROCESSED,
+)
+from ..cache.store import CacheStore
+from ..config.env import GitHubConfig, TelemetryProcessingConfig
+from .frontend_dashboard_processor import crunch_and_cache_dashboard_numbers
+from .github_stats import query_org_stats, query_release_downloads
+from .pypi_stats import (
+    fetch_pypi_download_stats,
+    persist_pypi_download_stats,
+    sum_pypi_download_stats,
+)
+from .telemetry_processor import process_raw_uploads
+
+logger = logging.getLogger(__name__)
+
+PYPI_STATS_DATE_START = datetime.date(2025, 7, 30)  # our PyPI launch date - 1
+
+
+async def refresh_dashboard(
+    engine: AsyncEngine,
+    es: AsyncElasticsearch,
+    cache: CacheStore,
+) -> None:
+    """Refreshes the frontend dashboard numbers, ignoring failures."""
+
+    try:
+        async with engine.connect() as conn:
+            await crunch_and_cache_dashboard_numbers(conn, es, cache)
+    except Exception as e:
+        # ignore cache errors
+        traceback.print_exception(e, file=sys.stderr)
+        print("Failed to cache dashboard data; ignoring", file=sys.stderr)
+
+
+async def process_telemetry(
+    engine: AsyncEngine,
+    es: AsyncElasticsearch,
+    cache: CacheStore,
+    time_end: datetime.datetime,
+    cfg: TelemetryProcessingConfig,
+) -> int:
+    """Processes the raw telemetry uploads received before ``time_end`` and
+    refreshes the dashboard, returning the number of uploads processed."""
+
+    n = await process_raw_uploads(engine, time_end, cfg, cache)
+
+    # naive local time, like the timestamps in the DB
+    last_processed = datetime.datetime.now()
+    await cache.set(KEY_TELEMETRY_DATA_LAST_PROCESSED, last_processed)
+
+    await refresh_dashboard(engine, es, cache)
+    return n
+
+
+async def refresh_github_stats(
+    github: GitHub[Any],
+    cache: CacheStore,
+    cfg: GitHubConfig,
+) -> None:
+    """Refreshes the cached GitHub release download and org stats."""
+
+    stats = await query_release_downloads(github, cfg.ruyi_pm_repo)
+    await cache.set(KEY_GITHUB_RELEASE_STATS, stats)
+    logger.info("refreshed release stats of %s", cfg.ruyi_pm_repo)
+
+    stats_ide_eclipse = await query_release_downloads(github, cfg.ruyi_ide_eclipse_repo)
+    await cache.set(KEY_GITHUB_RELEASE_STATS_RUYI_IDE_ECLIPSE, stats_ide_eclipse)
+    logger.info("refreshed release stats of %s", cfg.ruyi_ide_eclipse_repo)
+
+    stats_ide_vscode = await query_release_downloads(github, cfg.ruyi_ide_vscode_repo)
+    await cache.set(KEY_GITHUB_RELEASE_STATS_RUYI_IDE_VSCODE, stats_ide_vscode)
+    logger.info("refreshed release stats of %s", cfg.ruyi_ide_vscode_repo)
+
+    org_stats = await query_org_stats(github, cfg.ruyi_org)
+    await cache.set(KEY_GITHUB_ORG_STATS_RUYISDK, org_stats.model_dump())
+    logger.info("refreshed org stats of %s", cfg.ruyi_org)
+
+
+async def refresh_pypi_stats(
+    engine: AsyncEngine,
+    cache: CacheStore,
+    package: str,
+) -> int:
+    """Fetches and persists the daily PyPI download stats of ``package``,
+    caching and returning its total download count."""
+
+    stats = await fetch_pypi_download_stats(package)
+    async with engine.connect() as conn:
+        await persist_pypi_download_stats(conn, package, stats)
+
+        new_total = await sum_pypi_download_stats(
+            conn,
+            date_start=PYPI_STATS_DATE_START,
+            date_end=datetime.date.today() + datetime.timedelta(days=1),
+            package_name=package,
+        )
+
+    # update total download count in cache
+    if new_total > 0:
+        await cache.set(KEY_PYPI_DOWNLOAD_TOTAL_PM, new_total)
+    return new_total
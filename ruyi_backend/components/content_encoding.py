@@ -0,0 +1,185 @@
+from typing import Callable
+import zlib
+
+import zstandard
+
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+# zstd output is produced in pieces this large, each checked against the
+# size limit before being kept
+_ZSTD_WRITE_SIZE = 1 << 16
+_ZSTD_SKIPPABLE_MAGIC = 0x184D2A50
+_ZSTD_SKIPPABLE_MAGIC_MASK = 0xFFFFFFF0
+_ZSTD_MAX_FRAME_HEADER_SIZE = 18
+
+
+class BodyTooLargeError(Exception):
+    """Raised when a decoded request body exceeds the configured size limit."""
+
+
+class MalformedBodyError(Exception):
+    """Raised when a request body cannot be decoded with its declared encoding."""
+
+
+class UnsupportedEncodingError(Exception):
+    """Raised for request bodies in an encoding not supported."""
+
+
+class BodyDecoder:
+    """Incrementally decodes a request body, never holding more than
+    ``max_bytes`` of decoded data."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._buf = bytearray()
+        self._taken = 0
+
+    def _room(self) -> int:
+        return self.max_bytes - self._taken - len(self._buf)
+
+    def _append(self, data: bytes) -> None:
+        if len(data) > self._room():
+            raise BodyTooLargeError(
+                f"decoded request body too large (max {self.max_bytes} bytes)",
+            )
+        self._buf += data
+
+    def feed(self, chunk: bytes) -> None:
+        self._append(chunk)
+
+    def take_lines(self) -> list[bytes]:
+        """Takes the complete lines decoded so far, for consuming newline
+        delimited bodies as they arrive. The size limit still applies to the
+        body as a whole."""
+
+        end = self._buf.rfind(b"\n")
+        if end < 0:
+            return []
+        lines = bytes(self._buf[:end]).split(b"\n")
+        self._taken += end + 1
+        del self._buf[: end + 1]
+        return lines
+
+    def finish(self) -> bytes:
+        """Returns what is decoded and not taken yet, once the whole body is
+        fed."""
+
+        return bytes(self._buf)
+
+
+class GzipBodyDecoder(BodyDecoder):
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__(max_bytes)
+        self._d = zlib.decompressobj(_GZIP_WBITS)
+
+    def feed(self, chunk: bytes) -> None:
+        data = chunk
+        while data:
+            if self._d.eof:
+                # concatenated gzip members
+                self._d = zlib.decompressobj(_GZIP_WBITS)
+            try:
+                out = self._d.decompress(data, self._room() + 1)
+            except zlib.error as e:
+                raise MalformedBodyError(str(e)) from e
+            self._append(out)
+            # with the output fitting the room, unconsumed_tail is always empty
+            data = self._d.unused_data
+
+    def finish(self) -> bytes:
+        if not self._d.eof:
+            raise MalformedBodyError("truncated gzip stream")
+        return super().finish()
+
+
+def _zstd_frames_complete(data: bytes | bytearray) -> bool:
+    """Checks that ``data`` is one or more whole zstd frames, by walking the
+    frame and block headers without decompressing anything."""
+
+    pos = 0
+    while pos < len(data):
+        magic = int.from_bytes(data[pos : pos + 4], "little")
+        if magic & _ZSTD_SKIPPABLE_MAGIC_MASK == _ZSTD_SKIPPABLE_MAGIC:
+            pos += 8 + int.from_bytes(data[pos + 4 : pos + 8], "little")
+            continue
+
+        header = bytes(data[pos : pos + _ZSTD_MAX_FRAME_HEADER_SIZE])
+        try:
+            params = zstandard.get_frame_parameters(header)
+            pos += zstandard.frame_header_size(header)
+        except zstandard.ZstdError:
+            return False
+
+        last_block = False
+        while not last_block:
+            if pos + 3 > len(data):
+                return False
+            block = int.from_bytes(data[pos : pos + 3], "little")
+            last_block = bool(block & 1)
+            # RLE blocks hold a single byte, whatever their size
+            pos += 3 + (1 if (block >> 1) & 3 == 1 else block >> 3)
+        if params.has_checksum:
+            pos += 4
+
+    return 0 < pos == len(data)
+
+
+class _BodySink:
+    def __init__(self, decoder: BodyDecoder) -> None:
+        self._decoder = decoder
+
+    def write(self, data: bytes) -> int:
+        self._decoder._append(data)
+        return len(data)
+
+
+class ZstdBodyDecoder(BodyDecoder):
+    """Decodes zstd bodies, of one or more frames.
+
+    The output is bounded by decompressing into a stream writer, whose
+    pieces of at most ``_ZSTD_WRITE_SIZE`` bytes are checked against the size
+    limit as they are produced. The compressed input is kept to check at the
+    end that it is not truncated; it is bounded by the limit on the size of
+    the body as sent."""
+
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__(max_bytes)
+        self._input = bytearray()
+        self._w = zstandard.ZstdDecompressor().stream_writer(
+            _BodySink(self),  # type: ignore[arg-type]  # only write() is needed
+            write_size=_ZSTD_WRITE_SIZE,
+            closefd=False,
+        )
+
+    def feed(self, chunk: bytes) -> None:
+        self._input += chunk
+        try:
+            self._w.write(chunk)
+        except zstandard.ZstdError as e:
+            raise MalformedBodyError(str(e)) from e
+
+    def finish(self) -> bytes:
+        if not _zstd_frames_complete(self._input):
+            raise MalformedBodyError("truncated zstd stream")
+        return super().finish()
+
+
+_DECODERS: dict[str, Callable[[int], BodyDecoder]] = {
+    "identity": BodyDecoder,
+    "gzip": GzipBodyDecoder,
+    "x-gzip": GzipBodyDecoder,
+    "zstd": ZstdBodyDecoder,
+}
+
+
+def make_body_decoder(content_encoding: str, max_bytes: int) -> BodyDecoder:
+    """Returns a decoder for a request body with the given ``Content-Encoding``
+    header value.
+
+    Raises :class:`UnsupportedEncodingError` for unknown encodings and stacked
+    encodings."""
+
+    encoding = content_encoding.strip().lower() or "identity"
+    if (factory := _DECODERS.get(encoding)) is None:
+        raise UnsupportedEncodingError(encoding)
+    return factory(max_bytes)
@@ -0,0 +1,121 @@
+"""
+Pre-serialized frontend dashboard payloads, so that serving the dashboard
+only takes picking the bytes of the right encoding, or answering 304.
+"""
+
+import datetime
+from email.utils import format_datetime
+import gzip
+import hashlib
+import importlib
+from typing import Any, Callable, NamedTuple
+
+from ..schema.frontend import DashboardDataV1
+
+DASHBOARD_CACHE_CONTROL = "public, max-age=60"
+
+
+def _brotli_compress() -> Callable[[bytes], bytes] | None:
+    for name in ("brotli", "brotlicffi"):
+        try:
+            return importlib.import_module(name).compress  # type: ignore[no-any-return]
+        except ImportError:
+            pass
+    return None
+
+
+_BROTLI_COMPRESS = _brotli_compress()
+
+
+class DashboardPayload(NamedTuple):
+    """The dashboard data serialized to JSON, in every encoding served."""
+
+    digest: str
+    """Hex digest of the JSON, for making ETags."""
+
+    last_modified: str
+    """The ``last_updated`` of the data, as an HTTP-date."""
+
+    identity: bytes
+    gzip: bytes
+    br: bytes | None
+    """Brotli-compressed JSON, or None if brotli is not available."""
+
+    @classmethod
+    def from_data(cls, data: DashboardDataV1) -> "DashboardPayload":
+        body = data.model_dump_json().encode("utf-8")
+        return cls(
+            hashlib.sha256(body).hexdigest()[:32],
+            format_datetime(
+                # naive times are local, like the timestamps in the DB
+                data.last_updated.astimezone(datetime.timezone.utc),
+                usegmt=True,
+            ),
+            body,
+            gzip.compress(body, mtime=0),
+            _BROTLI_COMPRESS(body) if _BROTLI_COMPRESS is not None else None,
+        )
+
+    def to_cache(self) -> dict[str, Any]:
+        return self._asdict()
+
+    @classmethod
+    def from_cache(cls, obj: Any) -> "DashboardPayload | None":
+        """Reads a cached payload, or None if it is missing or malformed."""
+
+        if not isinstance(obj, dict):
+            return None
+        try:
+            return cls(**obj)
+        except TypeError:
+            return None
+
+    def etag(self, encoding: str) -> str:
+        # every encoding has its own strong ETag, all sharing the digest
+        if encoding == "identity":
+            return f'"{self.digest}"'
+        return f'"{self.digest}-{encoding}"'
+
+    def is_not_modified(self, if_none_match: str | None) -> bool:
+        """Checks the ``If-None-Match`` of a request against the payload, by
+        weak comparison and in whatever encoding the ETags are of."""
+
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            tag = tag.removeprefix("W/").strip('"')
+            if tag.split("-", 1)[0] == self.digest:
+                return True
+        return False
+
+    def negotiate(self, accept_encoding: str | None) -> tuple[str, bytes]:
+        """Picks the encoding and bytes to serve according to the
+        ``Accept-Encoding`` of a request, preferring the smallest."""
+
+        accepted = _parse_accept_encoding(accept_encoding or "")
+        if self.br is not None and accepted.get("br", accepted.get("*", 0.0)) > 0:
+            return "br", self.br
+        if accepted.get("gzip", accepted.get("*", 0.0)) > 0:
+            return "gzip", self.gzip
+        return "identity", self.identity
+
+
+def _parse_accept_encoding(value: str) -> dict[str, float]:
+    result: dict[str, float] = {}
+    for item in value.split(","):
+        coding, *params = item.strip().lower().split(";")
+        if not coding:
+            continue
+        q = 1.0
+        for p in params:
+            k, _, v = p.strip().partition("=")
+            if k == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        result[coding.strip()] = q
+    return result
@@ -1,8 +1,6 @@
-from asyncio import gather
 import datetime
 import sys
 import traceback
-from typing import cast
 
 from elasticsearch import AsyncElasticsearch
 from pydantic import ValidationError
@@ -10,7 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncConnection
 from sqlalchemy.sql.expression import func, select
 
 from ..cache import (
-    KEY_FRONTEND_DASHBOARD,
+    KEY_FRONTEND_DASHBOARD_PAYLOAD,
     KEY_GITHUB_ORG_STATS_RUYISDK,
     KEY_GITHUB_RELEASE_STATS,
     KEY_GITHUB_RELEASE_STATS_RUYI_IDE_ECLIPSE,
@@ -19,15 +17,20 @@ from ..cache import (
     KEY_TELEMETRY_DATA_LAST_PROCESSED,
 )
 from ..cache.store import CacheStore
+from ..components.dashboard_payload import DashboardPayload
 from ..components.github_stats import (
     GitHubOrgStats,
     ReleaseDownloadStats,
     merge_download_counts,
 )
-from ..db.schema import (
-    telemetry_aggregated_events,
-    telemetry_installation_infos,
+from ..components.mirror_stats import mirror_download_totals
+from ..components.telemetry_counters import (
+    InstallationCounts,
+    installation_counts,
+    top_commands,
 )
+from ..components.telemetry_rollup import select_command_counts
+from ..db.schema import telemetry_installation_infos
 from ..schema.frontend import (
     DashboardDataV1,
     DashboardEventDetailV1,
@@ -51,6 +54,8 @@ async def crunch_and_cache_dashboard_numbers(
         if not isinstance(last_updated, datetime.datetime):
             # malformed cache entry
             raise ValueError()
+        # naive local time; serve it with the offset
+        last_updated = last_updated.astimezone()
     except Exception:
         # graceful degrade to something sensible
         last_updated = datetime.datetime.now(datetime.timezone.utc)
@@ -85,52 +90,22 @@ async def crunch_and_cache_dashboard_numbers(
 
     pm_pypi_downloads = await cache.get(KEY_PYPI_DOWNLOAD_TOTAL_PM) or 0
 
-    # query download counts from ES
-    now = datetime.datetime.now(tz=datetime.timezone.utc)
-
-    async def query_es_count(path: str) -> int:
-        resp = await es.count(
-            query={
-                "bool": {
-                    "must": [
-                        {"wildcard": {"url.path": {"value": path}}},
-                        {
-                            "range": {
-                                "@timestamp": {
-                                    "gte": "2025-01-01T00:00:00+08:00",
-                                    "lt": now.isoformat(),
-                                }
-                            }
-                        },
-                    ]
-                }
-            }
-        )
-        return cast(int, resp["count"])
-
-    mirror_category_download_counts = await gather(
-        query_es_count("/ruyisdk/3rdparty/*"),
-        query_es_count("/ruyisdk/dist/*"),
-        query_es_count("/ruyisdk/humans/*"),
-        query_es_count("/ruyisdk/ide/0.0.*"),  # Eclipse IDE & plugin
-        query_es_count("/ruyisdk/ide/plugins/eclipse/*"),  # Eclipse plugin only
-        query_es_count("/ruyisdk/ide/plugins/vscode/*"),
-        query_es_count("/ruyisdk/ruyi/*"),
-    )
+    # query download counts from ES, only for the days not persisted yet
+    mirror_counts = await mirror_download_totals(db, es)
 
     categories = {
         # only /ruyisdk/ruyi/ paths correspond to the RuyiSDK PM
-        "pkg": DashboardEventDetailV1(total=mirror_category_download_counts[1]),
+        "pkg": DashboardEventDetailV1(total=mirror_counts["dist"]),
         "pm:github": DashboardEventDetailV1(total=pm_gh_downloads),
-        "pm:mirror": DashboardEventDetailV1(total=mirror_category_download_counts[6]),
+        "pm:mirror": DashboardEventDetailV1(total=mirror_counts["ruyi"]),
         "pm:pypi": DashboardEventDetailV1(total=pm_pypi_downloads),
-        "3rdparty": DashboardEventDetailV1(total=mirror_category_download_counts[0]),
-        "humans": DashboardEventDetailV1(total=mirror_category_download_counts[2]),
+        "3rdparty": DashboardEventDetailV1(total=mirror_counts["3rdparty"]),
+        "humans": DashboardEventDetailV1(total=mirror_counts["humans"]),
         "ide:eclipse:mirror": DashboardEventDetailV1(
-            total=mirror_category_download_counts[3],
+            total=mirror_counts["ide:eclipse"],
         ),
         "ide:plugin:eclipse:mirror": DashboardEventDetailV1(
-            total=mirror_category_download_counts[4],
+            total=mirror_counts["ide:plugin:eclipse"],
         ),
         # Previously there was "ide:eclipse:github", but the RuyiSDK Eclipse IDE
         # never got distributed on GitHub Releases; what's there is the plugin
@@ -140,7 +115,7 @@ async def crunch_and_cache_dashboard_numbers(
             total=ide_eclipse_gh_downloads,
         ),
         "ide:plugin:vscode:mirror": DashboardEventDetailV1(
-            total=mirror_category_download_counts[5],
+            total=mirror_counts["ide:plugin:vscode"],
         ),
         "ide:plugin:vscode:github": DashboardEventDetailV1(
             total=ide_vscode_gh_downloads,
@@ -163,46 +138,51 @@ async def crunch_and_cache_dashboard_numbers(
         del other_categories[k]
     other_categories["ide"] = ide_downloads
 
-    # count total installations
-    installation_count = await db.scalar(
-        select(
-            func.count(func.distinct(telemetry_installation_infos.c.report_uuid))
-        ).select_from(telemetry_installation_infos),
-    )
-    installation_count = installation_count or 0
-
-    # count invocations grouped by individual ruyi commands
-    command_counts: dict[str, int] = {}
-    async for ev in await db.stream(
-        select(
-            telemetry_aggregated_events.c.params_kv_raw,
-            telemetry_aggregated_events.c.count,
-        ).where(
-            telemetry_aggregated_events.c.kind == "cli:invocation-v1",
-        ),
-    ):
-        kv = {k: v for k, v in ev[0]}  # [["key", "xxx"], ] => {"key": "xxx"}
-        count = ev[1]
-
-        cmd = kv.get("key")
-        if cmd is None:
-            continue
-
-        cmd = "ruyi" if cmd == "<bare>" else f"ruyi {cmd}"
-        command_counts[cmd] = command_counts.get(cmd, 0) + count
-
-    sorted_command_counts = dict(
-        sorted(
-            command_counts.items(),
-            key=lambda x: x[1],
-            reverse=True,
+    # count total and recently active installations, estimated from the live
+    # HyperLogLogs once bootstrapped, or else counted exactly in the DB
+    installs = InstallationCounts(0, 0, 0)
+    try:
+        installs = await installation_counts(cache)
+    except Exception as e:
+        traceback.print_exception(e, file=sys.stderr)
+        print("Failed to read live installation counters; ignoring", file=sys.stderr)
+
+    active_installs_7d: DashboardEventDetailV1 | None = None
+    active_installs_30d: DashboardEventDetailV1 | None = None
+    if installs.total > 0:
+        installation_count = installs.total
+        active_installs_7d = DashboardEventDetailV1(total=installs.active_7d)
+        active_installs_30d = DashboardEventDetailV1(total=installs.active_30d)
+    else:
+        installation_count = (
+            await db.scalar(
+                select(
+                    func.count(
+                        func.distinct(telemetry_installation_infos.c.report_uuid)
+                    )
+                ).select_from(telemetry_installation_infos),
+            )
+            or 0
         )
-    )
 
-    top10_sorted_commands = {
-        k: DashboardEventDetailV1(total=v)
-        for k, v in list(sorted_command_counts.items())[:10]
-    }
+    # count invocations grouped by individual ruyi commands, read from the
+    # live counters once bootstrapped, or else summed up in the DB
+    top_command_counts: list[tuple[str, int]] = []
+    try:
+        top_command_counts = await top_commands(cache, 10)
+    except Exception as e:
+        traceback.print_exception(e, file=sys.stderr)
+        print("Failed to read live command counters; ignoring", file=sys.stderr)
+    if not top_command_counts:
+        async for row in await db.stream(
+            select_command_counts("cli:invocation-v1", limit=10),
+        ):
+            top_command_counts.append((row[0], row[1]))
+
+    top10_sorted_commands: dict[str, DashboardEventDetailV1] = {}
+    for cmd, count in top_command_counts:
+        cmd = "ruyi" if cmd == "<bare>" else f"ruyi {cmd}"
+        top10_sorted_commands[cmd] = DashboardEventDetailV1(total=count)
 
     result = DashboardDataV1(
         last_updated=last_updated,
@@ -211,6 +191,8 @@ async def crunch_and_cache_dashboard_numbers(
         other_categories_downloads=other_categories,
         downloads_by_categories_v1=categories,
         installs=DashboardEventDetailV1(total=installation_count),
+        active_installs_7d=active_installs_7d,
+        active_installs_30d=active_installs_30d,
         top_packages={},  # TODO: numbers are not reported yet
         top_commands=top10_sorted_commands,
         github_org_stats=gh_org_stats,
@@ -218,7 +200,8 @@ async def crunch_and_cache_dashboard_numbers(
 
     # cache the result
     try:
-        await cache.set(KEY_FRONTEND_DASHBOARD, result.model_dump())
+        payload = DashboardPayload.from_data(result)
+        await cache.set(KEY_FRONTEND_DASHBOARD_PAYLOAD, payload.to_cache())
     except Exception as e:
         # ignore cache errors
         traceback.print_exception(e, file=sys.stderr)
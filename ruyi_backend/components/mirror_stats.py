@@ -0,0 +1,185 @@
+import datetime
+from typing import Any
+
+from elasticsearch import AsyncElasticsearch
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.sql.expression import func, select
+
+from ..db.schema import ModelDownloadStatsDailyMirror, download_stats_daily_mirror
+
+MIRROR_STATS_TZ = datetime.timezone(datetime.timedelta(hours=8))
+"""The timezone whose calendar days the mirror download stats are kept by."""
+
+MIRROR_STATS_DATE_START = datetime.date(2025, 1, 1)
+
+MIRROR_STATS_SETTLE_TIME = datetime.timedelta(hours=1)
+"""How long after its end a day is considered closed, so that access logs
+ingested late are still counted before the day's counts are persisted."""
+
+MIRROR_CATEGORY_PATHS: dict[str, str] = {
+    "3rdparty": "/ruyisdk/3rdparty/*",
+    "dist": "/ruyisdk/dist/*",
+    "humans": "/ruyisdk/humans/*",
+    "ide:eclipse": "/ruyisdk/ide/0.0.*",  # Eclipse IDE & plugin
+    "ide:plugin:eclipse": "/ruyisdk/ide/plugins/eclipse/*",  # Eclipse plugin only
+    "ide:plugin:vscode": "/ruyisdk/ide/plugins/vscode/*",
+    "ruyi": "/ruyisdk/ruyi/*",
+}
+"""Wildcards of the mirror URL paths counted, by download category."""
+
+
+def _day_start(date: datetime.date) -> datetime.datetime:
+    return datetime.datetime.combine(date, datetime.time(), MIRROR_STATS_TZ)
+
+
+def _is_closed(date: datetime.date, now: datetime.datetime) -> bool:
+    end = _day_start(date + datetime.timedelta(days=1))
+    return end + MIRROR_STATS_SETTLE_TIME <= now
+
+
+async def query_mirror_daily_counts(
+    es: AsyncElasticsearch,
+    date_start: datetime.date,
+    now: datetime.datetime,
+) -> dict[datetime.date, dict[str, int]]:
+    """Counts the mirror downloads of every category from the start of
+    ``date_start`` until ``now``, by day.
+
+    This is a single search aggregating the matching access logs into daily
+    buckets, each split into the categories, instead of one count per
+    category and day."""
+
+    today = now.astimezone(MIRROR_STATS_TZ).date()
+    wildcards: dict[str, Any] = {
+        category: {"wildcard": {"url.path": {"value": path}}}
+        for category, path in MIRROR_CATEGORY_PATHS.items()
+    }
+    resp = await es.search(
+        size=0,
+        track_total_hits=False,
+        query={
+            "bool": {
+                "filter": [
+                    {
+                        "range": {
+                            "@timestamp": {
+                                "gte": _day_start(date_start).isoformat(),
+                                "lt": now.isoformat(),
+                            }
+                        }
+                    },
+                ],
+                "should": list(wildcards.values()),
+                "minimum_should_match": 1,
+            }
+        },
+        aggs={
+            "days": {
+                "date_histogram": {
+                    "field": "@timestamp",
+                    "calendar_interval": "1d",
+                    "time_zone": "+08:00",
+                    "format": "yyyy-MM-dd",
+                    # emit empty days too, so that they get persisted as well
+                    "min_doc_count": 0,
+                    "extended_bounds": {
+                        "min": date_start.isoformat(),
+                        "max": today.isoformat(),
+                    },
+                },
+                "aggs": {"categories": {"filters": {"filters": wildcards}}},
+            },
+        },
+    )
+
+    result: dict[datetime.date, dict[str, int]] = {}
+    for bucket in resp["aggregations"]["days"]["buckets"]:
+        date = datetime.date.fromisoformat(bucket["key_as_string"])
+        result[date] = {
+            category: int(v["doc_count"])
+            for category, v in bucket["categories"]["buckets"].items()
+        }
+
+    return result
+
+
+async def last_persisted_mirror_date(conn: AsyncConnection) -> datetime.date | None:
+    """Queries the last day whose mirror download stats are persisted."""
+
+    last = await conn.scalar(select(func.max(download_stats_daily_mirror.c.date)))
+    return last.date() if last is not None else None
+
+
+async def persist_mirror_daily_counts(
+    conn: AsyncConnection,
+    counts: dict[datetime.date, dict[str, int]],
+) -> None:
+    """Persists the given daily mirror download counts into the database.
+
+    Existing entries for the same (category, date) will be untouched."""
+
+    buf: list[ModelDownloadStatsDailyMirror] = []
+    for date, by_category in sorted(counts.items()):
+        for category, count in by_category.items():
+            buf.append(
+                ModelDownloadStatsDailyMirror(
+                    category=category,
+                    date=datetime.datetime(date.year, date.month, date.day),
+                    count=count,
+                ),
+            )
+
+    if not buf:
+        return
+
+    await conn.execute(
+        download_stats_daily_mirror.insert().prefix_with("IGNORE"),
+        buf,
+    )
+    await conn.commit()
+
+
+async def sum_mirror_download_stats(conn: AsyncConnection) -> dict[str, int]:
+    """Queries the total download counts by category, using data persisted in
+    the database."""
+
+    t = download_stats_daily_mirror
+    res = await conn.execute(
+        select(t.c.category, func.sum(t.c.count)).group_by(t.c.category),
+    )
+    return {str(row[0]): int(row[1]) for row in res}
+
+
+async def mirror_download_totals(
+    conn: AsyncConnection,
+    es: AsyncElasticsearch,
+    now: datetime.datetime | None = None,
+) -> dict[str, int]:
+    """Counts the mirror downloads of every category up until ``now``.
+
+    Only the days not persisted yet are queried from Elasticsearch, and those
+    of them closed by now get persisted, so that the cost of this stays flat
+    as the history grows."""
+
+    if now is None:
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+
+    last = await last_persisted_mirror_date(conn)
+    date_start = (
+        last + datetime.timedelta(days=1)
+        if last is not None
+        else MIRROR_STATS_DATE_START
+    )
+
+    daily = await query_mirror_daily_counts(es, date_start, now)
+    closed = {date: c for date, c in daily.items() if _is_closed(date, now)}
+    await persist_mirror_daily_counts(conn, closed)
+
+    totals = await sum_mirror_download_stats(conn)
+    for date, by_category in daily.items():
+        if date in closed:
+            continue
+        for category, count in by_category.items():
+            totals[category] = totals.get(category, 0) + count
+
+    return {category: totals.get(category, 0) for category in MIRROR_CATEGORY_PATHS}
@@ -0,0 +1,40 @@
+import datetime
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.sql.expression import func, select
+
+from ..db.schema import telemetry_ruyi_version_counts
+from .telemetry_ingest import hour_bucket
+
+
+async def query_ruyi_version_adoption(
+    conn: AsyncConnection,
+    time_start: datetime.datetime,
+    time_end: datetime.datetime,
+) -> dict[str, int]:
+    """Queries the number of telemetry uploads per ruyi version received in the
+    given time range, most popular versions first.
+
+    Counts are kept per hour, so the range is effectively widened to whole
+    hours: ``time_start`` is rounded down and ``time_end`` is rounded up."""
+
+    end_bucket = hour_bucket(time_end)
+    if end_bucket < time_end:
+        end_bucket += datetime.timedelta(hours=1)
+
+    c = telemetry_ruyi_version_counts.c
+    total = func.sum(c.count).label("total")
+    sel = (
+        select(c.version, total)
+        .where(
+            c.bucket >= hour_bucket(time_start),
+            c.bucket < end_bucket,
+        )
+        .group_by(c.version)
+        .order_by(total.desc(), c.version)
+    )
+
+    result: dict[str, int] = {}
+    async for row in await conn.stream(sel):
+        result[row[0]] = int(row[1])
+    return result
@@ -0,0 +1,112 @@
+from typing import Annotated, AsyncIterator, TypeAlias
+
+from fastapi import Depends, HTTPException, status
+
+from ..config.env import DIEnvConfig, TelemetryAdmissionConfig
+from ..db.conn import MAIN_DB_POOL_WAIT, PoolWaitTracker
+from ..schema.admin import TelemetryAdmissionStatsV1
+
+
+class AdmissionController:
+    """Sheds telemetry requests early when the worker is overloaded, so that
+    a slow DB does not make requests pile up and starve other routes sharing
+    the event loop.
+
+    Too many requests in flight are answered with 429, and a slow DB
+    connection pool with 503, both carrying ``Retry-After``."""
+
+    def __init__(
+        self,
+        cfg: TelemetryAdmissionConfig,
+        pool_wait: PoolWaitTracker,
+    ) -> None:
+        self.cfg = cfg
+        self.pool_wait = pool_wait
+        self._stats = TelemetryAdmissionStatsV1()
+
+    @property
+    def stats(self) -> TelemetryAdmissionStatsV1:
+        self._stats.pool_wait_ms = self.pool_wait.average * 1000
+        return self._stats
+
+    def _shed(self, status_code: int, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self.cfg.retry_after_seconds)},
+        )
+
+    def admit(self) -> None:
+        """Admits a request, or raises an :class:`HTTPException` to shed it.
+        Every admitted request must be :meth:`release`-d."""
+
+        st = self._stats
+        if self.cfg.max_in_flight > 0 and st.in_flight >= self.cfg.max_in_flight:
+            st.shed_in_flight += 1
+            raise self._shed(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                "Too many telemetry uploads in flight, please retry later",
+            )
+
+        if (
+            self.cfg.max_pool_wait_ms > 0
+            and self.pool_wait.average * 1000 > self.cfg.max_pool_wait_ms
+        ):
+            st.shed_pool_wait += 1
+            raise self._shed(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                "Telemetry ingestion is overloaded, please retry later",
+            )
+
+        st.accepted += 1
+        st.in_flight += 1
+
+    def release(self) -> None:
+        self._stats.in_flight -= 1
+
+
+class _AdmissionState:
+    controller: AdmissionController | None = None
+
+
+_ADMISSION = _AdmissionState()
+
+
+def get_telemetry_admission() -> AdmissionController | None:
+    """Returns the telemetry admission controller, or None if disabled."""
+
+    return _ADMISSION.controller
+
+
+def init_telemetry_admission(cfg: DIEnvConfig) -> None:
+    adm_cfg = cfg.telemetry.admission
+    if _ADMISSION.controller is not None:
+        return
+    if adm_cfg.max_in_flight <= 0 and adm_cfg.max_pool_wait_ms <= 0:
+        return
+
+    MAIN_DB_POOL_WAIT.half_life = adm_cfg.pool_wait_half_life_ms / 1000
+    _ADMISSION.controller = AdmissionController(adm_cfg, MAIN_DB_POOL_WAIT)
+
+
+DITelemetryAdmission: TypeAlias = Annotated[
+    AdmissionController | None,
+    Depends(get_telemetry_admission),
+]
+"""Dependency on the telemetry admission controller, if enabled."""
+
+
+async def admit_telemetry_request(
+    admission: DITelemetryAdmission,
+) -> AsyncIterator[None]:
+    """Router-level dependency applying admission control to a request."""
+
+    if admission is None:
+        yield
+        return
+
+    admission.admit()
+    try:
+        yield
+    finally:
+        admission.release()
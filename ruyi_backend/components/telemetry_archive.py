@@ -0,0 +1,352 @@
+import asyncio
+from collections import defaultdict
+import datetime
+import gzip
+import json
+import logging
+import os
+from typing import Callable, Iterator, NamedTuple, Sequence
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+import zstandard
+
+from ..cache.store import CacheStore
+from ..config.env import TelemetryArchiveConfig, TelemetryProcessingConfig
+from ..db.bulk import BulkWriter
+from .telemetry_counters import apply_live_deltas
+from .telemetry_processor import (
+    SQL_SELECT_PROCESSING_WATERMARK,
+    WATERMARK_TELEMETRY_PROCESSING,
+    PayloadValidator,
+    process_telemetry_data,
+    split_invalid_payloads,
+)
+
+logger = logging.getLogger(__name__)
+
+SQL_SELECT_ARCHIVABLE_RAW_UPLOADS = text(
+    "SELECT `id`, `nonce`, `created_at`, `raw_events` FROM `telemetry_raw_uploads` WHERE `id` > :after_id AND `id` <= :watermark AND `created_at` < :before ORDER BY `id` LIMIT :limit"
+)
+SQL_DELETE_RAW_UPLOADS = text(
+    "DELETE FROM `telemetry_raw_uploads` WHERE `id` IN :ids"
+).bindparams(bindparam("ids", expanding=True))
+
+SEGMENT_SUFFIX = ".ndjson"
+INDEX_SUFFIX = ".idx"
+
+
+COMPRESSION_SUFFIX = ".zst"
+"""Compression of newly written segments."""
+
+_DECOMPRESSORS: dict[str, Callable[[bytes], bytes]] = {
+    # the frames written carry their content size, so one-shot decompression
+    # works
+    ".zst": lambda data: zstandard.ZstdDecompressor().decompress(data),
+    # segments written by earlier versions, when zstd was optional
+    ".gz": gzip.decompress,
+}
+
+
+class ArchivedUpload(NamedTuple):
+    id: int
+    nonce: str
+    created_at: datetime.datetime
+    raw_events: str
+    """The raw upload document as stored, in JSON."""
+
+    def to_json_line(self) -> bytes:
+        doc = {
+            "id": self.id,
+            "nonce": self.nonce,
+            "created_at": self.created_at.isoformat(),
+            "raw_events": self.raw_events,
+        }
+        return json.dumps(doc, separators=(",", ":")).encode("utf-8") + b"\n"
+
+    @classmethod
+    def from_json_line(cls, line: bytes) -> "ArchivedUpload":
+        doc = json.loads(line)
+        return cls(
+            doc["id"],
+            doc["nonce"],
+            datetime.datetime.fromisoformat(doc["created_at"]),
+            doc["raw_events"],
+        )
+
+
+class FrameIndexEntry(NamedTuple):
+    """Location of one independently compressed frame of a segment."""
+
+    first_id: int
+    last_id: int
+    offset: int
+    length: int
+    rows: int
+
+
+def segment_dir(directory: str, date: datetime.date) -> str:
+    return os.path.join(directory, f"{date:%Y}", f"{date:%m}", f"{date:%d}")
+
+
+def _append_frame(path: str, uploads: Sequence[ArchivedUpload]) -> None:
+    """Appends uploads to a segment as one compressed frame, and the frame to
+    the segment's index, making both durable."""
+
+    frame = zstandard.ZstdCompressor().compress(
+        b"".join(u.to_json_line() for u in uploads),
+    )
+
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    with open(path, "ab") as f:
+        offset = f.seek(0, os.SEEK_END)
+        f.write(frame)
+        f.flush()
+        os.fsync(f.fileno())
+
+    entry = FrameIndexEntry(
+        uploads[0].id, uploads[-1].id, offset, len(frame), len(uploads)
+    )
+    with open(path + INDEX_SUFFIX, "ab") as f:
+        f.write(json.dumps(entry).encode("utf-8") + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_segment_index(path: str) -> list[FrameIndexEntry]:
+    """Reads the index of a segment, ignoring a torn last entry."""
+
+    result: list[FrameIndexEntry] = []
+    with open(path + INDEX_SUFFIX, "rb") as f:
+        for line in f:
+            try:
+                result.append(FrameIndexEntry(*json.loads(line)))
+            except ValueError:
+                logger.warning("ignoring torn index entry of archive segment %s", path)
+                break
+    return result
+
+
+def read_segment(path: str, min_id: int = 0) -> Iterator[ArchivedUpload]:
+    """Yields the uploads of a segment with ids not below ``min_id``,
+    decompressing only the frames that may contain them.
+
+    Frames not in the index (i.e. written by a crashed archival run, whose
+    uploads were therefore not deleted) are not read."""
+
+    suffix = os.path.splitext(path)[1]
+    if (decompress := _DECOMPRESSORS.get(suffix)) is None:
+        raise ValueError(f"unsupported archive segment compression: {path}")
+
+    with open(path, "rb") as f:
+        for entry in read_segment_index(path):
+            if entry.last_id < min_id:
+                continue
+            f.seek(entry.offset)
+            for line in decompress(f.read(entry.length)).splitlines():
+                upload = ArchivedUpload.from_json_line(line)
+                if upload.id >= min_id:
+                    yield upload
+
+
+def list_segments(
+    directory: str,
+    date_start: datetime.date | None = None,
+    date_end: datetime.date | None = None,
+) -> list[str]:
+    """Lists the segments of uploads received within ``[date_start,
+    date_end)``, in date and id order."""
+
+    result: list[str] = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        rel = os.path.relpath(root, directory).split(os.sep)
+        if len(rel) == 3:
+            try:
+                date = datetime.date(*map(int, rel))
+            except ValueError:
+                continue
+            if date_start is not None and date < date_start:
+                continue
+            if date_end is not None and date >= date_end:
+                continue
+        result.extend(
+            os.path.join(root, name)
+            for name in sorted(files)
+            if os.path.splitext(name)[0].endswith(SEGMENT_SUFFIX)
+        )
+    return result
+
+
+def iter_archive(
+    directory: str,
+    date_start: datetime.date | None = None,
+    date_end: datetime.date | None = None,
+) -> Iterator[ArchivedUpload]:
+    """Yields every archived upload received within ``[date_start,
+    date_end)`` once, even if archived twice due to a crash between
+    archiving and deleting it.
+
+    Uploads of a date are archived in id order, into segments named by the
+    first id archived, so reading them in order the ids only go back for
+    uploads archived again, all of which have been yielded already. Skipping
+    those takes the last id yielded of the date, and no set of all the ids
+    seen."""
+
+    last_dir: str | None = None
+    last_id = 0
+    for path in list_segments(directory, date_start, date_end):
+        if (seg_dir := os.path.dirname(path)) != last_dir:
+            last_dir, last_id = seg_dir, 0
+        for upload in read_segment(path, min_id=last_id + 1):
+            if upload.id > last_id:
+                last_id = upload.id
+                yield upload
+
+
+class TelemetryArchiver:
+    """Moves processed raw uploads older than the retention window out of the
+    DB into compressed NDJSON segment files, partitioned by the date the
+    uploads were received.
+
+    Uploads are read in batches by keyset pagination on ``id``, and only
+    those already processed (i.e. not after the processing watermark) are
+    archived. Every batch is appended to the segments as one compressed frame
+    per date, recorded in an offset index next to each segment so that
+    readers can seek to it, and made durable before the uploads get deleted
+    in small batches, keeping the deletes' locks and undo log short."""
+
+    def __init__(self, engine: AsyncEngine, cfg: TelemetryArchiveConfig) -> None:
+        self._engine = engine
+        self._cfg = cfg
+        self._segments: dict[datetime.date, str] = {}
+
+    def _segment_for(self, date: datetime.date, first_id: int) -> str:
+        path = self._segments.get(date)
+        if path is not None:
+            try:
+                if os.path.getsize(path) < self._cfg.segment_max_bytes:
+                    return path
+            except FileNotFoundError:
+                pass
+
+        name = f"{first_id:020d}{SEGMENT_SUFFIX}{COMPRESSION_SUFFIX}"
+        path = os.path.join(segment_dir(self._cfg.directory, date), name)
+        self._segments[date] = path
+        return path
+
+    async def run(self, now: datetime.datetime | None = None) -> int:
+        """Archives all archivable uploads, returning their number."""
+
+        if now is None:
+            now = datetime.datetime.now()
+        before = now - datetime.timedelta(days=self._cfg.retention_days)
+
+        async with self._engine.connect() as conn:
+            res = await conn.execute(
+                SQL_SELECT_PROCESSING_WATERMARK,
+                {"name": WATERMARK_TELEMETRY_PROCESSING},
+            )
+            watermark = res.scalar_one_or_none() or 0
+            await conn.rollback()
+
+            total = 0
+            after_id = 0
+            while True:
+                res = await conn.execute(
+                    SQL_SELECT_ARCHIVABLE_RAW_UPLOADS,
+                    {
+                        "after_id": after_id,
+                        "watermark": watermark,
+                        "before": before,
+                        "limit": self._cfg.batch_size,
+                    },
+                )
+                uploads = [
+                    ArchivedUpload(row[0], str(row[1]), row[2], row[3]) for row in res
+                ]
+                await conn.rollback()
+                if not uploads:
+                    break
+
+                by_date: dict[datetime.date, list[ArchivedUpload]] = defaultdict(list)
+                for u in uploads:
+                    by_date[u.created_at.date()].append(u)
+                for date, group in sorted(by_date.items()):
+                    path = self._segment_for(date, group[0].id)
+                    await asyncio.to_thread(_append_frame, path, group)
+
+                ids = [u.id for u in uploads]
+                for i in range(0, len(ids), self._cfg.delete_batch_size):
+                    await conn.execute(
+                        SQL_DELETE_RAW_UPLOADS,
+                        {"ids": ids[i : i + self._cfg.delete_batch_size]},
+                    )
+                    await conn.commit()
+
+                total += len(uploads)
+                after_id = ids[-1]
+                logger.info(
+                    "archived %d raw telemetry uploads up to id %d",
+                    total,
+                    after_id,
+                )
+
+        return total
+
+
+async def replay_archive(
+    engine: AsyncEngine,
+    directory: str,
+    cfg: TelemetryProcessingConfig,
+    date_start: datetime.date | None = None,
+    date_end: datetime.date | None = None,
+    cache: CacheStore | None = None,
+) -> int:
+    """Processes the archived uploads received within ``[date_start,
+    date_end)`` again, returning their number.
+
+    This adds to the aggregated data (and the live counters in ``cache``, if
+    given), so it is meant for rebuilding the aggregates of a
+    time range after clearing them."""
+
+    validator = PayloadValidator(cfg.validation_processes, cfg.validation_chunk_size)
+    writer = BulkWriter(cfg.write_chunk_size, cfg.load_data_min_rows)
+    total = 0
+    try:
+        async with engine.connect() as conn:
+            uploads = iter_archive(directory, date_start, date_end)
+            while True:
+                chunk = await asyncio.to_thread(_take, uploads, cfg.chunk_size)
+                if not chunk:
+                    break
+                events, received_at, _ = split_invalid_payloads(
+                    [u.id for u in chunk],
+                    [u.created_at for u in chunk],
+                    await validator.validate([u.raw_events for u in chunk]),
+                )
+                deltas = await process_telemetry_data(
+                    conn,
+                    events,
+                    received_at,
+                    writer,
+                )
+                await conn.commit()
+                if cache is not None:
+                    await apply_live_deltas(cache, deltas)
+                total += len(chunk)
+                logger.info("replayed %d archived telemetry uploads", total)
+    finally:
+        validator.close()
+        writer.log_stats()
+
+    return total
+
+
+def _take(it: Iterator[ArchivedUpload], n: int) -> list[ArchivedUpload]:
+    result: list[ArchivedUpload] = []
+    for x in it:
+        result.append(x)
+        if len(result) >= n:
+            break
+    return result
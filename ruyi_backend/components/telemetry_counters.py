@@ -0,0 +1,248 @@
+from collections import Counter
+import datetime
+import logging
+from typing import NamedTuple
+import uuid
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..cache import (
+    KEY_PREFIX_TELEMETRY_ACTIVE_INSTALLS,
+    KEY_TELEMETRY_COMMAND_COUNTERS_BOOTSTRAPPED,
+    KEY_TELEMETRY_COMMAND_TOP,
+    KEY_TELEMETRY_COMMAND_TOTALS,
+    KEY_TELEMETRY_INSTALL_COUNTERS_BOOTSTRAPPED,
+    KEY_TELEMETRY_INSTALLS,
+)
+from ..cache.store import CacheStore
+from ..db.schema import telemetry_installation_infos
+from .telemetry_rollup import select_command_counts
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_INSTALLS_DAYS_KEPT = 35
+"""Number of days the per-day active installation HyperLogLogs are kept,
+covering the longest activity window with some margin."""
+
+RECONCILE_BATCH_SIZE = 1000
+
+# Raw uploads may be stored as a JSON string containing the payload, which
+# JSON_UNQUOTE turns into the payload, leaving other documents as is. The
+# report UUID is taken as in processing: from the installation info, or the
+# bare report_uuid of uploads without one.
+SQL_SELECT_ACTIVE_INSTALLS_SINCE = text(
+    "SELECT DISTINCT DATE(`created_at`), COALESCE(JSON_VALUE(JSON_UNQUOTE(`raw_events`), '$.installation.report_uuid'), JSON_VALUE(JSON_UNQUOTE(`raw_events`), '$.report_uuid')) FROM `telemetry_raw_uploads` WHERE `created_at` >= :since"
+)
+
+
+class LiveCounterDeltas(NamedTuple):
+    """What processing some uploads adds to the live counters."""
+
+    commands: Counter[str]
+    """Invocation counts by command."""
+
+    active_installs: dict[datetime.date, set[str]]
+    """Report UUIDs (in hex) of the installations seen, by day seen."""
+
+
+def active_installs_key(day: datetime.date) -> str:
+    return f"{KEY_PREFIX_TELEMETRY_ACTIVE_INSTALLS}{day:%Y%m%d}"
+
+
+async def apply_live_deltas(
+    cache: CacheStore,
+    deltas: LiveCounterDeltas,
+    today: datetime.date | None = None,
+) -> None:
+    """Adds newly processed uploads to the live counters.
+
+    This is done after the uploads are committed to the DB, so that failures
+    only ever make the counters lag behind, never count twice; failures are
+    logged and otherwise ignored, until the next reconciliation."""
+
+    if today is None:
+        today = datetime.date.today()
+    oldest_kept = today - datetime.timedelta(days=ACTIVE_INSTALLS_DAYS_KEPT - 1)
+
+    try:
+        await cache.incr_counters(
+            KEY_TELEMETRY_COMMAND_TOTALS,
+            KEY_TELEMETRY_COMMAND_TOP,
+            deltas.commands,
+        )
+
+        await cache.pfadd(
+            KEY_TELEMETRY_INSTALLS,
+            set().union(*deltas.active_installs.values()),
+        )
+        for day, report_uuids in sorted(deltas.active_installs.items()):
+            if day >= oldest_kept:
+                await cache.pfadd(
+                    active_installs_key(day),
+                    report_uuids,
+                    ex=ACTIVE_INSTALLS_DAYS_KEPT * 86400,
+                )
+    except Exception:
+        logger.exception("failed to update live telemetry counters; ignoring")
+
+
+async def reconcile_command_counters(
+    engine: AsyncEngine,
+    cache: CacheStore,
+    kind: str = "cli:invocation-v1",
+) -> dict[str, int]:
+    """Rebuilds the live command counters from the DB, returning the totals,
+    and marks them as bootstrapped, i.e. to be read from then on.
+
+    Counts processed while this runs may be missed or counted twice, so this
+    is best run when no processing is."""
+
+    async with engine.connect() as conn:
+        totals = {
+            str(row[0]): int(row[1])
+            for row in await conn.execute(select_command_counts(kind))
+        }
+
+    await cache.replace_counters(
+        KEY_TELEMETRY_COMMAND_TOTALS,
+        KEY_TELEMETRY_COMMAND_TOP,
+        totals,
+    )
+    await cache.set(
+        KEY_TELEMETRY_COMMAND_COUNTERS_BOOTSTRAPPED,
+        datetime.datetime.now(datetime.timezone.utc),
+    )
+    return totals
+
+
+async def _rebuild_hll(
+    cache: CacheStore,
+    name: str,
+    values: list[str],
+    ex: int | None = None,
+) -> None:
+    # built aside and renamed over the live one, so that readers never see a
+    # partially built HyperLogLog
+    if not values:
+        await cache.delete(name)
+        return
+
+    tmp = f"{name}:rebuild"
+    await cache.delete(tmp)
+    for i in range(0, len(values), RECONCILE_BATCH_SIZE):
+        await cache.pfadd(tmp, values[i : i + RECONCILE_BATCH_SIZE], ex=ex)
+    await cache.rename(tmp, name)
+
+
+async def reconcile_installation_counters(
+    engine: AsyncEngine,
+    cache: CacheStore,
+    today: datetime.date | None = None,
+) -> int:
+    """Rebuilds the installation HyperLogLogs from the DB, returning the
+    estimated number of installations ever seen, and marks them as
+    bootstrapped, i.e. to be read from then on.
+
+    As adding to a HyperLogLog is idempotent, this is safe to run at any
+    time; uploads not processed yet are counted already. Installations only
+    ever reporting a bare report_uuid, and thus without installation info in
+    the DB, count towards the total if active in the days kept."""
+
+    if today is None:
+        today = datetime.date.today()
+    since = today - datetime.timedelta(days=ACTIVE_INSTALLS_DAYS_KEPT - 1)
+
+    # streamed, as there may be too many installations to hold at once
+    tmp = f"{KEY_TELEMETRY_INSTALLS}:rebuild"
+    await cache.delete(tmp)
+    n = 0
+    by_day: dict[datetime.date, list[str]] = {
+        since + datetime.timedelta(days=i): [] for i in range(ACTIVE_INSTALLS_DAYS_KEPT)
+    }
+    async with engine.connect() as conn:
+        res = await conn.stream(select(telemetry_installation_infos.c.report_uuid))
+        async for rows in res.partitions(RECONCILE_BATCH_SIZE):
+            await cache.pfadd(tmp, [uuid.UUID(str(row[0])).hex for row in rows])
+            n += len(rows)
+
+        res = await conn.stream(
+            SQL_SELECT_ACTIVE_INSTALLS_SINCE,
+            {"since": datetime.datetime.combine(since, datetime.time())},
+        )
+        async for row in res:
+            day, report_uuid = row[0], row[1]
+            if report_uuid is None or day not in by_day:
+                continue
+            try:
+                by_day[day].append(uuid.UUID(report_uuid).hex)
+            except ValueError:
+                continue
+
+    # as added to the total by processing
+    for report_uuids in by_day.values():
+        for i in range(0, len(report_uuids), RECONCILE_BATCH_SIZE):
+            await cache.pfadd(tmp, report_uuids[i : i + RECONCILE_BATCH_SIZE])
+        n += len(report_uuids)
+
+    if n:
+        await cache.rename(tmp, KEY_TELEMETRY_INSTALLS)
+    else:
+        await cache.delete(KEY_TELEMETRY_INSTALLS)
+    for day, report_uuids in by_day.items():
+        await _rebuild_hll(
+            cache,
+            active_installs_key(day),
+            report_uuids,
+            ex=ACTIVE_INSTALLS_DAYS_KEPT * 86400,
+        )
+
+    await cache.set(
+        KEY_TELEMETRY_INSTALL_COUNTERS_BOOTSTRAPPED,
+        datetime.datetime.now(datetime.timezone.utc),
+    )
+    return await cache.pfcount(KEY_TELEMETRY_INSTALLS)
+
+
+async def top_commands(cache: CacheStore, n: int) -> list[tuple[str, int]]:
+    """Reads the ``n`` most invoked commands from the live counters, which
+    is empty if they have not been bootstrapped from the DB yet.
+
+    Processing adds to the counters whether bootstrapped or not, so without
+    the marker they would only count the uploads processed since deploying."""
+
+    if await cache.get(KEY_TELEMETRY_COMMAND_COUNTERS_BOOTSTRAPPED) is None:
+        return []
+    return await cache.top_counters(KEY_TELEMETRY_COMMAND_TOP, n)
+
+
+class InstallationCounts(NamedTuple):
+    total: int
+    active_7d: int
+    active_30d: int
+
+
+async def installation_counts(
+    cache: CacheStore,
+    today: datetime.date | None = None,
+) -> InstallationCounts:
+    """Estimates the number of installations ever seen, and seen in the last 7
+    and 30 days (including today), from the live HyperLogLogs; all zero if
+    they have not been bootstrapped from the DB yet."""
+
+    if await cache.get(KEY_TELEMETRY_INSTALL_COUNTERS_BOOTSTRAPPED) is None:
+        return InstallationCounts(0, 0, 0)
+
+    if today is None:
+        today = datetime.date.today()
+
+    def last_days(n: int) -> list[str]:
+        return [
+            active_installs_key(today - datetime.timedelta(days=i)) for i in range(n)
+        ]
+
+    return InstallationCounts(
+        await cache.pfcount(KEY_TELEMETRY_INSTALLS),
+        await cache.pfcount(*last_days(7)),
+        await cache.pfcount(*last_days(30)),
+    )
@@ -0,0 +1,208 @@
+from abc import ABC, abstractmethod
+from hashlib import blake2b
+import logging
+import random
+import time
+from typing import Annotated, TypeAlias
+import uuid
+
+from fastapi import Depends
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..cache import (
+    KEY_PREFIX_TELEMETRY_NONCE,
+    KEY_PREFIX_TELEMETRY_NONCE_BLOOM,
+    get_cache_store,
+)
+from ..cache.store import CacheStore
+from ..config.env import DIEnvConfig, TelemetryNonceDedupConfig
+from ..schema.admin import TelemetryNonceDedupStatsV1
+
+logger = logging.getLogger(__name__)
+
+SQL_SELECT_RAW_UPLOAD_BY_NONCE = text(
+    "SELECT 1 FROM `telemetry_raw_uploads` WHERE `nonce` = :nonce"
+)
+
+
+def _normalize_nonce(nonce: str) -> str:
+    # the nonce column is of type UUID, so differently formatted nonces of the
+    # same value are duplicates to the DB too
+    return uuid.UUID(nonce).hex
+
+
+class NonceFilter(ABC):
+    """Redis-side filter of recently accepted upload nonces, for short-circuiting
+    client retries before they reach the DB.
+
+    Usage: :meth:`check` a nonce before persisting the upload, then either
+    :meth:`commit` or :meth:`rollback` depending on whether the upload got
+    accepted. Redis failures are logged and counted, but otherwise treated as
+    misses, since the DB de-duplicates anyway.
+    """
+
+    def __init__(self, cache: CacheStore, cfg: TelemetryNonceDedupConfig) -> None:
+        self.cache = cache
+        self.cfg = cfg
+        self.stats = TelemetryNonceDedupStatsV1(mode=cfg.mode)
+
+    @abstractmethod
+    async def _lookup(self, nonce: str) -> bool: ...
+
+    async def _commit(self, nonce: str) -> None:
+        pass
+
+    async def _rollback(self, nonce: str) -> None:
+        pass
+
+    async def check(self, nonce: str, engine: AsyncEngine) -> bool:
+        """Returns whether the upload with the given nonce is a duplicate."""
+
+        nonce = _normalize_nonce(nonce)
+        self.stats.checks += 1
+        try:
+            seen = await self._lookup(nonce)
+        except Exception:
+            self.stats.errors += 1
+            logger.exception("nonce lookup failed")
+            seen = False
+
+        if seen and random.random() < self.cfg.verify_sample_rate:
+            seen = await self._verify(nonce, engine)
+
+        if seen:
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+        return seen
+
+    async def _verify(self, nonce: str, engine: AsyncEngine) -> bool:
+        self.stats.verified_hits += 1
+        try:
+            async with engine.connect() as conn:
+                res = await conn.execute(
+                    SQL_SELECT_RAW_UPLOAD_BY_NONCE,
+                    {"nonce": nonce},
+                )
+                found = res.first() is not None
+        except Exception:
+            logger.exception("failed to verify nonce against the DB")
+            return True
+
+        # NOTE: uploads still sitting in the write buffer or the ingestion
+        # stream are counted as false positives too
+        if not found:
+            self.stats.false_positives += 1
+        return found
+
+    async def commit(self, nonce: str) -> None:
+        """Remembers the nonce of an accepted upload."""
+
+        try:
+            await self._commit(_normalize_nonce(nonce))
+        except Exception:
+            self.stats.errors += 1
+            logger.exception("failed to remember nonce")
+
+    async def rollback(self, nonce: str) -> None:
+        """Forgets the nonce of an upload that failed to get accepted, if
+        :meth:`check` has already remembered it."""
+
+        try:
+            await self._rollback(_normalize_nonce(nonce))
+        except Exception:
+            self.stats.errors += 1
+            logger.exception("failed to forget nonce")
+
+
+class SetNonceFilter(NonceFilter):
+    """Remembers every nonce as a Redis key with a TTL.
+
+    The lookup atomically marks the nonce too, so concurrent retries of the
+    same upload are caught as well, at the cost of having to forget the nonce
+    if the upload ends up not accepted."""
+
+    def _key(self, nonce: str) -> str:
+        return KEY_PREFIX_TELEMETRY_NONCE + nonce
+
+    async def _lookup(self, nonce: str) -> bool:
+        created = await self.cache.set(
+            self._key(nonce),
+            1,
+            nx=True,
+            ex=self.cfg.ttl_seconds,
+        )
+        return not created
+
+    async def _rollback(self, nonce: str) -> None:
+        await self.cache.delete(self._key(nonce))
+
+
+class BloomNonceFilter(NonceFilter):
+    """Remembers nonces in time-rotated Bloom filters stored as Redis bitmaps.
+
+    Nonces are added to the filter of the current generation, and looked up
+    in both the current and the previous one, so every nonce is remembered
+    for one to two generations while memory usage stays constant."""
+
+    def _offsets(self, nonce: str) -> list[int]:
+        # Kirsch-Mitzenmacher double hashing
+        digest = blake2b(nonce.encode("ascii"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.cfg.bloom_bits
+        return [(h1 + i * h2) % m for i in range(self.cfg.bloom_hashes)]
+
+    def _generation(self) -> int:
+        return int(time.time()) // self.cfg.bloom_rotate_seconds
+
+    def _key(self, generation: int) -> str:
+        return f"{KEY_PREFIX_TELEMETRY_NONCE_BLOOM}{generation}"
+
+    async def _lookup(self, nonce: str) -> bool:
+        gen = self._generation()
+        generations = await self.cache.getbits(
+            [self._key(gen), self._key(gen - 1)],
+            self._offsets(nonce),
+        )
+        return any(all(bits) for bits in generations)
+
+    async def _commit(self, nonce: str) -> None:
+        await self.cache.setbits(
+            self._key(self._generation()),
+            self._offsets(nonce),
+            ttl=2 * self.cfg.bloom_rotate_seconds,
+        )
+
+
+class _NonceFilterState:
+    filter: NonceFilter | None = None
+
+
+_NONCE_FILTER = _NonceFilterState()
+
+
+def get_telemetry_nonce_filter() -> NonceFilter | None:
+    """Returns the nonce de-duplication filter, or None if disabled."""
+
+    return _NONCE_FILTER.filter
+
+
+def init_telemetry_nonce_filter(cfg: DIEnvConfig) -> None:
+    dedup_cfg = cfg.telemetry.nonce_dedup
+    if dedup_cfg.mode == "off" or _NONCE_FILTER.filter is not None:
+        return
+
+    cache = get_cache_store()
+    if dedup_cfg.mode == "set":
+        _NONCE_FILTER.filter = SetNonceFilter(cache, dedup_cfg)
+    else:
+        _NONCE_FILTER.filter = BloomNonceFilter(cache, dedup_cfg)
+
+
+DITelemetryNonceFilter: TypeAlias = Annotated[
+    NonceFilter | None,
+    Depends(get_telemetry_nonce_filter),
+]
+"""Dependency on the telemetry nonce de-duplication filter, if enabled."""
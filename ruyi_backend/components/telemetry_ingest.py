@@ -0,0 +1,494 @@
+import asyncio
+from collections import Counter
+import datetime
+import json
+import logging
+import re
+import time
+from typing import Annotated, Awaitable, Callable, NamedTuple, Sequence, TypeAlias
+import uuid
+
+from fastapi import Depends
+from pydantic import TypeAdapter
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from ..config.env import DIEnvConfig
+from ..db.conn import connect_timed
+from ..schema.admin import TelemetryWriteBufferStatsV1
+from ..schema.client_telemetry import UploadEnvelope
+from .telemetry_dedup import NonceFilter
+from .telemetry_installation_cache import InstallationInfoCache
+
+logger = logging.getLogger(__name__)
+
+SQL_UPSERT_RUYI_VERSION_COUNTS = text(
+    "INSERT INTO `telemetry_ruyi_version_counts` (`bucket`, `version`, `count`) VALUES (:bucket, :version, :count) ON DUPLICATE KEY UPDATE `count` = `count` + VALUES(`count`)"
+)
+SQL_UPSERT_RAW_INSTALLATION_INFOS = text(
+    "INSERT INTO `telemetry_raw_installation_infos` (`report_uuid`, `raw`) VALUES (:report_uuid, :raw) ON DUPLICATE KEY UPDATE `raw` = VALUES(`raw`)"
+)
+SQL_INSERT_RAW_UPLOADS = text(
+    "INSERT IGNORE INTO `telemetry_raw_uploads` (`nonce`, `raw_events`) VALUES (:nonce, :raw_events)"
+)
+
+SQL_SELECT_EXISTING_NONCES = text(
+    "SELECT `nonce` FROM `telemetry_raw_uploads` WHERE `nonce` IN :nonces"
+).bindparams(bindparam("nonces", expanding=True))
+
+
+RE_JSON_STRING_START = re.compile(rb'\s*"')
+RE_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_JSON_STRING_ADAPTER = TypeAdapter(str)
+_JSON_SCAN_ONCE = json.JSONDecoder().scan_once  # type: ignore[attr-defined]
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured size limits."""
+
+
+def parse_upload(
+    body: bytes,
+    max_events: int | None = None,
+) -> tuple[UploadEnvelope, bytes]:
+    """Checks the envelope of an upload body, returning it together with the
+    JSON document to be stored verbatim.
+
+    Like ``UploadPayload``, a JSON string containing the actual payload
+    is accepted too. Raises :class:`pydantic.ValidationError` on malformed
+    input."""
+
+    doc = body
+    if RE_JSON_STRING_START.match(body):
+        doc = _JSON_STRING_ADAPTER.validate_json(body).encode("utf-8")
+
+    envelope = UploadEnvelope.model_validate_json(doc)
+    if max_events is not None and len(envelope.events) > max_events:
+        raise UploadTooLargeError(
+            f"too many events in one upload (max {max_events})",
+        )
+
+    return envelope, doc
+
+
+def raw_json_member(doc: str, name: str) -> str | None:
+    """Returns the JSON text of the member ``name`` of the JSON object
+    ``doc`` as is, or None if there is no such member. The last one wins if
+    the member is repeated, as with :func:`json.loads`.
+
+    Raises :class:`ValueError` if ``doc`` is not a JSON object."""
+
+    def skip_ws(i: int) -> int:
+        m = RE_JSON_WHITESPACE.match(doc, i)
+        assert m is not None
+        return m.end()
+
+    def expect(i: int, c: str) -> int:
+        if not doc.startswith(c, i):
+            raise ValueError(f"expected {c!r} at offset {i}")
+        return skip_ws(i + 1)
+
+    def scan(i: int) -> tuple[object, int]:
+        try:
+            return _JSON_SCAN_ONCE(doc, i)  # type: ignore[no-any-return]
+        except StopIteration:
+            raise ValueError(f"expected a JSON value at offset {i}") from None
+
+    result: str | None = None
+    i = expect(skip_ws(0), "{")
+    if doc.startswith("}", i):
+        return None
+    while True:
+        if not doc.startswith('"', i):
+            raise ValueError(f"expected a member name at offset {i}")
+        key, i = scan(i)
+        start = expect(skip_ws(i), ":")
+        _, end = scan(start)
+        if key == name:
+            result = doc[start:end]
+        i = skip_ws(end)
+        if doc.startswith("}", i):
+            return result
+        i = expect(i, ",")
+
+
+class UploadRecord(NamedTuple):
+    """An accepted telemetry upload, in the shape it is going to be persisted."""
+
+    nonce: str
+    ruyi_version: str
+    report_uuid: uuid.UUID | None
+    installation_raw: str
+    """JSON of the installation info as sent, or ``"{}"`` if only the report
+    UUID is known."""
+    raw_events: str
+    """JSON of the whole upload payload."""
+    received_at: datetime.datetime
+
+    @classmethod
+    def from_envelope(
+        cls,
+        envelope: UploadEnvelope,
+        doc: bytes,
+        received_at: datetime.datetime | None = None,
+    ) -> "UploadRecord":
+        raw = doc.decode("utf-8")
+        ins_info_json = "{}"
+        if envelope.installation is not None:
+            # kept as sent, like the whole payload
+            ins_info_json = raw_json_member(raw, "installation") or ins_info_json
+
+        return cls(
+            nonce=envelope.nonce,
+            ruyi_version=envelope.ruyi_version,
+            report_uuid=envelope.effective_report_uuid,
+            installation_raw=ins_info_json,
+            raw_events=raw,
+            received_at=received_at or datetime.datetime.now(),
+        )
+
+
+def hour_bucket(dt: datetime.datetime) -> datetime.datetime:
+    """Truncates the given time to the start of its hour."""
+
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def latest_installation_infos(
+    records: Sequence[UploadRecord],
+) -> dict[uuid.UUID, str]:
+    """Returns the latest installation info of every report UUID in the batch."""
+
+    ins_infos: dict[uuid.UUID, str] = {}
+    for r in records:
+        if r.report_uuid is not None:
+            ins_infos[r.report_uuid] = r.installation_raw
+    return ins_infos
+
+
+async def write_upload_records(
+    conn: AsyncConnection,
+    records: Sequence[UploadRecord],
+    ins_infos: dict[uuid.UUID, str] | None = None,
+) -> None:
+    """Writes a batch of uploads to the DB, without committing.
+
+    Every table is written with one executemany call, which the MySQL drivers
+    rewrite into multi-row ``INSERT`` statements, so the number of round trips
+    does not grow with the batch size.
+
+    ``ins_infos`` are the installation infos to upsert, defaulting to those
+    of all records."""
+
+    if not records:
+        return
+
+    # Only the number of uploads per version and hour is kept. The counter
+    # rows are locked in key order, so concurrent writers cannot deadlock.
+    version_counts = Counter(
+        (hour_bucket(r.received_at), r.ruyi_version) for r in records
+    )
+    await conn.execute(
+        SQL_UPSERT_RUYI_VERSION_COUNTS,
+        [
+            {"bucket": bucket, "version": version, "count": n}
+            for (bucket, version), n in sorted(version_counts.items())
+        ],
+    )
+
+    # Only the latest installation info of every report_uuid matters, and
+    # feeding the same key twice into one multi-row upsert is wasted work
+    if ins_infos is None:
+        ins_infos = latest_installation_infos(records)
+
+    if ins_infos:
+        await conn.execute(
+            SQL_UPSERT_RAW_INSTALLATION_INFOS,
+            [{"report_uuid": k, "raw": v} for k, v in ins_infos.items()],
+        )
+
+    # De-duping is achieved by using INSERT IGNORE INTO and the unique
+    # constraint on the nonce column
+    await conn.execute(
+        SQL_INSERT_RAW_UPLOADS,
+        [{"nonce": r.nonce, "raw_events": r.raw_events} for r in records],
+    )
+
+
+async def persist_upload_records(
+    engine: AsyncEngine,
+    records: Sequence[UploadRecord],
+    ins_info_cache: InstallationInfoCache | None = None,
+) -> None:
+    """Writes a batch of uploads to the DB in one transaction.
+
+    With an installation info cache, installation infos that did not change
+    since last persisted are skipped."""
+
+    ins_infos = latest_installation_infos(records)
+    if ins_info_cache is not None:
+        ins_infos = await ins_info_cache.filter_changed(ins_infos)
+
+    async with connect_timed(engine) as conn:
+        await write_upload_records(conn, records, ins_infos)
+        await conn.commit()
+
+    if ins_info_cache is not None:
+        await ins_info_cache.remember(ins_infos)
+
+
+async def persist_new_upload_records(
+    engine: AsyncEngine,
+    records: Sequence[UploadRecord],
+    ins_info_cache: InstallationInfoCache | None = None,
+) -> list[bool]:
+    """Like :func:`persist_upload_records`, but leaves out uploads already
+    persisted or repeated within the batch, returning whether each upload was
+    new.
+
+    Uploads racing with concurrent writers are still de-duplicated by the DB,
+    but get reported as new."""
+
+    if not records:
+        return []
+
+    nonces = [uuid.UUID(r.nonce) for r in records]
+    async with connect_timed(engine) as conn:
+        res = await conn.execute(
+            SQL_SELECT_EXISTING_NONCES,
+            {"nonces": sorted({n.hex for n in nonces})},
+        )
+        seen = {uuid.UUID(str(row[0])) for row in res}
+
+        is_new: list[bool] = []
+        new_records: list[UploadRecord] = []
+        for nonce, r in zip(nonces, records):
+            is_new.append(nonce not in seen)
+            if nonce not in seen:
+                seen.add(nonce)
+                new_records.append(r)
+
+        ins_infos = latest_installation_infos(new_records)
+        if ins_info_cache is not None:
+            ins_infos = await ins_info_cache.filter_changed(ins_infos)
+
+        await write_upload_records(conn, new_records, ins_infos)
+        await conn.commit()
+
+    if ins_info_cache is not None:
+        await ins_info_cache.remember(ins_infos)
+    return is_new
+
+
+class WriteBufferFullError(Exception):
+    """Raised when the write-behind buffer cannot accept more uploads."""
+
+
+class TelemetryWriteBuffer:
+    """Write-behind buffer for telemetry uploads.
+
+    Accepted uploads are collected in memory and flushed to the DB in batches,
+    either every ``flush_interval`` seconds or as soon as ``max_rows`` uploads
+    are pending, whichever comes first. The number of DB transactions thus
+    scales with the number of flushes instead of the number of uploads.
+
+    With a nonce filter, the nonces of the uploads are committed once the
+    uploads are flushed or spilled, and rolled back if the uploads are lost
+    on shutdown, so that client retries of lost uploads are not dropped.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        flush_interval: float,
+        max_rows: int,
+        max_pending_rows: int,
+        ins_info_cache: InstallationInfoCache | None = None,
+        spill: Callable[[Sequence[UploadRecord]], Awaitable[None]] | None = None,
+        nonce_filter: NonceFilter | None = None,
+    ) -> None:
+        self._engine = engine
+        self._ins_info_cache = ins_info_cache
+        self._spill = spill
+        self._nonce_filter = nonce_filter
+        self._flush_interval = flush_interval
+        self._max_rows = max_rows
+        self._max_pending_rows = max(max_pending_rows, max_rows)
+        self._pending: list[UploadRecord] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+        self.stats = TelemetryWriteBufferStatsV1()
+
+    @property
+    def pending_rows(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stops the periodic flushing and drains the buffer."""
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        try:
+            await self.flush()
+        except Exception:
+            pass
+        if self._pending:
+            logger.error(
+                "%d buffered telemetry uploads lost on shutdown", len(self._pending)
+            )
+            if self._nonce_filter is not None:
+                await asyncio.gather(
+                    *(self._nonce_filter.rollback(r.nonce) for r in self._pending)
+                )
+
+    def put(self, record: UploadRecord) -> None:
+        if len(self._pending) >= self._max_pending_rows:
+            self.stats.rows_rejected += 1
+            raise WriteBufferFullError()
+
+        self._pending.append(record)
+        self.stats.pending_rows = len(self._pending)
+        if len(self._pending) >= self._max_rows:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception:
+                # already accounted for; keep the loop alive and retry later
+                pass
+
+    async def _commit_nonces(self, batch: list[UploadRecord]) -> None:
+        if self._nonce_filter is not None:
+            await asyncio.gather(*(self._nonce_filter.commit(r.nonce) for r in batch))
+
+    async def _try_spill(self, batch: list[UploadRecord]) -> bool:
+        if self._spill is None:
+            return False
+        try:
+            await self._spill(batch)
+        except Exception:
+            logger.exception("failed to spill %d telemetry uploads", len(batch))
+            return False
+
+        self.stats.rows_spilled += len(batch)
+        self.stats.pending_rows = len(self._pending)
+        return True
+
+    async def flush(self) -> int:
+        """Flushes all pending uploads, returning the number of uploads written.
+
+        On failure the uploads are handed to ``spill`` if given. If there is no
+        ``spill`` or it fails too, they are put back into the buffer for the
+        next attempt instead, and the exception is re-raised."""
+
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            t0 = time.monotonic()
+            try:
+                await persist_upload_records(
+                    self._engine,
+                    batch,
+                    self._ins_info_cache,
+                )
+            except Exception:
+                self.stats.failed_flushes += 1
+                logger.exception(
+                    "failed to flush %d buffered telemetry uploads", len(batch)
+                )
+                if await self._try_spill(batch):
+                    await self._commit_nonces(batch)
+                    return 0
+                self._pending[:0] = batch
+                self.stats.pending_rows = len(self._pending)
+                raise
+
+            latency_ms = (time.monotonic() - t0) * 1000
+            await self._commit_nonces(batch)
+            st = self.stats
+            st.pending_rows = len(self._pending)
+            st.flushes += 1
+            st.rows_flushed += len(batch)
+            st.last_flush_size = len(batch)
+            st.last_flush_latency_ms = latency_ms
+            st.max_flush_latency_ms = max(st.max_flush_latency_ms, latency_ms)
+            logger.debug(
+                "flushed %d buffered telemetry uploads in %.1f ms",
+                len(batch),
+                latency_ms,
+            )
+            return len(batch)
+
+
+class _WriteBufferState:
+    buffer: TelemetryWriteBuffer | None = None
+
+
+_WRITE_BUFFER = _WriteBufferState()
+
+
+def get_telemetry_write_buffer() -> TelemetryWriteBuffer | None:
+    """Returns the write-behind buffer, or None if uploads are to be written
+    directly."""
+
+    return _WRITE_BUFFER.buffer
+
+
+def init_telemetry_write_buffer(
+    cfg: DIEnvConfig,
+    engine: AsyncEngine,
+    ins_info_cache: InstallationInfoCache | None = None,
+    spill: Callable[[Sequence[UploadRecord]], Awaitable[None]] | None = None,
+    nonce_filter: NonceFilter | None = None,
+) -> None:
+    if cfg.telemetry.ingest_mode != "buffered" or _WRITE_BUFFER.buffer is not None:
+        return
+
+    wb_cfg = cfg.telemetry.write_buffer
+    buf = TelemetryWriteBuffer(
+        engine,
+        flush_interval=wb_cfg.flush_interval_ms / 1000,
+        max_rows=wb_cfg.max_rows,
+        max_pending_rows=wb_cfg.max_pending_rows,
+        ins_info_cache=ins_info_cache,
+        spill=spill,
+        nonce_filter=nonce_filter,
+    )
+    buf.start()
+    _WRITE_BUFFER.buffer = buf
+
+
+async def dispose_telemetry_write_buffer() -> None:
+    if _WRITE_BUFFER.buffer is None:
+        return
+
+    await _WRITE_BUFFER.buffer.close()
+    _WRITE_BUFFER.buffer = None
+
+
+DITelemetryWriteBuffer: TypeAlias = Annotated[
+    TelemetryWriteBuffer | None,
+    Depends(get_telemetry_write_buffer),
+]
+"""Dependency on the telemetry write-behind buffer, if enabled."""
@@ -0,0 +1,190 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from hashlib import blake2b
+import logging
+import time
+from typing import Annotated, TypeAlias
+import uuid
+
+from fastapi import Depends
+
+from ..cache import KEY_PREFIX_TELEMETRY_INSTALLATION_FP, get_cache_store
+from ..cache.store import CacheStore
+from ..config.env import DIEnvConfig, TelemetryInstallationCacheConfig
+from ..schema.admin import TelemetryInstallationCacheStatsV1
+
+logger = logging.getLogger(__name__)
+
+
+def installation_fingerprint(raw: str) -> bytes:
+    return blake2b(raw.encode("utf-8"), digest_size=16).digest()
+
+
+class InstallationInfoCache(ABC):
+    """Cache of the fingerprint of the last persisted installation info of
+    every report UUID.
+
+    An installation rarely changes between uploads, so most installation info
+    upserts would be no-ops that still lock a row and write redo log. Usage:
+    :meth:`filter_changed` before writing, then :meth:`remember` what was
+    written once the transaction is committed. Cache failures are logged and
+    counted, but otherwise treated as misses.
+    """
+
+    def __init__(self, cfg: TelemetryInstallationCacheConfig) -> None:
+        self.cfg = cfg
+        self.stats = TelemetryInstallationCacheStatsV1(mode=cfg.mode)
+
+    @abstractmethod
+    async def _get(self, keys: list[uuid.UUID]) -> list[bytes | None]: ...
+
+    @abstractmethod
+    async def _put(self, fingerprints: dict[uuid.UUID, bytes]) -> None: ...
+
+    async def filter_changed(
+        self,
+        ins_infos: dict[uuid.UUID, str],
+    ) -> dict[uuid.UUID, str]:
+        """Returns the installation infos that are new or differ from the last
+        persisted ones."""
+
+        if not ins_infos:
+            return ins_infos
+
+        keys = list(ins_infos.keys())
+        self.stats.lookups += len(keys)
+        try:
+            cached = await self._get(keys)
+        except Exception:
+            self.stats.errors += 1
+            logger.exception("installation fingerprint lookup failed")
+            self.stats.changed += len(keys)
+            return ins_infos
+
+        result: dict[uuid.UUID, str] = {}
+        for k, fp in zip(keys, cached):
+            raw = ins_infos[k]
+            if fp != installation_fingerprint(raw):
+                result[k] = raw
+
+        self.stats.changed += len(result)
+        self.stats.unchanged += len(keys) - len(result)
+        return result
+
+    async def remember(self, ins_infos: dict[uuid.UUID, str]) -> None:
+        """Remembers the fingerprints of persisted installation infos."""
+
+        if not ins_infos:
+            return
+
+        try:
+            await self._put(
+                {k: installation_fingerprint(v) for k, v in ins_infos.items()}
+            )
+        except Exception:
+            self.stats.errors += 1
+            logger.exception("failed to remember installation fingerprints")
+
+
+class LRUInstallationInfoCache(InstallationInfoCache):
+    """Keeps the fingerprints in a bounded in-process LRU cache, each for
+    ``lru_ttl_seconds``.
+
+    Only safe with a single process writing installation infos. Every
+    process learns the fingerprints on its own, so after another process
+    writes a different installation info for a report UUID, one changing
+    back to what this process remembers would be skipped, leaving the DB
+    stale. The TTL bounds how long that can last."""
+
+    def __init__(self, cfg: TelemetryInstallationCacheConfig) -> None:
+        super().__init__(cfg)
+        self._lru: OrderedDict[uuid.UUID, tuple[bytes, float]] = OrderedDict()
+
+    async def _get(self, keys: list[uuid.UUID]) -> list[bytes | None]:
+        now = time.monotonic()
+        result: list[bytes | None] = []
+        for k in keys:
+            entry = self._lru.get(k)
+            if entry is not None and entry[1] <= now:
+                del self._lru[k]
+                entry = None
+            if entry is not None:
+                self._lru.move_to_end(k)
+            result.append(entry[0] if entry is not None else None)
+        return result
+
+    async def _put(self, fingerprints: dict[uuid.UUID, bytes]) -> None:
+        expires_at = time.monotonic() + self.cfg.lru_ttl_seconds
+        for k, fp in fingerprints.items():
+            self._lru[k] = (fp, expires_at)
+            self._lru.move_to_end(k)
+        while len(self._lru) > self.cfg.lru_max_entries:
+            self._lru.popitem(last=False)
+
+
+class RedisInstallationInfoCache(InstallationInfoCache):
+    """Keeps the fingerprints in Redis with a TTL, shared by all processes."""
+
+    def __init__(
+        self,
+        cfg: TelemetryInstallationCacheConfig,
+        cache: CacheStore,
+    ) -> None:
+        super().__init__(cfg)
+        self.cache = cache
+
+    def _key(self, report_uuid: uuid.UUID) -> str:
+        return KEY_PREFIX_TELEMETRY_INSTALLATION_FP + report_uuid.hex
+
+    async def _get(self, keys: list[uuid.UUID]) -> list[bytes | None]:
+        return await self.cache.mget([self._key(k) for k in keys])
+
+    async def _put(self, fingerprints: dict[uuid.UUID, bytes]) -> None:
+        await self.cache.mset_ex(
+            {self._key(k): fp for k, fp in fingerprints.items()},
+            ex=self.cfg.redis_ttl_seconds,
+        )
+
+
+def make_installation_info_cache(
+    cfg: TelemetryInstallationCacheConfig,
+    cache: CacheStore | None,
+) -> InstallationInfoCache | None:
+    """Creates the configured kind of installation info cache, or returns None
+    if disabled or if Redis is required but not available."""
+
+    if cfg.mode == "lru":
+        return LRUInstallationInfoCache(cfg)
+    if cfg.mode == "redis" and cache is not None:
+        return RedisInstallationInfoCache(cfg, cache)
+    return None
+
+
+class _InstallationInfoCacheState:
+    cache: InstallationInfoCache | None = None
+
+
+_INSTALLATION_INFO_CACHE = _InstallationInfoCacheState()
+
+
+def get_telemetry_installation_cache() -> InstallationInfoCache | None:
+    """Returns the installation info fingerprint cache, or None if disabled."""
+
+    return _INSTALLATION_INFO_CACHE.cache
+
+
+def init_telemetry_installation_cache(cfg: DIEnvConfig) -> None:
+    if _INSTALLATION_INFO_CACHE.cache is not None:
+        return
+
+    _INSTALLATION_INFO_CACHE.cache = make_installation_info_cache(
+        cfg.telemetry.installation_cache,
+        get_cache_store() if cfg.cache_main.host else None,
+    )
+
+
+DITelemetryInstallationCache: TypeAlias = Annotated[
+    InstallationInfoCache | None,
+    Depends(get_telemetry_installation_cache),
+]
+"""Dependency on the installation info fingerprint cache, if enabled."""
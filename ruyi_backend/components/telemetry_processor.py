@@ -1,10 +1,21 @@
+import asyncio
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+from hashlib import md5
+import json
+import logging
+import multiprocessing
+from typing import Mapping, NamedTuple, Sequence
 import uuid
 
-from sqlalchemy import insert
-from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy import BigInteger, Integer, String, Table, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
 
+from ..cache.store import CacheStore
+from ..config.env import TelemetryProcessingConfig
+from ..db.bulk import BulkStatement, BulkWriter
 from ..db.schema import (
-    ModelTelemetryAggregatedEvent,
     ModelTelemetryInstallationInfo,
     ModelTelemetryRISCVMachineInfo,
     telemetry_aggregated_events,
@@ -12,37 +23,239 @@ from ..db.schema import (
     telemetry_riscv_machine_infos,
 )
 from ..schema.client_telemetry import (
+    AggregatedTelemetryEvent,
+    RISCVMachineInfo,
     UploadPayload,
 )
+from .telemetry_counters import LiveCounterDeltas, apply_live_deltas
+from .telemetry_rollup import ROLLUP_GRAINS, RollupGrain
+
+logger = logging.getLogger(__name__)
+
+
+def _upsert_event_counters(table: str) -> BulkStatement:
+    return BulkStatement(
+        table,
+        ["time_bucket", "kind", "params_kv_raw", "params_hash", "command_key", "count"],
+        on_duplicate=f"`{table}`.`count` = `{table}`.`count` + VALUES(`count`)",
+    )
+
+
+BULK_UPSERT_AGGREGATED_EVENTS = _upsert_event_counters("telemetry_aggregated_events")
+BULK_UPSERT_AGGREGATED_EVENT_ROLLUPS = {
+    grain: _upsert_event_counters(grain.table.name) for grain in ROLLUP_GRAINS
+}
+BULK_INSERT_INSTALLATION_INFOS = BulkStatement(
+    "telemetry_installation_infos",
+    [
+        "report_uuid",
+        "arch",
+        "ci",
+        "libc_name",
+        "libc_ver",
+        "os",
+        "os_release_id",
+        "os_release_version_id",
+        "shell",
+    ],
+    ignore=True,
+)
+BULK_UPSERT_RISCV_MACHINE_INFOS = BulkStatement(
+    "telemetry_riscv_machine_infos",
+    [
+        "fingerprint",
+        "report_uuid",
+        "model_name",
+        "cpu_count",
+        "isa",
+        "uarch",
+        "uarch_csr",
+        "mmu",
+        "first_seen",
+        "last_seen",
+        "count",
+    ],
+    on_duplicate="`telemetry_riscv_machine_infos`.`first_seen` = LEAST(`telemetry_riscv_machine_infos`.`first_seen`, VALUES(`first_seen`)), `telemetry_riscv_machine_infos`.`last_seen` = GREATEST(`telemetry_riscv_machine_infos`.`last_seen`, VALUES(`last_seen`)), `telemetry_riscv_machine_infos`.`count` = `telemetry_riscv_machine_infos`.`count` + VALUES(`count`)",
+)
+SQL_SELECT_PROCESSING_UPPER_ID = text(
+    "SELECT `id` FROM `telemetry_raw_uploads` WHERE `created_at` < LEAST(:time_end, NOW() - INTERVAL :settle_seconds SECOND) ORDER BY `created_at` DESC LIMIT 1"
+)
+SQL_INIT_PROCESSING_WATERMARK = text(
+    "INSERT IGNORE INTO `telemetry_processing_watermarks` (`name`, `last_id`) VALUES (:name, 0)"
+)
+SQL_SELECT_PROCESSING_WATERMARK = text(
+    "SELECT `last_id` FROM `telemetry_processing_watermarks` WHERE `name` = :name"
+)
+# Follows the chain of ledger ranges right after the watermark, each one
+# starting where the previous one ended.
+SQL_SELECT_PROCESSED_CHAIN_END = text(
+    "WITH RECURSIVE `chain` AS (SELECT `l`.`last_id` FROM `telemetry_processing_ledger` `l` WHERE `l`.`name` = :name AND `l`.`first_id` = (SELECT `w`.`last_id` + 1 FROM `telemetry_processing_watermarks` `w` WHERE `w`.`name` = :name) UNION ALL SELECT `l`.`last_id` FROM `telemetry_processing_ledger` `l` JOIN `chain` `c` ON `l`.`first_id` = `c`.`last_id` + 1 WHERE `l`.`name` = :name) SELECT MAX(`last_id`) FROM `chain`"
+)
+SQL_ADVANCE_PROCESSING_WATERMARK = text(
+    "UPDATE `telemetry_processing_watermarks` SET `last_id` = GREATEST(`last_id`, :last_id) WHERE `name` = :name"
+)
+SQL_SELECT_PARTITION_PROCESSED_UPTO = text(
+    "SELECT MAX(`last_id`) FROM `telemetry_processing_ledger` WHERE `name` = :name AND `first_id` > :part_start AND `last_id` <= :part_end"
+)
+SQL_INSERT_PROCESSING_LEDGER = text(
+    "INSERT INTO `telemetry_processing_ledger` (`name`, `first_id`, `last_id`, `uploads`) VALUES (:name, :first_id, :last_id, :uploads)"
+)
+SQL_INSERT_INVALID_RAW_UPLOADS = text(
+    "INSERT IGNORE INTO `telemetry_invalid_raw_uploads` (`raw_upload_id`, `error`) VALUES (:raw_upload_id, :error)"
+)
+# The raw events are fetched as JSON text, for validation without going
+# through Python objects first
+SQL_SELECT_RAW_UPLOADS_BETWEEN = text(
+    "SELECT `id`, `created_at`, `raw_events` FROM `telemetry_raw_uploads` WHERE `id` > :after_id AND `id` <= :last_id ORDER BY `id`"
+)
+SQL_GET_LOCK = text("SELECT GET_LOCK(:lock, 0)")
+SQL_RELEASE_LOCK = text("SELECT RELEASE_LOCK(:lock)")
+
+KIND_CLI_INVOCATION = "cli:invocation-v1"
+INVALID_UPLOAD_ERROR_MAX_LEN = 4096
+WATERMARK_TELEMETRY_PROCESSING = "telemetry-processing"
+LOCK_PREFIX_TELEMETRY_PROCESSING = "ruyi-backend:telemetry-processing:"
+
+
+class AggregateKey(NamedTuple):
+    """Identity of an aggregated telemetry event.
+
+    The params are kept in the order reported by the client, as they were
+    always stored, so that the row of an event keeps the same ``params_hash``
+    across the existing data and new uploads."""
+
+    time_bucket: str
+    kind: str
+    params: tuple[tuple[str, str], ...]
+
+    @classmethod
+    def from_event(cls, ev: AggregatedTelemetryEvent) -> "AggregateKey":
+        return cls(ev.time_bucket, ev.kind, tuple(ev.params))
+
+    @property
+    def command_key(self) -> str | None:
+        """The ruyi command invoked, for ``cli:invocation-v1`` events."""
+
+        if self.kind != KIND_CLI_INVOCATION:
+            return None
+        for k, v in self.params:
+            if k == "key":
+                return v[:255]
+        return None
+
+    @property
+    def params_kv_raw(self) -> str:
+        # json.dumps() with default separators, as SQLAlchemy serialized the
+        # params before, so that existing rows hash the same way
+        return json.dumps([list(kv) for kv in self.params])
+
+
+def params_hash(params_kv_raw: str) -> bytes:
+    """Hashes the serialized params of an aggregated event, the same way as
+    ``UNHEX(MD5(params_kv_raw))`` in SQL."""
+
+    return md5(params_kv_raw.encode("utf-8"), usedforsecurity=False).digest()
+
+
+def riscv_machine_fingerprint(
+    report_uuid: uuid.UUID | None,
+    info: RISCVMachineInfo,
+) -> bytes:
+    """Fingerprints a RISC-V machine of an installation, the same way as
+    ``UNHEX(MD5(CONCAT_WS(CHAR(31), ...)))`` of the respective columns in
+    SQL, with a missing ``report_uuid`` as an empty string."""
+
+    fields = [
+        str(report_uuid) if report_uuid is not None else "",
+        info.model_name,
+        info.isa,
+        info.uarch,
+        info.uarch_csr,
+        info.mmu,
+        str(info.cpu_count),
+    ]
+    return md5("\x1f".join(fields).encode("utf-8"), usedforsecurity=False).digest()
+
+
+def aggregate_events(raw_events: list[UploadPayload]) -> Counter[AggregateKey]:
+    """Sums the counts of identical events across uploads."""
+
+    result: Counter[AggregateKey] = Counter()
+    for event in raw_events:
+        for agg_event in event.events:
+            result[AggregateKey.from_event(agg_event)] += agg_event.count
+    return result
+
+
+def rollup_events(
+    counts: Counter[AggregateKey],
+    grain: RollupGrain,
+) -> Counter[AggregateKey]:
+    """Sums the counts of events into the time buckets of ``grain``, leaving
+    out events with time buckets too short for it."""
+
+    result: Counter[AggregateKey] = Counter()
+    for key, count in counts.items():
+        if len(key.time_bucket) >= grain.bucket_len:
+            bucket = key.time_bucket[: grain.bucket_len]
+            result[key._replace(time_bucket=bucket)] += count
+    return result
+
+
+def _event_counter_rows(counts: Counter[AggregateKey]) -> list[dict[str, object]]:
+    rows: list[dict[str, object]] = []
+    for key, count in sorted(counts.items()):
+        params_kv_raw = key.params_kv_raw
+        rows.append(
+            {
+                "time_bucket": key.time_bucket,
+                "kind": key.kind,
+                "params_kv_raw": params_kv_raw,
+                "params_hash": params_hash(params_kv_raw),
+                "command_key": key.command_key,
+                "count": count,
+            }
+        )
+    return rows
 
 
 async def process_telemetry_data(
     conn: AsyncConnection,
     raw_events: list[UploadPayload],
-) -> None:
+    received_at: Sequence[datetime.datetime] | None = None,
+    writer: BulkWriter | None = None,
+) -> LiveCounterDeltas:
     """
     Processes raw telemetry events, aggregates them, and stores them in the database.
+
+    ``received_at`` are the times the respective uploads were received,
+    defaulting to now. Rows are written by ``writer``, defaulting to chunked
+    executemany calls.
+
+    Returns what the uploads add to the live counters, for updating them
+    once committed.
     """
 
+    if writer is None:
+        writer = BulkWriter()
+
+    if received_at is None:
+        received_at = [datetime.datetime.now()] * len(raw_events)
+
     # Buffers for batch insertion
-    aggregated_events_buffer: list[ModelTelemetryAggregatedEvent] = []
     installation_infos_buffer: dict[uuid.UUID, ModelTelemetryInstallationInfo] = {}
-    riscv_machine_infos_buffer: list[ModelTelemetryRISCVMachineInfo] = []
-
-    for event in raw_events:
-        # Process aggregated events
-        for agg_event in event.events:
-            aggregated_events_buffer.append(
-                ModelTelemetryAggregatedEvent(
-                    time_bucket=agg_event.time_bucket,
-                    kind=agg_event.kind,
-                    params_kv_raw=agg_event.params,
-                    count=agg_event.count,
-                )
-            )
+    riscv_machine_infos_buffer: dict[bytes, ModelTelemetryRISCVMachineInfo] = {}
+    active_installs: dict[datetime.date, set[str]] = {}
 
+    for event, seen_at in zip(raw_events, received_at):
         # Process installation info (assuming one per upload)
         installation_info = event.installation
+        # a bare report_uuid marks the installation active all the same
+        report_uuid = (
+            installation_info.report_uuid if installation_info else event.report_uuid
+        )
+        if report_uuid is not None:
+            active_installs.setdefault(seen_at.date(), set()).add(report_uuid.hex)
         if installation_info:
             installation_infos_buffer[installation_info.report_uuid] = (
                 ModelTelemetryInstallationInfo(
@@ -59,31 +272,401 @@ async def process_telemetry_data(
             )
 
             if riscv_machine_info := installation_info.riscv_machine:
-                riscv_machine_infos_buffer.append(
-                    ModelTelemetryRISCVMachineInfo(
-                        model_name=riscv_machine_info.model_name,
-                        cpu_count=riscv_machine_info.cpu_count,
-                        isa=riscv_machine_info.isa,
-                        uarch=riscv_machine_info.uarch,
-                        uarch_csr=riscv_machine_info.uarch_csr,
-                        mmu=riscv_machine_info.mmu,
-                    )
+                fp = riscv_machine_fingerprint(
+                    installation_info.report_uuid,
+                    riscv_machine_info,
                 )
+                if (machine := riscv_machine_infos_buffer.get(fp)) is not None:
+                    machine["first_seen"] = min(machine["first_seen"], seen_at)
+                    machine["last_seen"] = max(machine["last_seen"], seen_at)
+                    machine["count"] += 1
+                    continue
 
-    # Batch insert
-    if aggregated_events_buffer:
-        await conn.execute(
-            insert(telemetry_aggregated_events).values(aggregated_events_buffer)
+                riscv_machine_infos_buffer[fp] = ModelTelemetryRISCVMachineInfo(
+                    fingerprint=fp,
+                    report_uuid=installation_info.report_uuid,
+                    model_name=riscv_machine_info.model_name,
+                    cpu_count=riscv_machine_info.cpu_count,
+                    isa=riscv_machine_info.isa,
+                    uarch=riscv_machine_info.uarch,
+                    uarch_csr=riscv_machine_info.uarch_csr,
+                    mmu=riscv_machine_info.mmu,
+                    first_seen=seen_at,
+                    last_seen=seen_at,
+                    count=1,
+                )
+
+    # Batch insert; identical events of all uploads are summed up into one
+    # counter row, and the rows are locked in key order so that concurrent
+    # writers cannot deadlock
+    event_counts = aggregate_events(raw_events)
+    await writer.write(
+        conn,
+        BULK_UPSERT_AGGREGATED_EVENTS,
+        _event_counter_rows(event_counts),
+    )
+
+    # The rollups are added to in the same transaction, whatever the age of
+    # the time buckets, so that they stay exact with late-arriving events.
+    for grain in ROLLUP_GRAINS:
+        await writer.write(
+            conn,
+            BULK_UPSERT_AGGREGATED_EVENT_ROLLUPS[grain],
+            _event_counter_rows(rollup_events(event_counts, grain)),
         )
 
-    if installation_infos_buffer:
+    await writer.write(
+        conn,
+        BULK_INSERT_INSTALLATION_INFOS,
+        [v for _, v in sorted(installation_infos_buffer.items())],
+    )
+
+    # one row per distinct machine of an installation, with its occurrences
+    # counted
+    await writer.write(
+        conn,
+        BULK_UPSERT_RISCV_MACHINE_INFOS,
+        [v for _, v in sorted(riscv_machine_infos_buffer.items())],
+    )
+
+    command_counts: Counter[str] = Counter()
+    for key, count in event_counts.items():
+        if (command_key := key.command_key) is not None:
+            command_counts[command_key] += count
+    return LiveCounterDeltas(command_counts, active_installs)
+
+
+class InvalidPayload(NamedTuple):
+    """A raw upload document that failed validation."""
+
+    error: str
+
+
+def _check_fits_columns(table: Table, values: Mapping[str, object]) -> None:
+    for name, v in values.items():
+        if (col := table.c.get(name)) is None:
+            continue
+        t = col.type
+        if isinstance(v, str) and isinstance(t, String) and t.length is not None:
+            if len(v) > t.length:
+                raise ValueError(
+                    f"{name} longer than the {t.length} characters of `{table.name}`.`{name}`"
+                )
+        elif isinstance(v, int) and isinstance(t, Integer):
+            bits = 64 if isinstance(t, BigInteger) else 32
+            if not -(1 << (bits - 1)) <= v < 1 << (bits - 1):
+                raise ValueError(f"{name} out of the range of `{table.name}`.`{name}`")
+
+
+def check_storable(payload: UploadPayload) -> None:
+    """Checks that the values of an upload fit the columns they are written
+    to, raising :class:`ValueError` if not.
+
+    Uploads are written together in multi-row statements, which a single
+    value not fitting would fail for all the uploads aggregated with it."""
+
+    for ev in payload.events:
+        _check_fits_columns(
+            telemetry_aggregated_events,
+            {"time_bucket": ev.time_bucket, "kind": ev.kind, "count": ev.count},
+        )
+    if (info := payload.installation) is not None:
+        _check_fits_columns(
+            telemetry_installation_infos,
+            info.model_dump(exclude={"riscv_machine"}),
+        )
+        if info.riscv_machine is not None:
+            _check_fits_columns(
+                telemetry_riscv_machine_infos,
+                info.riscv_machine.model_dump(),
+            )
+
+
+def validate_payloads(
+    raws: Sequence[str | bytes],
+) -> list[UploadPayload | InvalidPayload]:
+    """Validates raw upload documents as stored, with a result for every
+    document, so that an invalid one does not fail the others.
+
+    Uploads with values not fitting the DB columns are invalid too, see
+    :func:`check_storable`."""
+
+    result: list[UploadPayload | InvalidPayload] = []
+    for raw in raws:
+        try:
+            payload = UploadPayload.model_validate_json(raw)
+            check_storable(payload)
+            result.append(payload)
+        except ValueError as e:
+            result.append(InvalidPayload(str(e)))
+    return result
+
+
+def split_invalid_payloads(
+    ids: Sequence[int],
+    received_at: Sequence[datetime.datetime],
+    results: Sequence[UploadPayload | InvalidPayload],
+) -> tuple[list[UploadPayload], list[datetime.datetime], dict[int, str]]:
+    """Leaves the invalid uploads out of the validation ``results`` of the
+    raw uploads of the given ids, returning the valid payloads with their
+    receive times, and the errors of the invalid ones by upload id.
+
+    Invalid uploads are skipped, instead of failing every processing run that
+    comes across them."""
+
+    payloads: list[UploadPayload] = []
+    valid_received_at: list[datetime.datetime] = []
+    errors: dict[int, str] = {}
+    for upload_id, t, result in zip(ids, received_at, results):
+        if isinstance(result, InvalidPayload):
+            logger.warning(
+                "skipping invalid raw telemetry upload %d: %s", upload_id, result.error
+            )
+            errors[upload_id] = result.error
+            continue
+        payloads.append(result)
+        valid_received_at.append(t)
+    return payloads, valid_received_at, errors
+
+
+class PayloadValidator:
+    """Validates raw upload documents off the event loop, in chunks of
+    ``chunk_size`` documents fanned out to a pool of ``processes`` worker
+    processes, or to the default thread pool if 0.
+
+    Validation is CPU-bound, so the worker processes keep both the event loop
+    responsive and all cores busy, while a thread only does the former."""
+
+    def __init__(self, processes: int, chunk_size: int) -> None:
+        self._chunk_size = chunk_size
+        self._pool: ProcessPoolExecutor | None = None
+        if processes > 0:
+            # not forking the process with its event loop and DB connections
+            self._pool = ProcessPoolExecutor(
+                processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    async def validate(
+        self,
+        raws: Sequence[str | bytes],
+    ) -> list[UploadPayload | InvalidPayload]:
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    self._pool,
+                    validate_payloads,
+                    raws[i : i + self._chunk_size],
+                )
+                for i in range(0, len(raws), self._chunk_size)
+            )
+        )
+        return [payload for chunk in results for payload in chunk]
+
+
+class Partition(NamedTuple):
+    """The raw upload ids in ``(after_id, last_id]`` to process, within the
+    partition of ids in ``(start, end]``."""
+
+    start: int
+    end: int
+    after_id: int
+    last_id: int
+
+
+def plan_partitions(watermark: int, upper_id: int, size: int) -> list[Partition]:
+    """Splits the ids in ``(watermark, upper_id]`` along the boundaries of
+    fixed partitions of ``size`` ids each.
+
+    The boundaries are the same for every run, so that concurrent runs
+    contend for the same partitions, and no uploads are processed twice."""
+
+    result: list[Partition] = []
+    k = watermark // size
+    while max(watermark, k * size) < upper_id:
+        start, end = k * size, (k + 1) * size
+        result.append(Partition(start, end, max(watermark, start), min(upper_id, end)))
+        k += 1
+    return result
+
+
+async def _process_partition(
+    conn: AsyncConnection,
+    part: Partition,
+    validator: PayloadValidator,
+    writer: BulkWriter,
+    cache: CacheStore | None,
+) -> int:
+    """Processes the part of a partition not processed yet, if the partition
+    is not being processed by someone else, returning the number of uploads
+    processed."""
+
+    lock = f"{LOCK_PREFIX_TELEMETRY_PROCESSING}{part.start}"
+    if not (await conn.execute(SQL_GET_LOCK, {"lock": lock})).scalar_one():
+        await conn.rollback()
+        return 0
+
+    try:
+        # Ranges are processed in order within a partition, while holding
+        # its lock, so what is processed already is a prefix of it.
+        res = await conn.execute(
+            SQL_SELECT_PARTITION_PROCESSED_UPTO,
+            {
+                "name": WATERMARK_TELEMETRY_PROCESSING,
+                "part_start": part.start,
+                "part_end": part.end,
+            },
+        )
+        after_id = max(part.after_id, res.scalar_one_or_none() or 0)
+        if after_id >= part.last_id:
+            return 0
+
+        res = await conn.execute(
+            SQL_SELECT_RAW_UPLOADS_BETWEEN,
+            {"after_id": after_id, "last_id": part.last_id},
+        )
+        rows = list(res)
+        events, received_at, errors = split_invalid_payloads(
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+            await validator.validate([row[2] for row in rows]),
+        )
+        deltas = await process_telemetry_data(conn, events, received_at, writer)
+        if errors:
+            # recorded for inspection, as the range is processed all the same
+            await conn.execute(
+                SQL_INSERT_INVALID_RAW_UPLOADS,
+                [
+                    {
+                        "raw_upload_id": upload_id,
+                        "error": error[:INVALID_UPLOAD_ERROR_MAX_LEN],
+                    }
+                    for upload_id, error in sorted(errors.items())
+                ],
+            )
         await conn.execute(
-            insert(telemetry_installation_infos)
-            .values(list(installation_infos_buffer.values()))
-            .prefix_with("IGNORE")
+            SQL_INSERT_PROCESSING_LEDGER,
+            {
+                "name": WATERMARK_TELEMETRY_PROCESSING,
+                "first_id": after_id + 1,
+                "last_id": part.last_id,
+                "uploads": len(rows),
+            },
         )
+        await conn.commit()
+        if cache is not None:
+            await apply_live_deltas(cache, deltas)
+        return len(rows)
+    finally:
+        # a no-op unless processing failed
+        await conn.rollback()
+        await conn.execute(SQL_RELEASE_LOCK, {"lock": lock})
+        await conn.commit()
+
 
-    if riscv_machine_infos_buffer:
+async def _advance_watermark(conn: AsyncConnection) -> int:
+    """Advances the watermark over the processed ranges contiguous to it,
+    returning the new watermark."""
+
+    params = {"name": WATERMARK_TELEMETRY_PROCESSING}
+    res = await conn.execute(SQL_SELECT_PROCESSED_CHAIN_END, params)
+    if (chain_end := res.scalar_one_or_none()) is not None:
         await conn.execute(
-            insert(telemetry_riscv_machine_infos).values(riscv_machine_infos_buffer)
+            SQL_ADVANCE_PROCESSING_WATERMARK,
+            params | {"last_id": chain_end},
+        )
+    res = await conn.execute(SQL_SELECT_PROCESSING_WATERMARK, params)
+    watermark: int = res.scalar_one()
+    await conn.commit()
+    return watermark
+
+
+async def process_raw_uploads(
+    engine: AsyncEngine,
+    time_end: datetime.datetime,
+    cfg: TelemetryProcessingConfig,
+    cache: CacheStore | None = None,
+) -> int:
+    """Processes the raw uploads received since the last run and before
+    ``time_end``, returning the number of uploads processed.
+
+    Progress is tracked by a persisted watermark, the last processed upload
+    ``id``. The ids after it are split into partitions of ``cfg.chunk_size``
+    ids each, processed by ``cfg.concurrency`` concurrent workers, each with its own
+    DB connection. A worker claims a partition with a ``GET_LOCK`` advisory
+    lock, skipping partitions claimed by others, so that runs on any number
+    of processes or hosts can share the work.
+
+    Every partition is processed and recorded in the ledger of processed id
+    ranges in one transaction, along with the uploads in it that failed
+    validation, which are skipped. A crashed run thus leaves only whole
+    partitions processed, and retrying it never counts an upload twice. The
+    watermark then advances over the processed ranges contiguous to it.
+
+    Uploads received in the last ``cfg.settle_seconds`` are left to the next run,
+    since uploads with lower ids may still be uncommitted, and would be
+    skipped for good once the watermark has passed them.
+
+    The live counters in ``cache``, if given, are updated after every
+    partition is committed."""
+
+    if time_end.tzinfo is not None:
+        # the DB stores naive local times, and the drivers drop tzinfo
+        time_end = time_end.astimezone().replace(tzinfo=None)
+
+    wm_params = {"name": WATERMARK_TELEMETRY_PROCESSING}
+    async with engine.connect() as conn:
+        res = await conn.execute(
+            SQL_SELECT_PROCESSING_UPPER_ID,
+            {"time_end": time_end, "settle_seconds": cfg.settle_seconds},
+        )
+        upper_id = res.scalar_one_or_none()
+        await conn.execute(SQL_INIT_PROCESSING_WATERMARK, wm_params)
+        await conn.commit()
+        # catch up with ranges processed by crashed or concurrent runs
+        watermark = await _advance_watermark(conn)
+
+    if upper_id is None or watermark >= upper_id:
+        return 0
+
+    parts = iter(plan_partitions(watermark, upper_id, cfg.chunk_size))
+    counts: list[int] = []
+    validator = PayloadValidator(cfg.validation_processes, cfg.validation_chunk_size)
+    writer = BulkWriter(cfg.write_chunk_size, cfg.load_data_min_rows)
+
+    async def _worker() -> None:
+        async with engine.connect() as conn:
+            # the iterator is shared by all workers
+            for part in parts:
+                counts.append(
+                    await _process_partition(conn, part, validator, writer, cache)
+                )
+                logger.info(
+                    "processed %d raw telemetry uploads up to id %d",
+                    sum(counts),
+                    part.last_id,
+                )
+
+    try:
+        results = await asyncio.gather(
+            *(_worker() for _ in range(max(1, cfg.concurrency))),
+            return_exceptions=True,
         )
+    finally:
+        validator.close()
+        writer.log_stats()
+
+    async with engine.connect() as conn:
+        await _advance_watermark(conn)
+
+    for r in results:
+        if isinstance(r, BaseException):
+            raise r
+
+    return sum(counts)
@@ -0,0 +1,174 @@
+import datetime
+from typing import Any, Callable, NamedTuple
+
+from sqlalchemy import (
+    ColumnElement,
+    Executable,
+    Select,
+    Table,
+    desc,
+    false,
+    func,
+    select,
+    union_all,
+)
+
+from ..db.schema import (
+    telemetry_aggregated_events,
+    telemetry_aggregated_events_daily,
+    telemetry_aggregated_events_hourly,
+    telemetry_aggregated_events_monthly,
+)
+
+
+class RollupGrain(NamedTuple):
+    """A time grain of aggregated events, whose time buckets are the
+    ``YYYYMMDDHHMM`` timestamps truncated to ``bucket_len`` characters."""
+
+    table: Table
+    bucket_len: int
+    floor: Callable[[datetime.datetime], datetime.datetime]
+    next: Callable[[datetime.datetime], datetime.datetime]
+
+    def bucket(self, t: datetime.datetime) -> str:
+        return f"{t:%Y%m%d%H%M}"[: self.bucket_len]
+
+    def ceil(self, t: datetime.datetime) -> datetime.datetime:
+        f = self.floor(t)
+        return f if f == t else self.next(f)
+
+
+def _next_month(t: datetime.datetime) -> datetime.datetime:
+    if t.month == 12:
+        return t.replace(year=t.year + 1, month=1)
+    return t.replace(month=t.month + 1)
+
+
+GRAIN_MINUTE = RollupGrain(
+    telemetry_aggregated_events,
+    12,
+    lambda t: t.replace(second=0, microsecond=0),
+    lambda t: t + datetime.timedelta(minutes=1),
+)
+GRAIN_HOURLY = RollupGrain(
+    telemetry_aggregated_events_hourly,
+    10,
+    lambda t: t.replace(minute=0, second=0, microsecond=0),
+    lambda t: t + datetime.timedelta(hours=1),
+)
+GRAIN_DAILY = RollupGrain(
+    telemetry_aggregated_events_daily,
+    8,
+    lambda t: t.replace(hour=0, minute=0, second=0, microsecond=0),
+    lambda t: t + datetime.timedelta(days=1),
+)
+GRAIN_MONTHLY = RollupGrain(
+    telemetry_aggregated_events_monthly,
+    6,
+    lambda t: t.replace(day=1, hour=0, minute=0, second=0, microsecond=0),
+    _next_month,
+)
+
+ROLLUP_GRAINS = (GRAIN_HOURLY, GRAIN_DAILY, GRAIN_MONTHLY)
+"""The grains maintained by processing, in addition to the events as
+reported."""
+
+_READ_GRAINS = (GRAIN_MONTHLY, GRAIN_DAILY, GRAIN_HOURLY, GRAIN_MINUTE)
+
+
+class RollupRead(NamedTuple):
+    """A read of the time buckets in ``[lo, hi)`` of a grain, with ``hi`` of
+    ``None`` meaning no upper bound."""
+
+    grain: RollupGrain
+    lo: str
+    hi: str | None
+
+
+def plan_rollup_reads(
+    start: datetime.datetime | None,
+    end: datetime.datetime | None,
+    grains: tuple[RollupGrain, ...] = _READ_GRAINS,
+) -> list[RollupRead]:
+    """Covers the time range ``[start, end)``, unbounded where ``None`` and
+    to the minute, with reads of the coarsest grains possible, so that the
+    number of rows read grows with the number of months covered, not with
+    the volume of events in them."""
+
+    grain, finer = grains[0], grains[1:]
+    if not finer:
+        lo = grain.bucket(start) if start is not None else ""
+        hi = grain.bucket(end) if end is not None else None
+        return [RollupRead(grain, lo, hi)] if hi is None or lo < hi else []
+
+    # the part of the range aligned to this grain
+    a = grain.ceil(start) if start is not None else None
+    b = grain.floor(end) if end is not None else None
+    if a is not None and b is not None and a >= b:
+        return plan_rollup_reads(start, end, finer)
+
+    result: list[RollupRead] = []
+    if start is not None and a is not None:
+        result.extend(plan_rollup_reads(start, a, finer))
+    result.append(
+        RollupRead(
+            grain,
+            grain.bucket(a) if a is not None else "",
+            grain.bucket(b) if b is not None else None,
+        )
+    )
+    if end is not None and b is not None:
+        result.extend(plan_rollup_reads(b, end, finer))
+    return result
+
+
+def _select_reads(
+    kind: str,
+    start: datetime.datetime | None,
+    end: datetime.datetime | None,
+    columns: Callable[[Table], list[ColumnElement[Any]]],
+) -> list[Select[Any]]:
+    parts: list[Select[Any]] = []
+    for read in plan_rollup_reads(start, end):
+        t = read.grain.table
+        q = select(*columns(t)).where(t.c.kind == kind)
+        if read.lo:
+            q = q.where(t.c.time_bucket >= read.lo)
+        if read.hi is not None:
+            q = q.where(t.c.time_bucket < read.hi)
+        parts.append(q)
+
+    if not parts:
+        t = GRAIN_MINUTE.table
+        parts.append(select(*columns(t)).where(false()))
+    return parts
+
+
+def select_command_counts(
+    kind: str,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    limit: int | None = None,
+) -> Executable:
+    """Selects the ``(command_key, total)`` of the events of ``kind`` in the
+    time range ``[start, end)``, summed up by the DB, most frequent first."""
+
+    parts = _select_reads(
+        kind,
+        start,
+        end,
+        lambda t: [t.c.command_key, t.c.count],
+    )
+    if len(parts) == 1:
+        # grouped directly, so that the (kind, command_key) index is used
+        src = parts[0].where(parts[0].selected_columns.command_key.is_not(None))
+        key, count = src.selected_columns
+        q = src.with_only_columns(key, func.sum(count).label("total"))
+    else:
+        sub = union_all(*parts).subquery()
+        q = select(sub.c.command_key, func.sum(sub.c.count).label("total")).where(
+            sub.c.command_key.is_not(None)
+        )
+        key = sub.c.command_key
+    q = q.group_by(key).order_by(desc("total"))
+    return q.limit(limit) if limit is not None else q
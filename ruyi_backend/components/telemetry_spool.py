@@ -0,0 +1,419 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import fcntl
+import logging
+import os
+import struct
+import time
+from typing import Annotated, Any, Callable, Iterator, Sequence, TypeAlias, TypeVar
+import zlib
+
+from fastapi import Depends
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..config.env import DIEnvConfig, TelemetrySpoolConfig
+from ..schema.admin import TelemetrySpoolStatsV1
+from .telemetry_ingest import UploadRecord, parse_upload, persist_new_upload_records
+from .telemetry_installation_cache import InstallationInfoCache
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".spool"
+
+_T = TypeVar("_T")
+
+# Every record is framed as (payload length, CRC32 of payload, receive time)
+# followed by the payload, so that a torn write at the tail of a segment is
+# detected on replay.
+_FRAME_HEADER = struct.Struct("<IId")
+
+
+def _encode_frame(record: UploadRecord) -> bytes:
+    payload = record.raw_events.encode("utf-8")
+    header = _FRAME_HEADER.pack(
+        len(payload),
+        zlib.crc32(payload),
+        record.received_at.timestamp(),
+    )
+    return header + payload
+
+
+def _decode_frames(data: bytes) -> Iterator[tuple[bytes, datetime.datetime]]:
+    """Yields the payloads and receive times of all intact frames, stopping at
+    the first torn or corrupted one."""
+
+    off = 0
+    while off + _FRAME_HEADER.size <= len(data):
+        length, crc, ts = _FRAME_HEADER.unpack_from(data, off)
+        start = off + _FRAME_HEADER.size
+        payload = data[start : start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        yield payload, datetime.datetime.fromtimestamp(ts)
+        off = start + length
+
+    if off < len(data):
+        logger.warning("discarding %d bytes of torn spool data", len(data) - off)
+
+
+def _read_all(fd: int) -> bytes:
+    with os.fdopen(os.dup(fd), "rb") as f:
+        return f.read()
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+class TelemetrySpool:
+    """Append-only local disk spool of telemetry uploads that could not be
+    written to the DB, to be replayed into the DB once it recovers.
+
+    The spool is a directory of segment files, each written by one process
+    holding an exclusive ``flock`` on it; segments are sealed when they grow
+    beyond ``segment_max_bytes``, or before a replay. Appends are made durable
+    by one ``fsync`` per ``fsync_interval`` for all appends in the meantime,
+    and only return after that. All segment I/O is done off the event loop.
+
+    Replaying takes over every segment not locked by another process, so
+    segments left behind by dead processes get replayed as well. Uploads
+    already in the DB are skipped by their nonce, so a segment replayed twice
+    (e.g. after a crash mid-replay) is harmless.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_max_bytes: int,
+        fsync_interval: float,
+    ) -> None:
+        self.directory = directory
+        self._segment_max_bytes = segment_max_bytes
+        self._fsync_interval = fsync_interval
+        self._fd: int | None = None
+        self._size = 0
+        self._lock = asyncio.Lock()
+        # a single thread, so that segment I/O happens in the order submitted
+        # even if the coroutine submitting some got cancelled meanwhile
+        self._io = ThreadPoolExecutor(1, thread_name_prefix="telemetry-spool")
+        self._sync_waiter: asyncio.Future[None] | None = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._stats = TelemetrySpoolStatsV1()
+
+    @property
+    def stats(self) -> TelemetrySpoolStatsV1:
+        st = self._stats
+        st.segments, st.bytes = 0, 0
+        for path in self._segments():
+            try:
+                st.bytes += os.path.getsize(path)
+            except FileNotFoundError:
+                continue
+            st.segments += 1
+        return st
+
+    def count_replay_failure(self) -> None:
+        self._stats.replay_failures += 1
+
+    def start(self) -> None:
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        async with self._lock:
+            await self._sync_and_seal()
+        self._io.shutdown()
+
+    async def _run_io(self, fn: Callable[..., _T], *args: Any) -> _T:
+        return await asyncio.get_running_loop().run_in_executor(self._io, fn, *args)
+
+    def _segments(self) -> list[str]:
+        try:
+            names = sorted(
+                e.name
+                for e in os.scandir(self.directory)
+                if e.name.endswith(SEGMENT_SUFFIX)
+            )
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, n) for n in names]
+
+    def _open_segment(self) -> None:
+        while True:
+            name = f"{time.time_ns():020d}-{os.getpid()}{SEGMENT_SUFFIX}"
+            fd = os.open(
+                os.path.join(self.directory, name),
+                os.O_WRONLY | os.O_CREAT | os.O_APPEND | os.O_CLOEXEC,
+                0o600,
+            )
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_nlink > 0:
+                break
+            # a replayer got to the empty segment first and removed it
+            os.close(fd)
+
+        self._fd = fd
+        self._size = 0
+
+    def _seal(self) -> None:
+        """Closes the current segment, which must have been synced, releasing
+        it for replay."""
+
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _write(self, data: bytes) -> None:
+        """Appends frames to the current segment, opening one if there is none.
+
+        If the write fails, the segment is truncated back to its last intact
+        frame, as far as possible."""
+
+        if self._fd is None:
+            self._open_segment()
+        assert self._fd is not None
+
+        view = memoryview(data)
+        try:
+            while view:
+                view = view[os.write(self._fd, view) :]
+        except BaseException:
+            try:
+                os.ftruncate(self._fd, self._size)
+            except OSError:
+                logger.exception("failed to truncate a torn telemetry spool segment")
+            raise
+        self._size += len(data)
+
+    async def _sync(self) -> None:
+        waiter, self._sync_waiter = self._sync_waiter, None
+        if self._fd is None or waiter is None:
+            return
+
+        try:
+            await self._run_io(os.fsync, self._fd)
+        except Exception as e:
+            waiter.set_exception(e)
+            raise
+        waiter.set_result(None)
+
+    async def _sync_and_seal(self) -> None:
+        try:
+            await self._sync()
+        finally:
+            if self._fd is not None:
+                await self._run_io(self._seal)
+
+    async def _sync_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # gather more appends into this sync
+            await asyncio.sleep(self._fsync_interval)
+            async with self._lock:
+                try:
+                    await self._sync()
+                except Exception:
+                    logger.exception("failed to sync the telemetry spool")
+
+    async def append(self, records: Sequence[UploadRecord]) -> None:
+        """Durably appends uploads to the spool."""
+
+        if not records:
+            return
+
+        data = b"".join(_encode_frame(r) for r in records)
+        async with self._lock:
+            if self._fd is not None and self._size >= self._segment_max_bytes:
+                await self._sync_and_seal()
+            try:
+                await self._run_io(self._write, data)
+            except Exception:
+                # never append after a frame possibly left torn, in case the
+                # truncation failed as well
+                await self._sync_and_seal()
+                raise
+            self._stats.appended += len(records)
+
+            if self._task is None:
+                self._task = asyncio.create_task(self._sync_loop())
+            if self._sync_waiter is None:
+                self._sync_waiter = asyncio.get_running_loop().create_future()
+                self._wakeup.set()
+            waiter = self._sync_waiter
+
+        await asyncio.shield(waiter)
+
+    async def replay(
+        self,
+        engine: AsyncEngine,
+        batch_size: int,
+        ins_info_cache: InstallationInfoCache | None = None,
+    ) -> int:
+        """Writes all spooled uploads to the DB, removing the segments replayed,
+        and returns the number of uploads replayed.
+
+        Raises on DB errors, leaving the segment being replayed in place."""
+
+        async with self._lock:
+            await self._sync_and_seal()
+
+        total = 0
+        for path in self._segments():
+            try:
+                fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+            except FileNotFoundError:
+                # replayed by someone else meanwhile
+                continue
+
+            try:
+                if not _try_lock(fd):
+                    # being written or replayed by someone else
+                    continue
+                if not os.path.exists(path):
+                    continue
+
+                data = await asyncio.to_thread(_read_all, fd)
+
+                n = await self._replay_segment(engine, data, batch_size, ins_info_cache)
+                os.unlink(path)
+            finally:
+                os.close(fd)
+
+            total += n
+            logger.info("replayed %d spooled telemetry uploads from %s", n, path)
+
+        return total
+
+    async def _replay_segment(
+        self,
+        engine: AsyncEngine,
+        data: bytes,
+        batch_size: int,
+        ins_info_cache: InstallationInfoCache | None,
+    ) -> int:
+        records: list[UploadRecord] = []
+        for payload, received_at in _decode_frames(data):
+            try:
+                envelope, doc = parse_upload(payload)
+            except ValidationError:
+                logger.warning("dropping malformed spooled upload")
+                continue
+            records.append(UploadRecord.from_envelope(envelope, doc, received_at))
+
+        for i in range(0, len(records), batch_size):
+            await persist_new_upload_records(
+                engine,
+                records[i : i + batch_size],
+                ins_info_cache,
+            )
+            self._stats.replayed += len(records[i : i + batch_size])
+        return len(records)
+
+
+class TelemetrySpoolReplayer:
+    """Periodically replays the spool into the DB."""
+
+    def __init__(
+        self,
+        spool: TelemetrySpool,
+        engine: AsyncEngine,
+        cfg: TelemetrySpoolConfig,
+        ins_info_cache: InstallationInfoCache | None = None,
+    ) -> None:
+        self._spool = spool
+        self._engine = engine
+        self._cfg = cfg
+        self._ins_info_cache = ins_info_cache
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._cfg.replay_interval_ms / 1000)
+            try:
+                await self._spool.replay(
+                    self._engine,
+                    self._cfg.replay_batch_size,
+                    self._ins_info_cache,
+                )
+            except Exception:
+                self._spool.count_replay_failure()
+                logger.exception("failed to replay the telemetry spool, retrying later")
+
+
+class _SpoolState:
+    spool: TelemetrySpool | None = None
+    replayer: TelemetrySpoolReplayer | None = None
+
+
+_SPOOL = _SpoolState()
+
+
+def get_telemetry_spool() -> TelemetrySpool | None:
+    """Returns the local disk spool, or None if not configured."""
+
+    return _SPOOL.spool
+
+
+def init_telemetry_spool(
+    cfg: DIEnvConfig,
+    engine: AsyncEngine,
+    ins_info_cache: InstallationInfoCache | None = None,
+) -> None:
+    spool_cfg = cfg.telemetry.spool
+    if not spool_cfg.directory or _SPOOL.spool is not None:
+        return
+
+    spool = TelemetrySpool(
+        spool_cfg.directory,
+        segment_max_bytes=spool_cfg.segment_max_bytes,
+        fsync_interval=spool_cfg.fsync_interval_ms / 1000,
+    )
+    spool.start()
+    replayer = TelemetrySpoolReplayer(spool, engine, spool_cfg, ins_info_cache)
+    replayer.start()
+    _SPOOL.spool = spool
+    _SPOOL.replayer = replayer
+
+
+async def dispose_telemetry_spool() -> None:
+    if _SPOOL.replayer is not None:
+        await _SPOOL.replayer.close()
+        _SPOOL.replayer = None
+    if _SPOOL.spool is not None:
+        await _SPOOL.spool.close()
+        _SPOOL.spool = None
+
+
+DITelemetrySpool: TypeAlias = Annotated[
+    TelemetrySpool | None,
+    Depends(get_telemetry_spool),
+]
+"""Dependency on the telemetry local disk spool, if configured."""
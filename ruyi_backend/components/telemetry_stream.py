@@ -0,0 +1,208 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Annotated, TypeAlias
+
+from fastapi import Depends
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..cache import KEY_TELEMETRY_UPLOAD_STREAM, get_cache_store
+from ..cache.store import CacheStore, StreamEntry
+from ..config.env import DIEnvConfig, TelemetryStreamConfig
+from .telemetry_ingest import UploadRecord, parse_upload, persist_upload_records
+from .telemetry_installation_cache import InstallationInfoCache
+
+STREAM_FIELD_PAYLOAD = "payload"
+"""Name of the stream entry field holding the upload payload JSON."""
+
+RETRY_DELAY_SECONDS = 5.0
+
+
+def get_telemetry_upload_stream(cfg: DIEnvConfig) -> CacheStore | None:
+    """Returns the cache store to enqueue uploads onto, or None if uploads are
+    not to be ingested via the Redis stream."""
+
+    if cfg.telemetry.ingest_mode != "stream":
+        return None
+    return get_cache_store()
+
+
+DITelemetryUploadStream: TypeAlias = Annotated[
+    CacheStore | None,
+    Depends(get_telemetry_upload_stream),
+]
+"""Dependency on the telemetry upload stream, if enabled."""
+
+
+class UploadStreamFullError(Exception):
+    """Raised when the ingestion stream cannot accept more uploads."""
+
+
+async def enqueue_upload(cache: CacheStore, payload_json: bytes, max_len: int) -> None:
+    """Appends an accepted upload to the ingestion stream, verbatim.
+
+    Consumed entries are deleted from the stream, so its length is the
+    backlog of the consumers; once that reaches ``max_len`` the upload is
+    refused with :class:`UploadStreamFullError`. The stream is trimmed to
+    about ``max_len`` entries as well, which only drops anything should
+    concurrent appends overshoot the cap by more than a whole stream node."""
+
+    if await cache.xlen(KEY_TELEMETRY_UPLOAD_STREAM) >= max_len:
+        raise UploadStreamFullError(
+            f"telemetry upload stream is full ({max_len} entries)"
+        )
+    await cache.xadd(
+        KEY_TELEMETRY_UPLOAD_STREAM,
+        {STREAM_FIELD_PAYLOAD: payload_json},
+        maxlen=max_len,
+    )
+
+
+def entry_time(entry_id: bytes) -> datetime.datetime:
+    """Returns the time a stream entry was added, as encoded in its ID."""
+
+    ms, _, _ = entry_id.partition(b"-")
+    return datetime.datetime.fromtimestamp(int(ms) / 1000)
+
+
+class TelemetryStreamConsumer:
+    """Drains the telemetry upload stream into the DB as a member of a Redis
+    consumer group.
+
+    Entries are acknowledged (and removed from the stream) only after the
+    transaction containing them is committed, so a crashed consumer loses
+    nothing: its pending entries are reclaimed by whichever consumer of the
+    group notices them idling for longer than ``reclaim_idle_ms``. Entries
+    re-delivered this way are de-duplicated by the nonce of the upload.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        cache: CacheStore,
+        engine: AsyncEngine,
+        cfg: TelemetryStreamConfig,
+        consumer: str,
+        ins_info_cache: InstallationInfoCache | None = None,
+    ) -> None:
+        self.logger = logger
+        self.cache = cache
+        self.engine = engine
+        self.cfg = cfg
+        self.consumer = consumer
+        self.ins_info_cache = ins_info_cache
+        self.uploads_written = 0
+
+    async def run(self, stop: asyncio.Event, drain: bool = False) -> int:
+        """Consumes the stream until ``stop`` is set, or until no more entries
+        are immediately available if ``drain`` is True."""
+
+        await self.cache.xgroup_ensure(KEY_TELEMETRY_UPLOAD_STREAM, self.cfg.group)
+        self.logger.info(
+            "consuming %s as %s/%s",
+            KEY_TELEMETRY_UPLOAD_STREAM,
+            self.cfg.group,
+            self.consumer,
+        )
+
+        reclaim_interval = self.cfg.reclaim_idle_ms / 1000
+        next_reclaim = 0.0
+        while not stop.is_set():
+            try:
+                if time.monotonic() >= next_reclaim:
+                    await self.reclaim()
+                    next_reclaim = time.monotonic() + reclaim_interval
+
+                entries = await self.cache.xreadgroup(
+                    KEY_TELEMETRY_UPLOAD_STREAM,
+                    self.cfg.group,
+                    self.consumer,
+                    count=self.cfg.batch_size,
+                    block_ms=None if drain else self.cfg.block_ms,
+                )
+                if not entries:
+                    if drain:
+                        break
+                    continue
+
+                await self.consume(entries)
+            except Exception:
+                # the entries stay pending and will be reclaimed later
+                self.logger.exception(
+                    "failed to consume telemetry uploads, retrying in %.0fs",
+                    RETRY_DELAY_SECONDS,
+                )
+                try:
+                    await asyncio.wait_for(stop.wait(), RETRY_DELAY_SECONDS)
+                except TimeoutError:
+                    pass
+                if drain:
+                    return 1
+
+        self.logger.info("%d uploads written in total", self.uploads_written)
+        return 0
+
+    async def reclaim(self) -> None:
+        """Takes over and consumes entries abandoned by other consumers."""
+
+        cursor: bytes | str = "0-0"
+        while True:
+            cursor, entries = await self.cache.xautoclaim(
+                KEY_TELEMETRY_UPLOAD_STREAM,
+                self.cfg.group,
+                self.consumer,
+                min_idle_ms=self.cfg.reclaim_idle_ms,
+                count=self.cfg.batch_size,
+                start_id=cursor,
+            )
+            if entries:
+                self.logger.info("reclaimed %d pending entries", len(entries))
+                await self.consume(entries)
+            if cursor in (b"0-0", "0-0"):
+                return
+
+    async def consume(self, entries: list[StreamEntry]) -> None:
+        """Writes the given entries to the DB in one transaction and
+        acknowledges them."""
+
+        ids: list[bytes] = []
+        records: list[UploadRecord] = []
+        for entry_id, fields in entries:
+            ids.append(entry_id)
+            if fields is None:
+                # deleted while pending
+                continue
+
+            try:
+                envelope, doc = parse_upload(fields[STREAM_FIELD_PAYLOAD.encode()])
+            except (KeyError, ValidationError):
+                # malformed entries would never become consumable; drop them
+                self.logger.warning("dropping malformed entry %r", entry_id)
+                continue
+
+            records.append(
+                UploadRecord.from_envelope(
+                    envelope,
+                    doc,
+                    received_at=entry_time(entry_id),
+                )
+            )
+
+        t0 = time.monotonic()
+        if records:
+            await persist_upload_records(self.engine, records, self.ins_info_cache)
+
+        await self.cache.xack_and_delete(
+            KEY_TELEMETRY_UPLOAD_STREAM,
+            self.cfg.group,
+            ids,
+        )
+
+        self.uploads_written += len(records)
+        self.logger.info(
+            "wrote %d uploads in %.1f ms",
+            len(records),
+            (time.monotonic() - t0) * 1000,
+        )
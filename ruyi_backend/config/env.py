@@ -1,5 +1,5 @@
 import functools
-from typing import Annotated, Any, TypeAlias
+from typing import Annotated, Any, Literal, TypeAlias
 
 from fastapi import Depends
 from pydantic import BaseModel
@@ -41,6 +41,14 @@ class DBConfig(BaseModel):
     dsn: str = ""
     name: str = "ruyisdk"
 
+    pool_size: int | None = None
+    """Number of connections kept open by the pool of each process, if not
+    SQLAlchemy's default."""
+
+    max_overflow: int | None = None
+    """Number of connections the pool may open beyond ``pool_size`` under
+    load, if not SQLAlchemy's default."""
+
 
 class ESConfig(BaseModel):
     """Configuration for an Elasticsearch connection."""
@@ -105,6 +113,233 @@ class ReleaseWorkerConfig(BaseModel):
     rsync_remote_pass: str = ""
 
 
+class TelemetryWriteBufferConfig(BaseModel):
+    """Configuration for the in-process write-behind buffer of telemetry uploads."""
+
+    flush_interval_ms: int = 500
+    """Maximum time in milliseconds an accepted upload stays buffered."""
+
+    max_rows: int = 500
+    """Number of buffered uploads that triggers an immediate flush."""
+
+    max_pending_rows: int = 20000
+    """Hard limit of buffered uploads (including those of failed flushes
+    pending retry), beyond which new uploads are rejected."""
+
+
+class TelemetryArchiveConfig(BaseModel):
+    """Configuration for the archival of processed raw telemetry uploads."""
+
+    directory: str = ""
+    """Directory holding the archive segments, partitioned by the date
+    uploads were received; archival is disabled if empty."""
+
+    retention_days: int = 90
+    """Processed uploads received longer ago than this are archived and
+    deleted from the DB."""
+
+    batch_size: int = 5000
+    """Number of uploads read from the DB and archived at a time, each batch
+    making one compressed frame per date."""
+
+    delete_batch_size: int = 500
+    """Number of archived uploads deleted from the DB per transaction."""
+
+    segment_max_bytes: int = 256 * 1024 * 1024
+    """Size beyond which an archive segment is sealed and a new one started."""
+
+
+class TelemetryProcessingConfig(BaseModel):
+    """Configuration for the processing of raw telemetry uploads."""
+
+    chunk_size: int = 1000
+    """Number of raw upload ids per partition, processed and committed in one
+    transaction."""
+
+    concurrency: int = 4
+    """Number of partitions processed concurrently by one run, each taking a
+    DB connection. Runs on other processes or hosts share the work by
+    claiming partitions with DB advisory locks."""
+
+    settle_seconds: int = 60
+    """Uploads received within this many seconds are left to the next run,
+    giving concurrent inserts with lower ids time to commit."""
+
+    validation_processes: int = 0
+    """Number of worker processes validating raw uploads; if 0, they are
+    validated in a thread, off the event loop but on a single core."""
+
+    validation_chunk_size: int = 200
+    """Number of raw uploads validated per task handed to a worker."""
+
+    write_chunk_size: int = 1000
+    """Maximum number of rows written to a table per multi-row statement."""
+
+    load_data_min_rows: int = 0
+    """Writes of at least this many rows to a table are made by
+    ``LOAD DATA LOCAL INFILE`` through a staging table instead, which requires
+    ``local_infile=1`` in the DB DSN; 0 disables this."""
+
+
+class TelemetrySpoolConfig(BaseModel):
+    """Configuration for the local disk spool of telemetry uploads that could
+    not be written to the DB."""
+
+    directory: str = ""
+    """Directory holding the spool segments; the spool is disabled if empty.
+    May be shared by all worker processes on the host."""
+
+    segment_max_bytes: int = 16 * 1024 * 1024
+    """Size beyond which a spool segment is sealed and a new one started."""
+
+    fsync_interval_ms: int = 20
+    """Appends within this long are made durable together by a single fsync."""
+
+    replay_interval_ms: int = 10000
+    """How often the spool is checked for uploads to replay into the DB."""
+
+    replay_batch_size: int = 500
+    """Number of uploads written to the DB per transaction when replaying."""
+
+
+class TelemetryStreamConfig(BaseModel):
+    """Configuration for the Redis stream used as the telemetry ingestion queue."""
+
+    group: str = "ruyi-backend"
+    """Name of the consumer group draining the stream into the DB."""
+
+    batch_size: int = 1000
+    """Maximum number of uploads a consumer writes to the DB in one transaction."""
+
+    block_ms: int = 5000
+    """How long a consumer waits for new entries before checking again."""
+
+    reclaim_idle_ms: int = 60000
+    """Entries delivered to a consumer but not acknowledged for this long are
+    considered abandoned (e.g. the consumer crashed) and get reclaimed."""
+
+    max_len: int = 1000000
+    """Maximum number of entries waiting in the stream. Uploads beyond this
+    are spooled if the spool is enabled, or else refused with 503, instead of
+    growing the stream without bound while the consumers are stalled."""
+
+
+class TelemetryNonceDedupConfig(BaseModel):
+    """Configuration for the Redis-side de-duplication of telemetry uploads."""
+
+    mode: Literal["off", "set", "bloom"] = "off"
+    """How recently accepted nonces are remembered.
+
+    * ``off``: de-duplication is left to the DB.
+    * ``set``: one Redis key with a TTL per nonce; exact.
+    * ``bloom``: time-rotated Bloom filters in Redis bitmaps; constant
+      memory, with a small false-positive rate.
+    """
+
+    ttl_seconds: int = 7 * 86400
+    """How long nonces are remembered in ``set`` mode."""
+
+    bloom_rotate_seconds: int = 86400
+    """Lifetime of one Bloom filter generation. Nonces are remembered for
+    between one and two generations."""
+
+    bloom_bits: int = 1 << 24
+    """Size of one Bloom filter generation in bits."""
+
+    bloom_hashes: int = 7
+    """Number of bits set per nonce in the Bloom filter."""
+
+    verify_sample_rate: float = 0.0
+    """Fraction of de-duplication hits checked against the DB, for measuring
+    the false-positive rate. False positives found this way are let through."""
+
+
+class TelemetryAdmissionConfig(BaseModel):
+    """Configuration for the admission control of telemetry requests of one
+    worker process. Limits of 0 mean unlimited."""
+
+    max_in_flight: int = 0
+    """Maximum number of telemetry requests handled concurrently; requests
+    beyond that are answered with 429."""
+
+    max_pool_wait_ms: int = 0
+    """Maximum average time to acquire a DB connection, beyond which telemetry
+    requests are answered with 503."""
+
+    pool_wait_half_life_ms: int = 5000
+    """Half-life of the decay of the average DB connection acquisition time,
+    which determines how soon requests are admitted again when the DB is not
+    used in the meantime."""
+
+    retry_after_seconds: int = 30
+    """Value of the ``Retry-After`` header of shed requests."""
+
+
+class TelemetryInstallationCacheConfig(BaseModel):
+    """Configuration for the cache of installation info fingerprints, used to
+    skip upserting installation infos that did not change."""
+
+    mode: Literal["off", "lru", "redis"] = "off"
+    """Where the fingerprints are kept.
+
+    * ``off``: every installation info received is upserted.
+    * ``lru``: in a per-process LRU cache. Only safe with a single process
+      writing installation infos: a process does not see what the others
+      wrote, and so may skip writing an installation info that is stale in
+      the DB by then.
+    * ``redis``: in Redis on the ``cache_main`` connection, shared by all
+      processes.
+    """
+
+    lru_max_entries: int = 100000
+    """Maximum number of fingerprints kept in ``lru`` mode."""
+
+    lru_ttl_seconds: int = 300
+    """How long fingerprints are kept in ``lru`` mode."""
+
+    redis_ttl_seconds: int = 7 * 86400
+    """How long fingerprints are kept in ``redis`` mode."""
+
+
+class TelemetryConfig(BaseModel):
+    """Configuration for telemetry ingestion and processing."""
+
+    ingest_mode: Literal["direct", "buffered", "stream"] = "direct"
+    """How accepted uploads get persisted.
+
+    * ``direct``: written to the DB within the request, one transaction per upload.
+    * ``buffered``: collected by a per-worker write-behind buffer and flushed
+      to the DB in batches.
+    * ``stream``: appended to a Redis stream on the ``cache_main`` connection,
+      to be drained into the DB by ``ruyi-backend consume-telemetry``.
+    """
+
+    max_upload_bytes: int = 4 * 1024 * 1024
+    """Maximum accepted size of a single upload's request body, as sent."""
+
+    max_decompressed_bytes: int = 16 * 1024 * 1024
+    """Maximum accepted size of a single upload's request body after undoing
+    its ``Content-Encoding``."""
+
+    max_events_per_upload: int = 10000
+    """Maximum number of aggregated events accepted in a single upload."""
+
+    max_uploads_per_batch: int = 1000
+    """Maximum number of uploads accepted in a single batch upload request,
+    whose body is subject to the same size limits as a single upload."""
+
+    admission: TelemetryAdmissionConfig = TelemetryAdmissionConfig()
+    archive: TelemetryArchiveConfig = TelemetryArchiveConfig()
+    installation_cache: TelemetryInstallationCacheConfig = (
+        TelemetryInstallationCacheConfig()
+    )
+    nonce_dedup: TelemetryNonceDedupConfig = TelemetryNonceDedupConfig()
+    processing: TelemetryProcessingConfig = TelemetryProcessingConfig()
+    spool: TelemetrySpoolConfig = TelemetrySpoolConfig()
+    stream: TelemetryStreamConfig = TelemetryStreamConfig()
+    write_buffer: TelemetryWriteBufferConfig = TelemetryWriteBufferConfig()
+
+
 class CLIConfig(BaseModel):
     """Configuration for the CLI management client."""
 
@@ -128,6 +363,7 @@ class EnvConfig(BaseSettings, case_sensitive=False):
     github: GitHubConfig = GitHubConfig()
     http: HTTPConfig = HTTPConfig()
     pypi: PyPIConfig = PyPIConfig()
+    telemetry: TelemetryConfig = TelemetryConfig()
 
 
 _ENV_CONFIG: EnvConfig | None = None
@@ -0,0 +1,204 @@
+import asyncio
+import datetime
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Literal, Mapping, NamedTuple, Sequence
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+BulkWriteStrategy = Literal["executemany", "load_data"]
+
+
+class BulkStatement:
+    """A multi-row ``INSERT`` into one table, that can be executed either as
+    an executemany call or by ``LOAD DATA`` through a staging table.
+
+    Columns referenced in ``on_duplicate`` must be qualified with the table
+    name, as they would be ambiguous in the ``INSERT ... SELECT`` from the
+    staging table otherwise."""
+
+    def __init__(
+        self,
+        table: str,
+        columns: Sequence[str],
+        on_duplicate: str | None = None,
+        ignore: bool = False,
+    ) -> None:
+        self.table = table
+        self.columns = tuple(columns)
+        self._insert = "INSERT IGNORE INTO" if ignore else "INSERT INTO"
+        self._suffix = (
+            f" ON DUPLICATE KEY UPDATE {on_duplicate}" if on_duplicate else ""
+        )
+
+        cols = self._column_list()
+        values = ", ".join(f":{c}" for c in self.columns)
+        self.sql = text(
+            f"{self._insert} `{table}` ({cols}) VALUES ({values}){self._suffix}"
+        )
+
+    def _column_list(self) -> str:
+        return ", ".join(f"`{c}`" for c in self.columns)
+
+    @property
+    def staging_table(self) -> str:
+        return f"{self.table}_staging"
+
+    def create_staging_sql(self) -> str:
+        return f"CREATE TEMPORARY TABLE IF NOT EXISTS `{self.staging_table}` SELECT {self._column_list()} FROM `{self.table}` LIMIT 0"
+
+    def load_data_sql(self, binary_columns: set[str]) -> str:
+        # binary values are loaded as hex, as the file is read as utf8mb4
+        targets = ", ".join(
+            f"@`{c}`" if c in binary_columns else f"`{c}`" for c in self.columns
+        )
+        sql = f"LOAD DATA LOCAL INFILE :path INTO TABLE `{self.staging_table}` CHARACTER SET utf8mb4 ({targets})"
+        if binary_columns:
+            sets = ", ".join(f"`{c}` = UNHEX(@`{c}`)" for c in sorted(binary_columns))
+            sql += f" SET {sets}"
+        return sql
+
+    def merge_staging_sql(self) -> str:
+        cols = self._column_list()
+        return f"{self._insert} `{self.table}` ({cols}) SELECT {cols} FROM `{self.staging_table}`{self._suffix}"
+
+    def drop_staging_sql(self) -> str:
+        return f"DROP TEMPORARY TABLE IF EXISTS `{self.staging_table}`"
+
+
+def _tsv_field(v: Any) -> str:
+    """Formats a value for ``LOAD DATA`` with the default field and line
+    terminators and escape character."""
+
+    if v is None:
+        return "\\N"
+    if isinstance(v, bytes):
+        return v.hex()
+    if isinstance(v, bool):
+        return str(int(v))
+    if isinstance(v, datetime.datetime):
+        return v.isoformat(" ")
+    if isinstance(v, (int, float, uuid.UUID, datetime.date)):
+        return str(v)
+    return (
+        str(v)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\0", "\\0")
+    )
+
+
+def format_tsv(columns: Sequence[str], rows: Sequence[Mapping[str, Any]]) -> bytes:
+    """Formats rows as a tab-separated file to be read by ``LOAD DATA``."""
+
+    lines = ("\t".join(_tsv_field(row[c]) for c in columns) for row in rows)
+    return "".join(line + "\n" for line in lines).encode("utf-8")
+
+
+def _write_temp_file(data: bytes) -> str:
+    fd, path = tempfile.mkstemp(prefix="ruyi-backend-bulk-", suffix=".tsv")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+class BulkWriteStats(NamedTuple):
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+class BulkWriter:
+    """Writes rows in chunks of at most ``chunk_size`` rows per executemany
+    call, which the MySQL drivers rewrite into multi-row statements, so that
+    no single statement gets too big to build or to fit in
+    ``max_allowed_packet``.
+
+    Writes of at least ``load_data_min_rows`` rows (if positive) are instead
+    made by ``LOAD DATA LOCAL INFILE`` into a temporary staging table merged
+    into the target table with ``INSERT ... SELECT``, which is faster for
+    large backfills. This requires the connection to allow ``LOCAL INFILE``,
+    e.g. by ``local_infile=1`` in the DSN.
+
+    The rows written and time taken are accumulated per table and strategy
+    in :attr:`stats`, for comparing the throughput of the strategies."""
+
+    def __init__(self, chunk_size: int = 1000, load_data_min_rows: int = 0) -> None:
+        self.chunk_size = chunk_size
+        self.load_data_min_rows = load_data_min_rows
+        self.stats: dict[tuple[str, BulkWriteStrategy], BulkWriteStats] = {}
+
+    def strategy_for(self, n: int) -> BulkWriteStrategy:
+        if self.load_data_min_rows > 0 and n >= self.load_data_min_rows:
+            return "load_data"
+        return "executemany"
+
+    async def write(
+        self,
+        conn: AsyncConnection,
+        stmt: BulkStatement,
+        rows: Sequence[Mapping[str, Any]],
+    ) -> None:
+        if not rows:
+            return
+
+        strategy = self.strategy_for(len(rows))
+        t0 = time.monotonic()
+        if strategy == "load_data":
+            await self._load_data(conn, stmt, rows)
+        else:
+            for i in range(0, len(rows), self.chunk_size):
+                await conn.execute(stmt.sql, list(rows[i : i + self.chunk_size]))
+        elapsed = time.monotonic() - t0
+
+        key = (stmt.table, strategy)
+        prev = self.stats.get(key, BulkWriteStats(0, 0.0))
+        self.stats[key] = BulkWriteStats(prev.rows + len(rows), prev.seconds + elapsed)
+        logger.debug(
+            "wrote %d rows to %s by %s in %.3fs",
+            len(rows),
+            stmt.table,
+            strategy,
+            elapsed,
+        )
+
+    async def _load_data(
+        self,
+        conn: AsyncConnection,
+        stmt: BulkStatement,
+        rows: Sequence[Mapping[str, Any]],
+    ) -> None:
+        binary_columns = {c for c in stmt.columns if isinstance(rows[0][c], bytes)}
+        data = format_tsv(stmt.columns, rows)
+        path = await asyncio.to_thread(_write_temp_file, data)
+        try:
+            await conn.execute(text(stmt.create_staging_sql()))
+            await conn.execute(
+                text(stmt.load_data_sql(binary_columns)),
+                {"path": path},
+            )
+            await conn.execute(text(stmt.merge_staging_sql()))
+        finally:
+            os.unlink(path)
+            await conn.execute(text(stmt.drop_staging_sql()))
+
+    def log_stats(self) -> None:
+        for (table, strategy), st in sorted(self.stats.items()):
+            logger.info(
+                "bulk wrote %d rows to %s by %s in %.3fs (%.0f rows/s)",
+                st.rows,
+                table,
+                strategy,
+                st.seconds,
+                st.rows_per_second,
+            )
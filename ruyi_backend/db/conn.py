@@ -1,7 +1,10 @@
-from typing import Annotated, TypeAlias
+from contextlib import AsyncExitStack, asynccontextmanager
+import math
+import time
+from typing import Annotated, AsyncIterator, TypeAlias
 
 from fastapi import Depends
-from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 
 from ..config.env import DIEnvConfig
 
@@ -25,11 +28,19 @@ def init_main_db(cfg: DIEnvConfig) -> None:
         # no DB (maybe we're running from the CLI)
         return
 
+    # only overriding SQLAlchemy's pool sizing defaults if configured
+    pool_kwargs: dict[str, int] = {}
+    if cfg.db_main.pool_size is not None:
+        pool_kwargs["pool_size"] = cfg.db_main.pool_size
+    if cfg.db_main.max_overflow is not None:
+        pool_kwargs["max_overflow"] = cfg.db_main.max_overflow
+
     _MAIN_DB.engine = create_async_engine(
         cfg.db_main.dsn,
         echo=cfg.debug,
         pool_pre_ping=True,
         pool_recycle=DB_POOL_RECYCLE_SECONDS,
+        **pool_kwargs,
     )
 
 
@@ -42,3 +53,55 @@ async def dispose_main_db() -> None:
 
 
 DIMainDB: TypeAlias = Annotated[AsyncEngine, Depends(get_main_db)]
+
+
+class PoolWaitTracker:
+    """Tracks how long acquiring a DB connection takes, as an exponentially
+    decaying average.
+
+    The average decays towards zero with time too, so that a process that
+    stops using the DB because the average is high eventually tries again."""
+
+    def __init__(self, half_life: float = 5.0) -> None:
+        self.half_life = half_life
+        self._avg = 0.0
+        self._updated_at = time.monotonic()
+
+    def _decayed(self, now: float) -> float:
+        return self._avg * math.pow(0.5, (now - self._updated_at) / self.half_life)
+
+    def observe(self, seconds: float) -> None:
+        now = time.monotonic()
+        self._avg = (self._decayed(now) + seconds) / 2
+        self._updated_at = now
+
+    @property
+    def average(self) -> float:
+        """The current average wait in seconds."""
+
+        return self._decayed(time.monotonic())
+
+
+MAIN_DB_POOL_WAIT = PoolWaitTracker()
+"""Connection acquisition times of the main DB, as observed by
+:func:`connect_timed`."""
+
+
+@asynccontextmanager
+async def connect_timed(
+    engine: AsyncEngine,
+    tracker: PoolWaitTracker = MAIN_DB_POOL_WAIT,
+) -> AsyncIterator[AsyncConnection]:
+    """Like ``engine.connect()``, recording how long it took to get a
+    connection, including waiting for the pool.
+
+    Failed attempts are recorded too, as a checkout timing out is exactly
+    when the pool is exhausted."""
+
+    async with AsyncExitStack() as stack:
+        t0 = time.monotonic()
+        try:
+            conn = await stack.enter_async_context(engine.connect())
+        finally:
+            tracker.observe(time.monotonic() - t0)
+        yield conn
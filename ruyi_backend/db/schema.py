@@ -7,8 +7,11 @@ from sqlalchemy import (
     Column,
     MetaData,
     BIGINT,
+    BINARY,
     BOOLEAN,
+    DATETIME,
     TIMESTAMP,
+    TEXT,
     VARCHAR,
     JSON,
     UUID,
@@ -45,17 +48,86 @@ telemetry_raw_uploads = Table(
 )
 
 
-class ModelTelemetryRuyiVersion(TypedDict):
-    id: NotRequired[int]
+class ModelTelemetryRuyiVersionCount(TypedDict):
+    bucket: datetime.datetime
     version: str
+    count: int
+
+
+# Keyed by (bucket, version) so that adoption queries over a time range are
+# served by range scans of the clustered index alone.
+telemetry_ruyi_version_counts = Table(
+    "telemetry_ruyi_version_counts",
+    metadata,
+    Column("bucket", DATETIME(), primary_key=True),
+    Column("version", VARCHAR(255), primary_key=True),
+    Column("count", BIGINT(), nullable=False, default=0),
+)
+
+
+class ModelTelemetryProcessingWatermark(TypedDict):
+    name: str
+    last_id: int
+    updated_at: NotRequired[datetime.datetime]
+
+
+# The id of the last raw upload processed, by which processing resumes.
+telemetry_processing_watermarks = Table(
+    "telemetry_processing_watermarks",
+    metadata,
+    Column("name", VARCHAR(64), primary_key=True),
+    Column("last_id", BIGINT(), nullable=False),
+    Column(
+        "updated_at",
+        TIMESTAMP(timezone=False),
+        server_default=func.current_timestamp(),
+        server_onupdate=func.current_timestamp(),
+    ),
+)
+
+
+class ModelTelemetryProcessingLedgerEntry(TypedDict):
+    id: NotRequired[int]
+    name: str
+    first_id: int
+    last_id: int
+    uploads: int
     created_at: NotRequired[datetime.datetime]
 
 
-telemetry_ruyi_versions = Table(
-    "telemetry_ruyi_versions",
+# Every range of raw upload ids processed, committed together with the
+# results of processing it.
+telemetry_processing_ledger = Table(
+    "telemetry_processing_ledger",
     metadata,
     Column("id", BIGINT(), primary_key=True, autoincrement=True),
-    Column("version", VARCHAR(255), nullable=False),
+    Column("name", VARCHAR(64), nullable=False),
+    Column("first_id", BIGINT(), nullable=False),
+    Column("last_id", BIGINT(), nullable=False),
+    Column("uploads", INT(), nullable=False),
+    Column(
+        "created_at", TIMESTAMP(timezone=False), server_default=func.current_timestamp()
+    ),
+    UniqueConstraint(
+        "name",
+        "first_id",
+        name="idx_telemetry_processing_ledger_name_first_id",
+    ),
+)
+
+
+class ModelTelemetryInvalidRawUpload(TypedDict):
+    raw_upload_id: int
+    error: str
+    created_at: NotRequired[datetime.datetime]
+
+
+# Raw uploads skipped by processing for failing validation, with the errors.
+telemetry_invalid_raw_uploads = Table(
+    "telemetry_invalid_raw_uploads",
+    metadata,
+    Column("raw_upload_id", BIGINT(), primary_key=True),
+    Column("error", TEXT(), nullable=False),
     Column(
         "created_at", TIMESTAMP(timezone=False), server_default=func.current_timestamp()
     ),
@@ -122,28 +194,44 @@ telemetry_installation_infos = Table(
 
 class ModelTelemetryRISCVMachineInfo(TypedDict):
     id: NotRequired[int]
+    fingerprint: bytes
+    report_uuid: uuid.UUID | None
     model_name: str
     cpu_count: int
     isa: str
     uarch: str
     uarch_csr: str
     mmu: str
+    first_seen: datetime.datetime
+    last_seen: datetime.datetime
+    count: int
     created_at: NotRequired[datetime.datetime]
 
 
+# One row per distinct machine of an installation, keyed by a fingerprint of
+# the installation and all machine attributes.
 telemetry_riscv_machine_infos = Table(
     "telemetry_riscv_machine_infos",
     metadata,
     Column("id", BIGINT(), primary_key=True, autoincrement=True),
+    Column("fingerprint", BINARY(16), nullable=False),
+    Column("report_uuid", UUID(), nullable=True),
     Column("model_name", VARCHAR(255), nullable=False),
     Column("cpu_count", INT(), nullable=False),
     Column("isa", VARCHAR(1024), nullable=False),
     Column("uarch", VARCHAR(255), nullable=False),
     Column("uarch_csr", VARCHAR(255), nullable=False),
     Column("mmu", VARCHAR(255), nullable=False),
+    Column("first_seen", DATETIME(), nullable=False),
+    Column("last_seen", DATETIME(), nullable=False),
+    Column("count", BIGINT(), nullable=False),
     Column(
         "created_at", TIMESTAMP(timezone=False), server_default=func.current_timestamp()
     ),
+    UniqueConstraint(
+        "fingerprint",
+        name="idx_telemetry_riscv_machine_infos_fingerprint",
+    ),
 )
 
 
@@ -152,10 +240,14 @@ class ModelTelemetryAggregatedEvent(TypedDict):
     time_bucket: str
     kind: str
     params_kv_raw: Sequence[list[str] | tuple[str, str]]
+    params_hash: bytes
+    command_key: str | None
     count: int
     created_at: NotRequired[datetime.datetime]
 
 
+# One counter row per (time_bucket, kind, params), so that identical events
+# reported by many installations take up a single row.
 telemetry_aggregated_events = Table(
     "telemetry_aggregated_events",
     metadata,
@@ -163,14 +255,52 @@ telemetry_aggregated_events = Table(
     Column("time_bucket", VARCHAR(255), nullable=False),
     Column("kind", VARCHAR(255), nullable=False),
     Column("params_kv_raw", JSON(), nullable=False),
-    Column("count", INT(), nullable=False),
+    Column("params_hash", BINARY(16), nullable=False),
+    Column("command_key", VARCHAR(255)),
+    Column("count", BIGINT(), nullable=False),
     Column(
         "created_at", TIMESTAMP(timezone=False), server_default=func.current_timestamp()
     ),
     CheckConstraint("JSON_VALID(`params_kv_raw`)"),
+    UniqueConstraint(
+        "time_bucket",
+        "kind",
+        "params_hash",
+        name="idx_telemetry_aggregated_events_bucket_kind_params",
+    ),
 )
 
 
+def _aggregated_events_rollup(grain: str) -> Table:
+    name = f"telemetry_aggregated_events_{grain}"
+    return Table(
+        name,
+        metadata,
+        Column("id", BIGINT(), primary_key=True, autoincrement=True),
+        Column("time_bucket", VARCHAR(16), nullable=False),
+        Column("kind", VARCHAR(255), nullable=False),
+        Column("params_kv_raw", JSON(), nullable=False),
+        Column("params_hash", BINARY(16), nullable=False),
+        Column("command_key", VARCHAR(255)),
+        Column("count", BIGINT(), nullable=False),
+        CheckConstraint("JSON_VALID(`params_kv_raw`)"),
+        UniqueConstraint(
+            "kind",
+            "time_bucket",
+            "params_hash",
+            name=f"idx_{name}_kind_bucket_params",
+        ),
+    )
+
+
+# Rollups of `telemetry_aggregated_events` to coarser time buckets
+# (YYYYMMDDHH, YYYYMMDD and YYYYMM respectively), maintained by processing,
+# with rows shaped like `ModelTelemetryAggregatedEvent` minus `created_at`.
+telemetry_aggregated_events_hourly = _aggregated_events_rollup("hourly")
+telemetry_aggregated_events_daily = _aggregated_events_rollup("daily")
+telemetry_aggregated_events_monthly = _aggregated_events_rollup("monthly")
+
+
 class ModelDownloadStatsDailyPyPI(TypedDict):
     id: NotRequired[int]
     name: str
@@ -192,3 +322,29 @@ download_stats_daily_pypi = Table(
         "created_at", TIMESTAMP(timezone=False), server_default=func.current_timestamp()
     ),
 )
+
+
+class ModelDownloadStatsDailyMirror(TypedDict):
+    id: NotRequired[int]
+    category: str
+    date: datetime.datetime
+    count: int
+    created_at: NotRequired[datetime.datetime]
+
+
+download_stats_daily_mirror = Table(
+    "download_stats_daily_mirror",
+    metadata,
+    Column("id", BIGINT(), primary_key=True, autoincrement=True),
+    Column("category", VARCHAR(64), nullable=False),
+    Column("date", TIMESTAMP(timezone=False), nullable=False),
+    Column("count", BIGINT(), nullable=False, default=0),
+    Column(
+        "created_at", TIMESTAMP(timezone=False), server_default=func.current_timestamp()
+    ),
+    UniqueConstraint(
+        "category",
+        "date",
+        name="idx_download_stats_daily_mirror_category_date",
+    ),
+)
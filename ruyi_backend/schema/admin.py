@@ -1,28 +1,134 @@
 import datetime
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ReqProcessTelemetry(BaseModel):
     """Request schema for the ``/admin/process-telemetry-v1`` endpoint."""
 
-    time_start: datetime.datetime = Field(
-        # 00:00:00 yesterday
-        default_factory=lambda: (
-            datetime.datetime.now().replace(
-                hour=0,
-                minute=0,
-                second=0,
-                microsecond=0,
-            )
-            + datetime.timedelta(days=-1)
-        ),
-        description="The start of the time range to process telemetry data for, inclusive.",
-        examples=["2021-01-01T00:00:00+08:00"],
-    )
+    # processing always resumes after the last processed upload, so a start
+    # of the time range is refused rather than silently ignored
+    model_config = ConfigDict(extra="forbid")
 
     time_end: datetime.datetime = Field(
         default_factory=datetime.datetime.now,
         description="The end of the time range to process telemetry data for, exclusive.",
         examples=["2021-01-02T00:00:00+08:00"],
     )
+
+
+class TelemetryWriteBufferStatsV1(BaseModel):
+    """Statistics of the telemetry write-behind buffer of one worker process."""
+
+    pending_rows: int = 0
+    """Number of uploads currently waiting to be flushed."""
+    flushes: int = 0
+    """Number of successful flushes."""
+    failed_flushes: int = 0
+    """Number of flushes that failed and got their rows re-queued."""
+    rows_flushed: int = 0
+    """Total number of uploads persisted by successful flushes."""
+    rows_rejected: int = 0
+    """Number of uploads rejected because the buffer was full."""
+    rows_spilled: int = 0
+    """Number of uploads of failed flushes handed to the local disk spool."""
+    last_flush_size: int = 0
+    """Number of uploads persisted by the most recent successful flush."""
+    last_flush_latency_ms: float = 0.0
+    """Wall-clock duration of the most recent successful flush."""
+    max_flush_latency_ms: float = 0.0
+    """Longest wall-clock duration of all successful flushes so far."""
+
+
+class TelemetryNonceDedupStatsV1(BaseModel):
+    """Statistics of the Redis-side nonce de-duplication of one worker process."""
+
+    mode: str
+    checks: int = 0
+    """Number of nonces looked up."""
+    hits: int = 0
+    """Number of uploads short-circuited as duplicates."""
+    misses: int = 0
+    """Number of nonces not seen before."""
+    verified_hits: int = 0
+    """Number of hits sampled for verification against the DB."""
+    false_positives: int = 0
+    """Number of verified hits whose nonce was not in the DB after all."""
+    errors: int = 0
+    """Number of failed Redis operations; lookups fail open."""
+
+
+class TelemetryAdmissionStatsV1(BaseModel):
+    """Statistics of the admission control of telemetry requests of one worker
+    process."""
+
+    in_flight: int = 0
+    """Number of telemetry requests currently being handled."""
+    accepted: int = 0
+    """Number of telemetry requests admitted."""
+    shed_in_flight: int = 0
+    """Number of telemetry requests answered with 429 due to ``max_in_flight``."""
+    shed_pool_wait: int = 0
+    """Number of telemetry requests answered with 503 due to ``max_pool_wait_ms``."""
+    pool_wait_ms: float = 0.0
+    """Current average time to acquire a DB connection."""
+
+
+class TelemetryInstallationCacheStatsV1(BaseModel):
+    """Statistics of the installation info fingerprint cache of one worker
+    process."""
+
+    mode: str
+    lookups: int = 0
+    """Number of installation infos looked up."""
+    unchanged: int = 0
+    """Number of installation infos not upserted because they did not change."""
+    changed: int = 0
+    """Number of installation infos upserted because they were new or changed."""
+    errors: int = 0
+    """Number of failed cache operations; lookups fail open."""
+
+
+class TelemetrySpoolStatsV1(BaseModel):
+    """Statistics of the local disk spool of telemetry uploads."""
+
+    segments: int = 0
+    """Number of spool segments on disk, including those of other processes."""
+    bytes: int = 0
+    """Total size of the spool segments on disk."""
+    appended: int = 0
+    """Number of uploads spooled by this process."""
+    replayed: int = 0
+    """Number of uploads replayed into the DB by this process."""
+    replay_failures: int = 0
+    """Number of replay attempts that failed."""
+
+
+class TelemetryIngestStatsV1(BaseModel):
+    """Response schema for the ``/admin/telemetry-ingest-stats-v1`` endpoint.
+
+    Numbers are per worker process and reset on restart."""
+
+    ingest_mode: str
+    admission: TelemetryAdmissionStatsV1 | None = None
+    write_buffer: TelemetryWriteBufferStatsV1 | None = None
+    installation_cache: TelemetryInstallationCacheStatsV1 | None = None
+    nonce_dedup: TelemetryNonceDedupStatsV1 | None = None
+    spool: TelemetrySpoolStatsV1 | None = None
+
+
+class RuyiVersionCountV1(BaseModel):
+    version: str
+    count: int
+    """Number of telemetry uploads from this version."""
+
+
+class RuyiVersionAdoptionV1(BaseModel):
+    """Response schema for the ``/admin/ruyi-version-adoption-v1`` endpoint."""
+
+    time_start: datetime.datetime
+    time_end: datetime.datetime
+    total: int
+    """Number of telemetry uploads from all versions."""
+    versions: list[RuyiVersionCountV1]
+    """Per-version upload counts, most popular versions first."""
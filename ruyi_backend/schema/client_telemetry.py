@@ -1,9 +1,15 @@
 import json
-from typing import Any
+from typing import Annotated, Any, Literal
 from typing import TypeAlias
 from uuid import UUID
 
-from pydantic import BaseModel, Field, PositiveInt, model_validator
+from pydantic import (
+    AfterValidator,
+    BaseModel,
+    Field,
+    PositiveInt,
+    model_validator,
+)
 
 
 ## Start of adapted code from ruyisdk/ruyi
@@ -72,3 +78,62 @@ class UploadPayload(BaseModel):
 AggregateKey: TypeAlias = tuple[tuple[str, str], ...]
 
 ## End of copied code from ruyisdk/ruyi
+
+
+def _check_uuid_str(v: str) -> str:
+    UUID(v)
+    return v
+
+
+class InstallationEnvelope(BaseModel):
+    """The part of a :class:`NodeInfo` checked when accepting an upload."""
+
+    report_uuid: UUID
+
+
+class OpaqueObject(BaseModel):
+    """Any JSON object, its members left unchecked."""
+
+
+class UploadEnvelope(BaseModel):
+    """The parts of an :class:`UploadPayload` checked when accepting an upload.
+
+    Accepted uploads are stored verbatim and fully validated at processing
+    time, so only what is needed for routing the upload into the respective
+    tables, and for bounding its size, is looked at here."""
+
+    fmt: Literal[1]
+    nonce: Annotated[str, AfterValidator(_check_uuid_str)]
+    ruyi_version: str = Field(max_length=255)
+    report_uuid: UUID | None = Field(default=None)
+    installation: InstallationEnvelope | None = Field(default=None)
+    events: list[OpaqueObject] = Field(default=[])
+
+    @property
+    def effective_report_uuid(self) -> UUID | None:
+        """The report UUID to record installation info under, following the
+        semantics of :class:`UploadPayload`."""
+
+        if self.installation is not None:
+            return self.installation.report_uuid
+        return self.report_uuid
+
+
+class UploadStatusV1(BaseModel):
+    """Outcome of one upload of a batch."""
+
+    status: Literal["accepted", "duplicate", "invalid"]
+    nonce: str | None = None
+    """The nonce of the upload, if it could be parsed."""
+    detail: str | None = None
+    """Why the upload is invalid."""
+
+
+class UploadBatchResultV1(BaseModel):
+    """Response schema for the ``/telemetry/pm/upload-batch-v1`` endpoint."""
+
+    accepted: int = 0
+    duplicate: int = 0
+    invalid: int = 0
+    results: list[UploadStatusV1] = Field(default=[])
+    """Outcome of every upload, in the order of the request."""
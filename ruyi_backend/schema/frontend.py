@@ -49,6 +49,10 @@ class DashboardDataV1(BaseModel):
 
     Supersedes `downloads`, `pm_downloads` and `other_categories_downloads`."""
     installs: DashboardEventDetailV1 | None
+    active_installs_7d: DashboardEventDetailV1 | None = None
+    """Estimated number of installations seen in the last 7 days."""
+    active_installs_30d: DashboardEventDetailV1 | None = None
+    """Estimated number of installations seen in the last 30 days."""
     top_packages: dict[str, DashboardEventDetailV1 | None]
     top_commands: dict[str, DashboardEventDetailV1 | None]
 
@@ -0,0 +1,25 @@
+#!/bin/bash
+# Runs the periodic admin jobs in-process with the ruyi-backend CLI, instead
+# of through the admin API as ruyi-backend-process-telemetry.sh does, so that
+# long runs are not subject to HTTP timeouts nor compete with API traffic.
+#
+# The ruyi-backend configuration is taken from the environment, as with the
+# API service.
+
+set -e
+
+: "${RUYI_BACKEND:=ruyi-backend}"
+
+"$RUYI_BACKEND" process-telemetry "$@"
+"$RUYI_BACKEND" refresh-github-stats
+"$RUYI_BACKEND" refresh-news
+
+hour="$(date +%H)"
+hour="${hour//0}"  # test(1) cannot handle 08 (seems treated as invalid octal)
+if [[ $hour -eq 3 ]]; then
+	# bootstraps the live telemetry counters, and corrects any drift daily
+	"$RUYI_BACKEND" reconcile-telemetry-counters
+fi
+if [[ $hour -eq 8 ]]; then
+	"$RUYI_BACKEND" refresh-pypi-stats
+fi
@@ -0,0 +1,19 @@
+-- Replaces the per-upload `telemetry_ruyi_versions` rows with hourly counters.
+
+CREATE TABLE `telemetry_ruyi_version_counts` (
+    `bucket` DATETIME NOT NULL COMMENT 'Start of the hour the uploads were received in',
+    `version` VARCHAR(255) NOT NULL COMMENT 'The version of ruyi that generated the data',
+    `count` BIGINT(20) NOT NULL DEFAULT 0 COMMENT 'The number of uploads received',
+    PRIMARY KEY (`bucket`, `version`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+INSERT INTO `telemetry_ruyi_version_counts` (`bucket`, `version`, `count`)
+SELECT
+    DATE_FORMAT(`created_at`, '%Y-%m-%d %H:00:00') AS `bucket`,
+    `version`,
+    COUNT(*)
+FROM `telemetry_ruyi_versions`
+GROUP BY `bucket`, `version`
+ON DUPLICATE KEY UPDATE `count` = `count` + VALUES(`count`);
+
+DROP TABLE `telemetry_ruyi_versions`;
@@ -0,0 +1,32 @@
+-- Turns `telemetry_aggregated_events` into one counter row per
+-- (time_bucket, kind, params), merging the existing duplicate rows.
+
+CREATE TABLE `telemetry_aggregated_events_new` (
+    `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+    `time_bucket` VARCHAR(255) NOT NULL,
+    `kind` VARCHAR(255) NOT NULL,
+    `params_kv_raw` JSON NOT NULL,
+    `params_hash` BINARY(16) NOT NULL COMMENT 'UNHEX(MD5(params_kv_raw)), for keying the row',
+    `count` BIGINT(20) NOT NULL,
+    `created_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP,
+    CHECK (JSON_VALID(`params_kv_raw`)),
+    UNIQUE KEY `idx_telemetry_aggregated_events_bucket_kind_params` (`time_bucket`, `kind`, `params_hash`),
+    KEY `idx_telemetry_aggregated_events_ctime_time_bucket_kind` (`created_at`, `time_bucket`, `kind`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+INSERT INTO `telemetry_aggregated_events_new` (`time_bucket`, `kind`, `params_kv_raw`, `params_hash`, `count`, `created_at`)
+SELECT
+    `time_bucket`,
+    `kind`,
+    MIN(`params_kv_raw`),
+    UNHEX(MD5(`params_kv_raw`)) AS `h`,
+    SUM(`count`),
+    MIN(`created_at`)
+FROM `telemetry_aggregated_events`
+GROUP BY `time_bucket`, `kind`, `h`;
+
+RENAME TABLE
+    `telemetry_aggregated_events` TO `telemetry_aggregated_events_old`,
+    `telemetry_aggregated_events_new` TO `telemetry_aggregated_events`;
+
+DROP TABLE `telemetry_aggregated_events_old`;
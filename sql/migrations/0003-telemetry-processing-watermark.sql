@@ -0,0 +1,31 @@
+-- Tracks telemetry processing by a watermark and a ledger of processed id
+-- ranges instead of the `is_processed` flag of every raw upload, which is no
+-- longer maintained.
+
+CREATE TABLE `telemetry_processing_watermarks` (
+    `name` VARCHAR(64) NOT NULL PRIMARY KEY COMMENT 'Name of the processing job',
+    `last_id` BIGINT(20) NOT NULL COMMENT 'ID of the last raw upload processed',
+    `updated_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE TABLE `telemetry_processing_ledger` (
+    `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+    `name` VARCHAR(64) NOT NULL COMMENT 'Name of the processing job',
+    `first_id` BIGINT(20) NOT NULL COMMENT 'First raw upload ID of the range processed',
+    `last_id` BIGINT(20) NOT NULL COMMENT 'Last raw upload ID of the range processed, inclusive',
+    `uploads` INT NOT NULL COMMENT 'Number of raw uploads within the range',
+    `created_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY `idx_telemetry_processing_ledger_name_first_id` (`name`, `first_id`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+-- Resume right after the last upload processed under the `is_processed` flag,
+-- as the old processing picked up all unflagged uploads after it. Resuming
+-- from the first unflagged upload instead would count the flagged ones after
+-- it again, if any upload was committed late.
+INSERT INTO `telemetry_processing_watermarks` (`name`, `last_id`)
+SELECT
+    'telemetry-processing',
+    COALESCE(
+        (SELECT MAX(`id`) FROM `telemetry_raw_uploads` WHERE `is_processed` = TRUE),
+        0
+    );
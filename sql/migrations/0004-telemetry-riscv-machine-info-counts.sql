@@ -0,0 +1,43 @@
+-- Turns `telemetry_riscv_machine_infos` into one row per distinct machine of
+-- an installation, merging the existing rows. Those lack the report UUID, so
+-- they are merged by the machine attributes alone.
+
+CREATE TABLE `telemetry_riscv_machine_infos_new` (
+    `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+    `fingerprint` BINARY(16) NOT NULL COMMENT 'MD5 of the report UUID and all machine attributes, for keying the row',
+    `report_uuid` UUID COMMENT 'The UUID of the installation reporting the machine, NULL for legacy rows',
+    `model_name` VARCHAR(255) NOT NULL COMMENT 'The model name of the RISC-V machine',
+    `cpu_count` INT NOT NULL COMMENT 'The number of CPUs in the machine',
+    `isa` VARCHAR(1024) NOT NULL COMMENT 'The ISA string of the machine',
+    `uarch` VARCHAR(255) NOT NULL COMMENT 'The microarchitecture of the machine from /proc/cpuinfo',
+    `uarch_csr` VARCHAR(255) NOT NULL COMMENT 'The uarch CSR values of the machine, "{mvendorid:x}:{marchid:x}:{mimpid:x}" or "unknown"',
+    `mmu` VARCHAR(255) NOT NULL COMMENT 'The MMU characteristic of the machine from /proc/cpuinfo, "svXX" or "unknown"',
+    `first_seen` DATETIME NOT NULL COMMENT 'When the machine was first reported',
+    `last_seen` DATETIME NOT NULL COMMENT 'When the machine was last reported',
+    `count` BIGINT(20) NOT NULL COMMENT 'The number of uploads reporting the machine',
+    `created_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY `idx_telemetry_riscv_machine_infos_fingerprint` (`fingerprint`),
+    KEY `idx_telemetry_riscv_machine_infos_ctime` (`created_at`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+INSERT INTO `telemetry_riscv_machine_infos_new` (`fingerprint`, `model_name`, `cpu_count`, `isa`, `uarch`, `uarch_csr`, `mmu`, `first_seen`, `last_seen`, `count`, `created_at`)
+SELECT
+    UNHEX(MD5(CONCAT_WS(CHAR(31), '', `model_name`, `isa`, `uarch`, `uarch_csr`, `mmu`, `cpu_count`))) AS `fp`,
+    MIN(`model_name`),
+    MIN(`cpu_count`),
+    MIN(`isa`),
+    MIN(`uarch`),
+    MIN(`uarch_csr`),
+    MIN(`mmu`),
+    MIN(`created_at`),
+    MAX(`created_at`),
+    COUNT(*),
+    MIN(`created_at`)
+FROM `telemetry_riscv_machine_infos`
+GROUP BY `fp`;
+
+RENAME TABLE
+    `telemetry_riscv_machine_infos` TO `telemetry_riscv_machine_infos_old`,
+    `telemetry_riscv_machine_infos_new` TO `telemetry_riscv_machine_infos`;
+
+DROP TABLE `telemetry_riscv_machine_infos_old`;
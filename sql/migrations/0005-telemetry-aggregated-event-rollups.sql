@@ -0,0 +1,69 @@
+-- Adds the hourly, daily and monthly rollups of `telemetry_aggregated_events`,
+-- filling them from the existing rows. Events with time buckets too short for
+-- a grain are left out of it, as they are by processing.
+
+CREATE TABLE `telemetry_aggregated_events_hourly` (
+    `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+    `time_bucket` VARCHAR(16) NOT NULL COMMENT 'The time bucket of the events truncated to YYYYMMDDHH',
+    `kind` VARCHAR(255) NOT NULL,
+    `params_kv_raw` JSON NOT NULL,
+    `params_hash` BINARY(16) NOT NULL COMMENT 'UNHEX(MD5(params_kv_raw)), for keying the row',
+    `count` BIGINT(20) NOT NULL,
+    CHECK (JSON_VALID(`params_kv_raw`)),
+    UNIQUE KEY `idx_telemetry_aggregated_events_hourly_kind_bucket_params` (`kind`, `time_bucket`, `params_hash`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE TABLE `telemetry_aggregated_events_daily` (
+    `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+    `time_bucket` VARCHAR(16) NOT NULL COMMENT 'The time bucket of the events truncated to YYYYMMDD',
+    `kind` VARCHAR(255) NOT NULL,
+    `params_kv_raw` JSON NOT NULL,
+    `params_hash` BINARY(16) NOT NULL COMMENT 'UNHEX(MD5(params_kv_raw)), for keying the row',
+    `count` BIGINT(20) NOT NULL,
+    CHECK (JSON_VALID(`params_kv_raw`)),
+    UNIQUE KEY `idx_telemetry_aggregated_events_daily_kind_bucket_params` (`kind`, `time_bucket`, `params_hash`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE TABLE `telemetry_aggregated_events_monthly` (
+    `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+    `time_bucket` VARCHAR(16) NOT NULL COMMENT 'The time bucket of the events truncated to YYYYMM',
+    `kind` VARCHAR(255) NOT NULL,
+    `params_kv_raw` JSON NOT NULL,
+    `params_hash` BINARY(16) NOT NULL COMMENT 'UNHEX(MD5(params_kv_raw)), for keying the row',
+    `count` BIGINT(20) NOT NULL,
+    CHECK (JSON_VALID(`params_kv_raw`)),
+    UNIQUE KEY `idx_telemetry_aggregated_events_monthly_kind_bucket_params` (`kind`, `time_bucket`, `params_hash`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+INSERT INTO `telemetry_aggregated_events_hourly` (`time_bucket`, `kind`, `params_kv_raw`, `params_hash`, `count`)
+SELECT
+    LEFT(`time_bucket`, 10) AS `bucket`,
+    `kind`,
+    MIN(`params_kv_raw`),
+    `params_hash`,
+    SUM(`count`)
+FROM `telemetry_aggregated_events`
+WHERE CHAR_LENGTH(`time_bucket`) >= 10
+GROUP BY `bucket`, `kind`, `params_hash`;
+
+INSERT INTO `telemetry_aggregated_events_daily` (`time_bucket`, `kind`, `params_kv_raw`, `params_hash`, `count`)
+SELECT
+    LEFT(`time_bucket`, 8) AS `bucket`,
+    `kind`,
+    MIN(`params_kv_raw`),
+    `params_hash`,
+    SUM(`count`)
+FROM `telemetry_aggregated_events`
+WHERE CHAR_LENGTH(`time_bucket`) >= 8
+GROUP BY `bucket`, `kind`, `params_hash`;
+
+INSERT INTO `telemetry_aggregated_events_monthly` (`time_bucket`, `kind`, `params_kv_raw`, `params_hash`, `count`)
+SELECT
+    LEFT(`time_bucket`, 6) AS `bucket`,
+    `kind`,
+    MIN(`params_kv_raw`),
+    `params_hash`,
+    SUM(`count`)
+FROM `telemetry_aggregated_events`
+WHERE CHAR_LENGTH(`time_bucket`) >= 6
+GROUP BY `bucket`, `kind`, `params_hash`;
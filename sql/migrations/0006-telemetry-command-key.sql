@@ -0,0 +1,51 @@
+-- Adds the command key of cli:invocation-v1 events as an indexed column to
+-- `telemetry_aggregated_events` and its rollups, filling it from the params of
+-- the existing rows, so that commands can be counted by a `GROUP BY`.
+
+ALTER TABLE `telemetry_aggregated_events`
+    ADD COLUMN `command_key` VARCHAR(255) COMMENT 'The `key` param of cli:invocation-v1 events, i.e. the ruyi command invoked' AFTER `params_hash`,
+    ADD KEY `idx_telemetry_aggregated_events_kind_command_key` (`kind`, `command_key`);
+
+UPDATE `telemetry_aggregated_events` SET `command_key` = (
+    SELECT LEFT(`p`.`v`, 255)
+    FROM JSON_TABLE(`params_kv_raw`, '$[*]' COLUMNS (`k` TEXT PATH '$[0]', `v` TEXT PATH '$[1]')) AS `p`
+    WHERE `p`.`k` = 'key'
+    LIMIT 1
+)
+WHERE `kind` = 'cli:invocation-v1';
+
+ALTER TABLE `telemetry_aggregated_events_hourly`
+    ADD COLUMN `command_key` VARCHAR(255) COMMENT 'The `key` param of cli:invocation-v1 events, i.e. the ruyi command invoked' AFTER `params_hash`,
+    ADD KEY `idx_telemetry_aggregated_events_hourly_kind_command_key` (`kind`, `command_key`);
+
+UPDATE `telemetry_aggregated_events_hourly` SET `command_key` = (
+    SELECT LEFT(`p`.`v`, 255)
+    FROM JSON_TABLE(`params_kv_raw`, '$[*]' COLUMNS (`k` TEXT PATH '$[0]', `v` TEXT PATH '$[1]')) AS `p`
+    WHERE `p`.`k` = 'key'
+    LIMIT 1
+)
+WHERE `kind` = 'cli:invocation-v1';
+
+ALTER TABLE `telemetry_aggregated_events_daily`
+    ADD COLUMN `command_key` VARCHAR(255) COMMENT 'The `key` param of cli:invocation-v1 events, i.e. the ruyi command invoked' AFTER `params_hash`,
+    ADD KEY `idx_telemetry_aggregated_events_daily_kind_command_key` (`kind`, `command_key`);
+
+UPDATE `telemetry_aggregated_events_daily` SET `command_key` = (
+    SELECT LEFT(`p`.`v`, 255)
+    FROM JSON_TABLE(`params_kv_raw`, '$[*]' COLUMNS (`k` TEXT PATH '$[0]', `v` TEXT PATH '$[1]')) AS `p`
+    WHERE `p`.`k` = 'key'
+    LIMIT 1
+)
+WHERE `kind` = 'cli:invocation-v1';
+
+ALTER TABLE `telemetry_aggregated_events_monthly`
+    ADD COLUMN `command_key` VARCHAR(255) COMMENT 'The `key` param of cli:invocation-v1 events, i.e. the ruyi command invoked' AFTER `params_hash`,
+    ADD KEY `idx_telemetry_aggregated_events_monthly_kind_command_key` (`kind`, `command_key`);
+
+UPDATE `telemetry_aggregated_events_monthly` SET `command_key` = (
+    SELECT LEFT(`p`.`v`, 255)
+    FROM JSON_TABLE(`params_kv_raw`, '$[*]' COLUMNS (`k` TEXT PATH '$[0]', `v` TEXT PATH '$[1]')) AS `p`
+    WHERE `p`.`k` = 'key'
+    LIMIT 1
+)
+WHERE `kind` = 'cli:invocation-v1';
@@ -0,0 +1,12 @@
+-- Persists the daily mirror download counts of closed days, so that refreshing
+-- the dashboard only queries Elasticsearch for the days not persisted yet.
+-- The table is filled on the next dashboard refresh.
+
+CREATE TABLE `download_stats_daily_mirror` (
+    `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+    `category` VARCHAR(64) NOT NULL COMMENT 'The category of the mirror paths downloaded from',
+    `date` TIMESTAMP NOT NULL COMMENT 'The date of the download stats, in UTC+8',
+    `count` BIGINT(20) NOT NULL DEFAULT 0 COMMENT 'The number of downloads on that date',
+    `created_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY `idx_download_stats_daily_mirror_category_date` (`category`, `date`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
@@ -0,0 +1,8 @@
+-- Records the raw uploads that telemetry processing skips for failing
+-- validation, instead of getting stuck on them.
+
+CREATE TABLE `telemetry_invalid_raw_uploads` (
+    `raw_upload_id` BIGINT(20) NOT NULL PRIMARY KEY COMMENT 'ID of the raw upload skipped by processing',
+    `error` TEXT NOT NULL COMMENT 'Why the raw upload failed validation',
+    `created_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
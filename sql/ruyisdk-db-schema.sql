@@ -3,16 +3,38 @@ CREATE TABLE `telemetry_raw_uploads` (
     `nonce` UUID NOT NULL COMMENT 'Nonce for server-side event de-duping',
     `raw_events` JSON COMMENT 'The raw JSON payload',
     `created_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP,
-    `is_processed` BOOLEAN NOT NULL DEFAULT FALSE COMMENT 'Whether this row has been processed',
+    `is_processed` BOOLEAN NOT NULL DEFAULT FALSE COMMENT 'Legacy; processing is tracked by telemetry_processing_watermarks now',
     UNIQUE KEY `idx_telemetry_raw_uploads_nonce` (`nonce`),
     KEY `idx_telemetry_raw_uploads_ctime_processed` (`created_at`, `is_processed`)
 ) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 
-CREATE TABLE `telemetry_ruyi_versions` (
-    `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+CREATE TABLE `telemetry_ruyi_version_counts` (
+    `bucket` DATETIME NOT NULL COMMENT 'Start of the hour the uploads were received in',
     `version` VARCHAR(255) NOT NULL COMMENT 'The version of ruyi that generated the data',
+    `count` BIGINT(20) NOT NULL DEFAULT 0 COMMENT 'The number of uploads received',
+    PRIMARY KEY (`bucket`, `version`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE TABLE `telemetry_processing_watermarks` (
+    `name` VARCHAR(64) NOT NULL PRIMARY KEY COMMENT 'Name of the processing job',
+    `last_id` BIGINT(20) NOT NULL COMMENT 'ID of the last raw upload processed',
+    `updated_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE TABLE `telemetry_processing_ledger` (
+    `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+    `name` VARCHAR(64) NOT NULL COMMENT 'Name of the processing job',
+    `first_id` BIGINT(20) NOT NULL COMMENT 'First raw upload ID of the range processed',
+    `last_id` BIGINT(20) NOT NULL COMMENT 'Last raw upload ID of the range processed, inclusive',
+    `uploads` INT NOT NULL COMMENT 'Number of raw uploads within the range',
     `created_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP,
-    KEY `idx_telemetry_ruyi_versions_ctime_version` (`created_at`, `version`)
+    UNIQUE KEY `idx_telemetry_processing_ledger_name_first_id` (`name`, `first_id`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE TABLE `telemetry_invalid_raw_uploads` (
+    `raw_upload_id` BIGINT(20) NOT NULL PRIMARY KEY COMMENT 'ID of the raw upload skipped by processing',
+    `error` TEXT NOT NULL COMMENT 'Why the raw upload failed validation',
+    `created_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP
 ) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 
 CREATE TABLE `telemetry_raw_installation_infos` (
@@ -42,13 +64,19 @@ CREATE TABLE `telemetry_installation_infos` (
 
 CREATE TABLE `telemetry_riscv_machine_infos` (
     `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+    `fingerprint` BINARY(16) NOT NULL COMMENT 'MD5 of the report UUID and all machine attributes, for keying the row',
+    `report_uuid` UUID COMMENT 'The UUID of the installation reporting the machine, NULL for legacy rows',
     `model_name` VARCHAR(255) NOT NULL COMMENT 'The model name of the RISC-V machine',
     `cpu_count` INT NOT NULL COMMENT 'The number of CPUs in the machine',
     `isa` VARCHAR(1024) NOT NULL COMMENT 'The ISA string of the machine',
     `uarch` VARCHAR(255) NOT NULL COMMENT 'The microarchitecture of the machine from /proc/cpuinfo',
     `uarch_csr` VARCHAR(255) NOT NULL COMMENT 'The uarch CSR values of the machine, "{mvendorid:x}:{marchid:x}:{mimpid:x}" or "unknown"',
     `mmu` VARCHAR(255) NOT NULL COMMENT 'The MMU characteristic of the machine from /proc/cpuinfo, "svXX" or "unknown"',
+    `first_seen` DATETIME NOT NULL COMMENT 'When the machine was first reported',
+    `last_seen` DATETIME NOT NULL COMMENT 'When the machine was last reported',
+    `count` BIGINT(20) NOT NULL COMMENT 'The number of uploads reporting the machine',
     `created_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY `idx_telemetry_riscv_machine_infos_fingerprint` (`fingerprint`),
     KEY `idx_telemetry_riscv_machine_infos_ctime` (`created_at`)
 ) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 
@@ -57,12 +85,55 @@ CREATE TABLE `telemetry_aggregated_events` (
     `time_bucket` VARCHAR(255) NOT NULL,
     `kind` VARCHAR(255) NOT NULL,
     `params_kv_raw` JSON NOT NULL,
-    `count` INT NOT NULL,
+    `params_hash` BINARY(16) NOT NULL COMMENT 'UNHEX(MD5(params_kv_raw)), for keying the row',
+    `command_key` VARCHAR(255) COMMENT 'The `key` param of cli:invocation-v1 events, i.e. the ruyi command invoked',
+    `count` BIGINT(20) NOT NULL,
     `created_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP,
     CHECK (JSON_VALID(`params_kv_raw`)),
+    UNIQUE KEY `idx_telemetry_aggregated_events_bucket_kind_params` (`time_bucket`, `kind`, `params_hash`),
+    KEY `idx_telemetry_aggregated_events_kind_command_key` (`kind`, `command_key`),
     KEY `idx_telemetry_aggregated_events_ctime_time_bucket_kind` (`created_at`, `time_bucket`, `kind`)
 ) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 
+CREATE TABLE `telemetry_aggregated_events_hourly` (
+    `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+    `time_bucket` VARCHAR(16) NOT NULL COMMENT 'The time bucket of the events truncated to YYYYMMDDHH',
+    `kind` VARCHAR(255) NOT NULL,
+    `params_kv_raw` JSON NOT NULL,
+    `params_hash` BINARY(16) NOT NULL COMMENT 'UNHEX(MD5(params_kv_raw)), for keying the row',
+    `command_key` VARCHAR(255) COMMENT 'The `key` param of cli:invocation-v1 events, i.e. the ruyi command invoked',
+    `count` BIGINT(20) NOT NULL,
+    CHECK (JSON_VALID(`params_kv_raw`)),
+    UNIQUE KEY `idx_telemetry_aggregated_events_hourly_kind_bucket_params` (`kind`, `time_bucket`, `params_hash`),
+    KEY `idx_telemetry_aggregated_events_hourly_kind_command_key` (`kind`, `command_key`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE TABLE `telemetry_aggregated_events_daily` (
+    `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+    `time_bucket` VARCHAR(16) NOT NULL COMMENT 'The time bucket of the events truncated to YYYYMMDD',
+    `kind` VARCHAR(255) NOT NULL,
+    `params_kv_raw` JSON NOT NULL,
+    `params_hash` BINARY(16) NOT NULL COMMENT 'UNHEX(MD5(params_kv_raw)), for keying the row',
+    `command_key` VARCHAR(255) COMMENT 'The `key` param of cli:invocation-v1 events, i.e. the ruyi command invoked',
+    `count` BIGINT(20) NOT NULL,
+    CHECK (JSON_VALID(`params_kv_raw`)),
+    UNIQUE KEY `idx_telemetry_aggregated_events_daily_kind_bucket_params` (`kind`, `time_bucket`, `params_hash`),
+    KEY `idx_telemetry_aggregated_events_daily_kind_command_key` (`kind`, `command_key`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE TABLE `telemetry_aggregated_events_monthly` (
+    `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+    `time_bucket` VARCHAR(16) NOT NULL COMMENT 'The time bucket of the events truncated to YYYYMM',
+    `kind` VARCHAR(255) NOT NULL,
+    `params_kv_raw` JSON NOT NULL,
+    `params_hash` BINARY(16) NOT NULL COMMENT 'UNHEX(MD5(params_kv_raw)), for keying the row',
+    `command_key` VARCHAR(255) COMMENT 'The `key` param of cli:invocation-v1 events, i.e. the ruyi command invoked',
+    `count` BIGINT(20) NOT NULL,
+    CHECK (JSON_VALID(`params_kv_raw`)),
+    UNIQUE KEY `idx_telemetry_aggregated_events_monthly_kind_bucket_params` (`kind`, `time_bucket`, `params_hash`),
+    KEY `idx_telemetry_aggregated_events_monthly_kind_command_key` (`kind`, `command_key`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
 CREATE TABLE `download_stats_daily_pypi` (
     `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
     `name` VARCHAR(255) NOT NULL COMMENT 'The name of the PyPI package',
@@ -72,3 +143,12 @@ CREATE TABLE `download_stats_daily_pypi` (
     `created_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP,
     UNIQUE KEY `idx_download_stats_daily_pypi_name_version_date` (`name`, `version`, `date`)
 ) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+CREATE TABLE `download_stats_daily_mirror` (
+    `id` BIGINT(20) AUTO_INCREMENT PRIMARY KEY,
+    `category` VARCHAR(64) NOT NULL COMMENT 'The category of the mirror paths downloaded from',
+    `date` TIMESTAMP NOT NULL COMMENT 'The date of the download stats, in UTC+8',
+    `count` BIGINT(20) NOT NULL DEFAULT 0 COMMENT 'The number of downloads on that date',
+    `created_at` TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY `idx_download_stats_daily_mirror_category_date` (`category`, `date`)
+) ENGINE InnoDB CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
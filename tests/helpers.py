@@ -0,0 +1,213 @@
+"""
+Sample data and in-memory stand-ins of the DB engine and the cache store,
+shared by the tests.
+"""
+
+import json
+from types import TracebackType
+from typing import Any, Mapping
+
+from ruyi_backend.components.telemetry_ingest import UploadRecord, parse_upload
+
+UPLOAD_PAYLOAD: dict[str, Any] = {
+    "fmt": 1,
+    "nonce": "f051065f71d94b5bb7b336ba0b782983",
+    "ruyi_version": "0.44.0-beta.20251219",
+    "events": [
+        {
+            "time_bucket": "202604031223",
+            "kind": "cli:invocation-v1",
+            "params": [["key", "version"]],
+            "count": 1,
+        },
+        {
+            "time_bucket": "202605112234",
+            "kind": "cli:invocation-v1",
+            "params": [["key", "<bare>"]],
+            "count": 1,
+        },
+    ],
+    "installation": {
+        "v": 1,
+        "report_uuid": "7a5ac670847648f98fc9d453591d145e",
+        "arch": "x86_64",
+        "ci": "maybe-not",
+        "libc_name": "glibc",
+        "libc_ver": "2.41",
+        "os": "linux",
+        "os_release_id": "gentoo",
+        "os_release_version_id": "2.17",
+        "shell": "zsh",
+    },
+}
+
+
+def make_nonce(i: int) -> str:
+    return f"{i:032x}"
+
+
+def make_record(nonce: str) -> UploadRecord:
+    envelope, doc = parse_upload(json.dumps(UPLOAD_PAYLOAD | {"nonce": nonce}).encode())
+    return UploadRecord.from_envelope(envelope, doc)
+
+
+class FakeResult(list[Any]):
+    def first(self) -> Any:
+        return self[0] if self else None
+
+    def scalar_one(self) -> Any:
+        assert len(self) == 1
+        return self[0][0]
+
+    def scalar_one_or_none(self) -> Any:
+        return self[0][0] if self else None
+
+
+class FakeConnection:
+    """Connection of a :class:`FakeEngine`, recording the statements executed
+    and answering every ``SELECT`` with the engine's ``select_rows``.
+
+    Tests needing a DB that answers specific statements subclass this."""
+
+    def __init__(self, engine: Any) -> None:
+        self.engine = engine
+        self.executions: list[tuple[str, Any]] = []
+
+    async def __aenter__(self) -> "FakeConnection":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        return None
+
+    async def execute(self, statement: Any, params: Any = None) -> FakeResult:
+        if self.engine.fail:
+            raise RuntimeError("DB is down")
+        if str(statement).startswith("SELECT"):
+            return FakeResult(self.engine.select_rows)
+        self.executions.append((str(statement), params))
+        return FakeResult()
+
+    async def commit(self) -> None:
+        self.engine.commits.append(self.executions)
+        self.executions = []
+
+    async def rollback(self) -> None:
+        self.executions = []
+
+
+class FakeEngine:
+    """Keeps the statements of every committed transaction in ``commits``."""
+
+    def __init__(self) -> None:
+        self.fail = False
+        self.select_rows: list[tuple[Any, ...]] = []
+        self.commits: list[list[tuple[str, Any]]] = []
+
+    def connect(self) -> FakeConnection:
+        return FakeConnection(self)
+
+
+class FakeCache:
+    """In-memory stand-in of :class:`ruyi_backend.cache.store.CacheStore`.
+
+    All keys live in ``values``: HyperLogLogs as sets of the values added,
+    counters as dicts, and bitmaps as sets of the offsets set."""
+
+    def __init__(self) -> None:
+        self.values: dict[str, Any] = {}
+        self.broken = False
+
+    def _check(self) -> None:
+        if self.broken:
+            raise ConnectionError()
+
+    async def get(self, key: str) -> Any:
+        self._check()
+        return self.values.get(key)
+
+    async def set(self, key: str, val: Any, nx: bool = False, **_: Any) -> bool:
+        self._check()
+        if nx and key in self.values:
+            return False
+        self.values[key] = val
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        self._check()
+        return sum(self.values.pop(k, None) is not None for k in keys)
+
+    async def rename(self, src: str, dst: str) -> None:
+        self._check()
+        self.values[dst] = self.values.pop(src)
+
+    async def mget(self, keys: list[str]) -> list[Any]:
+        self._check()
+        return [self.values.get(k) for k in keys]
+
+    async def mset_ex(self, mapping: dict[str, Any], ex: int) -> None:
+        self._check()
+        self.values.update(mapping)
+
+    async def getbits(self, names: list[str], offsets: list[int]) -> list[list[int]]:
+        self._check()
+        return [
+            [int(off in self.values.get(name, set())) for off in offsets]
+            for name in names
+        ]
+
+    async def setbits(self, name: str, offsets: list[int], ttl: int) -> None:
+        self._check()
+        self.values.setdefault(name, set()).update(offsets)
+
+    async def incr_counters(
+        self,
+        name: str,
+        top_name: str,
+        deltas: Mapping[str, int],
+    ) -> None:
+        self._check()
+        for n in (name, top_name):
+            counters = self.values.setdefault(n, {})
+            for k, delta in deltas.items():
+                counters[k] = counters.get(k, 0) + delta
+
+    async def replace_counters(
+        self,
+        name: str,
+        top_name: str,
+        totals: Mapping[str, int],
+    ) -> None:
+        self._check()
+        self.values[name] = dict(totals)
+        self.values[top_name] = dict(totals)
+
+    async def top_counters(self, top_name: str, n: int) -> list[tuple[str, int]]:
+        self._check()
+        counters: dict[str, int] = self.values.get(top_name, {})
+        return sorted(counters.items(), key=lambda kv: kv[1], reverse=True)[:n]
+
+    async def pfadd(self, name: str, values: Any, ex: int | None = None) -> None:
+        self._check()
+        if values:
+            self.values.setdefault(name, set()).update(values)
+
+    async def pfcount(self, *names: str) -> int:
+        self._check()
+        return len(set().union(*(self.values.get(n, set()) for n in names)))
+
+
+class FakeES:
+    """Answers every search with the given date histogram buckets."""
+
+    def __init__(self, buckets: list[dict[str, Any]] | None = None) -> None:
+        self.buckets = buckets or []
+        self.searches: list[dict[str, Any]] = []
+
+    async def search(self, **kwargs: Any) -> dict[str, Any]:
+        self.searches.append(kwargs)
+        return {"aggregations": {"days": {"buckets": self.buckets}}}
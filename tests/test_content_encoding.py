@@ -0,0 +1,77 @@
+import pytest
+import zstandard
+
+from ruyi_backend.components.content_encoding import (
+    BodyTooLargeError,
+    MalformedBodyError,
+    make_body_decoder,
+)
+
+_HELLO = b"hello world" * 100
+_SKIPPABLE_FRAME = (
+    (0x184D2A50).to_bytes(4, "little") + (3).to_bytes(4, "little") + b"xyz"
+)
+
+
+def _compress(data: bytes, checksum: bool = False) -> bytes:
+    return zstandard.ZstdCompressor(write_checksum=checksum).compress(data)
+
+
+def test_decoder_takes_lines_as_they_arrive() -> None:
+    decoder = make_body_decoder("identity", 16)
+
+    decoder.feed(b"ab\nc")
+    assert decoder.take_lines() == [b"ab"]
+    assert decoder.take_lines() == []
+    decoder.feed(b"d\n\nef")
+    assert decoder.take_lines() == [b"cd", b""]
+    assert decoder.finish() == b"ef"
+
+    # the limit is on the whole body, lines taken or not
+    with pytest.raises(BodyTooLargeError):
+        decoder.feed(b"ghijklmn")
+
+
+def test_zstd_decoder_bounds_output_of_small_inputs() -> None:
+    bomb = _compress(bytes(100 << 20))
+    decoder = make_body_decoder("zstd", 1 << 20)
+
+    with pytest.raises(BodyTooLargeError):
+        decoder.feed(bomb[:1024])
+    assert len(decoder._buf) <= 1 << 20
+
+
+@pytest.mark.parametrize(
+    ("body", "expected"),
+    [
+        (_compress(_HELLO), _HELLO),
+        (_compress(_HELLO, checksum=True), _HELLO),
+        # a single RLE block
+        (_compress(bytes(100000), checksum=True), bytes(100000)),
+        (_compress(_HELLO[:11]) + _SKIPPABLE_FRAME + _compress(_HELLO[11:]), _HELLO),
+    ],
+)
+def test_zstd_decoder_decodes_whole_frames(body: bytes, expected: bytes) -> None:
+    decoder = make_body_decoder("zstd", 1 << 20)
+    for i in range(0, len(body), 7):
+        decoder.feed(body[i : i + 7])
+
+    assert decoder.finish() == expected
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"",
+        _compress(_HELLO)[:-1],
+        _compress(_HELLO, checksum=True)[:-1],
+        _compress(_HELLO[:11]) + _SKIPPABLE_FRAME[:-1],
+        _compress(_HELLO[:11]) + _compress(_HELLO[:11])[:5],
+    ],
+)
+def test_zstd_decoder_rejects_truncated_streams(body: bytes) -> None:
+    decoder = make_body_decoder("zstd", 1 << 20)
+    decoder.feed(body)
+
+    with pytest.raises(MalformedBodyError):
+        decoder.finish()
@@ -0,0 +1,81 @@
+import datetime
+import os
+from typing import Any
+import uuid
+
+import pytest
+
+from ruyi_backend.db.bulk import BulkStatement, BulkWriter, format_tsv
+
+STMT = BulkStatement(
+    "t",
+    ["k", "v", "h"],
+    on_duplicate="`t`.`v` = `t`.`v` + VALUES(`v`)",
+)
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.executions: list[tuple[str, Any]] = []
+        self.loaded: bytes | None = None
+
+    async def execute(self, statement: Any, params: Any = None) -> None:
+        sql = str(statement)
+        if sql.startswith("LOAD DATA"):
+            with open(params["path"], "rb") as f:
+                self.loaded = f.read()
+        self.executions.append((sql, params))
+
+
+def make_rows(n: int) -> list[dict[str, Any]]:
+    return [{"k": f"key{i}", "v": i, "h": bytes([i])} for i in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_bulk_writer_executes_in_chunks() -> None:
+    conn = FakeConnection()
+    writer = BulkWriter(chunk_size=2)
+
+    await writer.write(conn, STMT, make_rows(5))  # type: ignore[arg-type]
+
+    assert [len(params) for _, params in conn.executions] == [2, 2, 1]
+    assert conn.executions[0][0] == (
+        "INSERT INTO `t` (`k`, `v`, `h`) VALUES (:k, :v, :h)"
+        " ON DUPLICATE KEY UPDATE `t`.`v` = `t`.`v` + VALUES(`v`)"
+    )
+    assert writer.stats[("t", "executemany")].rows == 5
+
+
+@pytest.mark.asyncio
+async def test_bulk_writer_loads_large_writes_through_staging_table() -> None:
+    conn = FakeConnection()
+    writer = BulkWriter(chunk_size=2, load_data_min_rows=3)
+
+    await writer.write(conn, STMT, make_rows(3))  # type: ignore[arg-type]
+
+    sqls = [sql for sql, _ in conn.executions]
+    assert sqls == [
+        "CREATE TEMPORARY TABLE IF NOT EXISTS `t_staging` SELECT `k`, `v`, `h` FROM `t` LIMIT 0",
+        "LOAD DATA LOCAL INFILE :path INTO TABLE `t_staging` CHARACTER SET utf8mb4 (`k`, `v`, @`h`) SET `h` = UNHEX(@`h`)",
+        "INSERT INTO `t` (`k`, `v`, `h`) SELECT `k`, `v`, `h` FROM `t_staging` ON DUPLICATE KEY UPDATE `t`.`v` = `t`.`v` + VALUES(`v`)",
+        "DROP TEMPORARY TABLE IF EXISTS `t_staging`",
+    ]
+    assert conn.loaded == b"key0\t0\t00\nkey1\t1\t01\nkey2\t2\t02\n"
+    assert not os.path.exists(conn.executions[1][1]["path"])
+    assert writer.stats[("t", "load_data")].rows == 3
+
+
+def test_format_tsv_escapes_values() -> None:
+    u = uuid.UUID("7a5ac670847648f98fc9d453591d145e")
+    row = {
+        "s": 'a\tb\nc\\d "é"',
+        "n": None,
+        "b": True,
+        "t": datetime.datetime(2026, 5, 15, 12, 34, 56),
+        "u": u,
+    }
+
+    assert format_tsv(list(row), [row]) == (
+        'a\\tb\\nc\\\\d "é"\t\\N\t1\t2026-05-15 12:34:56\t'
+        "7a5ac670-8476-48f9-8fc9-d453591d145e\n"
+    ).encode("utf-8")
@@ -0,0 +1,163 @@
+import datetime
+import gzip
+import json
+from typing import Iterator
+
+import brotli
+import pytest
+from fastapi.testclient import TestClient
+
+from ruyi_backend import app
+from ruyi_backend.cache import (
+    KEY_FRONTEND_DASHBOARD,
+    KEY_FRONTEND_DASHBOARD_PAYLOAD,
+    get_cache_store,
+)
+from ruyi_backend.components.dashboard_payload import DashboardPayload
+from ruyi_backend.schema.frontend import DashboardDataV1, DashboardEventDetailV1
+
+from .helpers import FakeCache
+
+DATA = DashboardDataV1(
+    last_updated=datetime.datetime(2026, 5, 15, 8, 30, tzinfo=datetime.timezone.utc),
+    downloads=DashboardEventDetailV1(total=1),
+    pm_downloads=DashboardEventDetailV1(total=2),
+    other_categories_downloads={},
+    downloads_by_categories_v1={"pkg": DashboardEventDetailV1(total=1)},
+    installs=DashboardEventDetailV1(total=3),
+    top_packages={},
+    top_commands={"ruyi install": DashboardEventDetailV1(total=4)},
+    github_org_stats=[],
+)
+
+
+@pytest.fixture(name="cache")
+def cache_fixture() -> Iterator[FakeCache]:
+    cache = FakeCache()
+    app.dependency_overrides[get_cache_store] = lambda: cache
+
+    yield cache
+
+    app.dependency_overrides.pop(get_cache_store, None)
+
+
+client = TestClient(app)
+
+
+def test_dashboard_serves_pre_serialized_payload(cache: FakeCache) -> None:
+    payload = DashboardPayload.from_data(DATA)
+    cache.values[KEY_FRONTEND_DASHBOARD_PAYLOAD] = payload.to_cache()
+
+    resp = client.get("/fe/dashboard", headers={"Accept-Encoding": "gzip"})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["etag"] == f'"{payload.digest}-gzip"'
+    assert resp.headers["last-modified"] == "Fri, 15 May 2026 08:30:00 GMT"
+    assert resp.headers["cache-control"] == "public, max-age=60"
+    assert DashboardDataV1.model_validate(resp.json()) == DATA
+
+    resp = client.post("/fe/dashboard", headers={"Accept-Encoding": "identity"})
+
+    assert resp.status_code == 200
+    assert "content-encoding" not in resp.headers
+    assert resp.headers["etag"] == f'"{payload.digest}"'
+    assert json.loads(resp.content) == json.loads(gzip.decompress(payload.gzip))
+
+
+def test_dashboard_serves_brotli_payload(cache: FakeCache) -> None:
+    payload = DashboardPayload.from_data(DATA)
+    assert payload.br is not None
+    cache.values[KEY_FRONTEND_DASHBOARD_PAYLOAD] = payload.to_cache()
+
+    resp = client.get(
+        "/fe/dashboard",
+        headers={"Accept-Encoding": "gzip, deflate, br"},
+    )
+
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "br"
+    assert resp.headers["etag"] == f'"{payload.digest}-br"'
+    assert DashboardDataV1.model_validate(resp.json()) == DATA
+
+    # check the raw bytes too, in case the client decoded them already
+    assert brotli.decompress(payload.br) == payload.identity
+
+
+def test_dashboard_answers_304_on_matching_etag(cache: FakeCache) -> None:
+    payload = DashboardPayload.from_data(DATA)
+    cache.values[KEY_FRONTEND_DASHBOARD_PAYLOAD] = payload.to_cache()
+
+    resp = client.get(
+        "/fe/dashboard",
+        headers={"If-None-Match": f'"other", W/"{payload.digest}-gzip"'},
+    )
+
+    assert resp.status_code == 304
+    assert not resp.content
+    assert resp.headers["etag"].startswith(f'"{payload.digest}')
+
+    resp = client.get("/fe/dashboard", headers={"If-None-Match": '"other"'})
+    assert resp.status_code == 200
+
+
+def test_dashboard_unavailable_until_refreshed(cache: FakeCache) -> None:
+    resp = client.get("/fe/dashboard")
+    assert resp.status_code == 503
+
+    cache.values[KEY_FRONTEND_DASHBOARD] = {"malformed": True}
+    resp = client.get("/fe/dashboard")
+    assert resp.status_code == 503
+
+
+def test_dashboard_serves_legacy_cache_until_refreshed(cache: FakeCache) -> None:
+    cache.values[KEY_FRONTEND_DASHBOARD] = DATA.model_dump()
+
+    resp = client.get("/fe/dashboard", headers={"Accept-Encoding": "gzip"})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert DashboardDataV1.model_validate(resp.json()) == DATA
+
+    # the refreshed payload takes precedence
+    refreshed = DATA.model_copy(update={"installs": DashboardEventDetailV1(total=5)})
+    cache.values[KEY_FRONTEND_DASHBOARD_PAYLOAD] = DashboardPayload.from_data(
+        refreshed,
+    ).to_cache()
+
+    resp = client.get("/fe/dashboard")
+
+    assert DashboardDataV1.model_validate(resp.json()) == refreshed
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "has_br", "expected"),
+    [
+        ("gzip, deflate, br", True, "br"),
+        ("gzip, deflate, br", False, "gzip"),
+        ("br;q=0, gzip", True, "gzip"),
+        ("*", True, "br"),
+        ("gzip;q=0", True, "identity"),
+        (None, True, "identity"),
+    ],
+)
+def test_dashboard_payload_negotiates_encoding(
+    accept_encoding: str | None,
+    has_br: bool,
+    expected: str,
+) -> None:
+    payload = DashboardPayload.from_data(DATA)._replace(
+        br=b"br" if has_br else None,
+    )
+
+    encoding, body = payload.negotiate(accept_encoding)
+
+    assert encoding == expected
+    assert (
+        body
+        == {
+            "br": payload.br,
+            "gzip": payload.gzip,
+            "identity": payload.identity,
+        }[encoding]
+    )
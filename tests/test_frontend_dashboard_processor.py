@@ -3,10 +3,22 @@ from typing import Any
 
 import pytest
 
-from ruyi_backend.cache import KEY_TELEMETRY_DATA_LAST_PROCESSED
+from ruyi_backend.cache import (
+    KEY_FRONTEND_DASHBOARD_PAYLOAD,
+    KEY_TELEMETRY_COMMAND_COUNTERS_BOOTSTRAPPED,
+    KEY_TELEMETRY_COMMAND_TOP,
+    KEY_TELEMETRY_DATA_LAST_PROCESSED,
+    KEY_TELEMETRY_INSTALL_COUNTERS_BOOTSTRAPPED,
+    KEY_TELEMETRY_INSTALLS,
+)
 from ruyi_backend.components.frontend_dashboard_processor import (
     crunch_and_cache_dashboard_numbers,
 )
+from ruyi_backend.components.dashboard_payload import DashboardPayload
+from ruyi_backend.components.telemetry_counters import active_installs_key
+from ruyi_backend.schema.frontend import DashboardDataV1, DashboardEventDetailV1
+
+from .helpers import FakeCache, FakeES
 
 
 class EmptyAsyncRows:
@@ -22,40 +34,36 @@ class FakeDB:
         self.scalar_statements: list[Any] = []
         self.stream_statements: list[Any] = []
 
-    async def scalar(self, statement: Any) -> int:
+    async def scalar(self, statement: Any) -> int | None:
+        if "download_stats_daily_mirror" in str(statement):
+            return None
         self.scalar_statements.append(statement)
         return 7
 
+    async def execute(self, statement: Any, *_: Any) -> list[Any]:
+        return []
+
+    async def commit(self) -> None:
+        pass
+
     async def stream(self, statement: Any) -> EmptyAsyncRows:
         self.stream_statements.append(statement)
         return EmptyAsyncRows()
 
 
-class FakeES:
-    async def count(self, **_: Any) -> dict[str, int]:
-        return {"count": 0}
-
-
-class FakeCache:
-    def __init__(self) -> None:
-        self.values: dict[str, Any] = {
-            KEY_TELEMETRY_DATA_LAST_PROCESSED: datetime.datetime(
-                2026, 5, 15, tzinfo=datetime.timezone.utc
-            ),
-        }
-
-    async def get(self, key: str) -> Any:
-        return self.values.get(key)
-
-    async def set(self, key: str, value: Any) -> None:
-        self.values[key] = value
+def make_cache() -> FakeCache:
+    cache = FakeCache()
+    cache.values[KEY_TELEMETRY_DATA_LAST_PROCESSED] = datetime.datetime(
+        2026, 5, 15, tzinfo=datetime.timezone.utc
+    )
+    return cache
 
 
 @pytest.mark.asyncio
 async def test_dashboard_counts_distinct_installation_report_uuids() -> None:
     db = FakeDB()
 
-    result = await crunch_and_cache_dashboard_numbers(db, FakeES(), FakeCache())
+    result = await crunch_and_cache_dashboard_numbers(db, FakeES(), make_cache())
 
     assert result.installs is not None
     assert result.installs.total == 7
@@ -63,3 +71,95 @@ async def test_dashboard_counts_distinct_installation_report_uuids() -> None:
     assert (
         "count(distinct(telemetry_installation_infos.report_uuid))" in install_count_sql
     )
+
+
+@pytest.mark.asyncio
+async def test_dashboard_counts_commands_by_group_by_in_db() -> None:
+    db = FakeDB()
+
+    await crunch_and_cache_dashboard_numbers(db, FakeES(), make_cache())
+
+    [stmt] = db.stream_statements
+    sql = str(stmt).lower()
+    assert "from telemetry_aggregated_events_monthly" in sql
+    assert "group by telemetry_aggregated_events_monthly.command_key" in sql
+    assert "params_kv_raw" not in sql
+
+
+@pytest.mark.asyncio
+async def test_dashboard_reads_top_commands_from_live_counters() -> None:
+    db = FakeDB()
+    cache = make_cache()
+    cache.values[KEY_TELEMETRY_COMMAND_TOP] = {"install": 5, "<bare>": 7}
+    cache.values[KEY_TELEMETRY_COMMAND_COUNTERS_BOOTSTRAPPED] = datetime.datetime(
+        2026, 5, 14, tzinfo=datetime.timezone.utc
+    )
+
+    result = await crunch_and_cache_dashboard_numbers(db, FakeES(), cache)
+
+    assert not db.stream_statements
+    assert result.top_commands == {
+        "ruyi": DashboardEventDetailV1(total=7),
+        "ruyi install": DashboardEventDetailV1(total=5),
+    }
+
+
+@pytest.mark.asyncio
+async def test_dashboard_ignores_live_command_counters_not_bootstrapped() -> None:
+    db = FakeDB()
+    cache = make_cache()
+    # only what was processed since deploying
+    cache.values[KEY_TELEMETRY_COMMAND_TOP] = {"install": 1}
+
+    result = await crunch_and_cache_dashboard_numbers(db, FakeES(), cache)
+
+    assert len(db.stream_statements) == 1
+    assert result.top_commands == {}
+
+
+@pytest.mark.asyncio
+async def test_dashboard_estimates_installs_from_live_hyperloglogs() -> None:
+    db = FakeDB()
+    cache = make_cache()
+    today = datetime.date.today()
+    cache.values[KEY_TELEMETRY_INSTALLS] = {"a", "b", "c", "d"}
+    for days_ago, seen in [(0, {"a"}), (6, {"a", "b"}), (20, {"c"}), (40, {"d"})]:
+        key = active_installs_key(today - datetime.timedelta(days=days_ago))
+        cache.values[key] = seen
+    cache.values[KEY_TELEMETRY_INSTALL_COUNTERS_BOOTSTRAPPED] = datetime.datetime(
+        2026, 5, 14, tzinfo=datetime.timezone.utc
+    )
+
+    result = await crunch_and_cache_dashboard_numbers(db, FakeES(), cache)
+
+    assert not db.scalar_statements
+    assert result.installs == DashboardEventDetailV1(total=4)
+    assert result.active_installs_7d == DashboardEventDetailV1(total=2)
+    assert result.active_installs_30d == DashboardEventDetailV1(total=3)
+
+
+@pytest.mark.asyncio
+async def test_dashboard_ignores_live_hyperloglogs_not_bootstrapped() -> None:
+    db = FakeDB()
+    cache = make_cache()
+    # only what was processed since deploying
+    cache.values[KEY_TELEMETRY_INSTALLS] = {"a"}
+    cache.values[active_installs_key(datetime.date.today())] = {"a"}
+
+    result = await crunch_and_cache_dashboard_numbers(db, FakeES(), cache)
+
+    assert len(db.scalar_statements) == 1
+    assert result.installs == DashboardEventDetailV1(total=7)
+    assert result.active_installs_7d is None
+
+
+@pytest.mark.asyncio
+async def test_dashboard_caches_pre_serialized_payload() -> None:
+    cache = make_cache()
+
+    result = await crunch_and_cache_dashboard_numbers(FakeDB(), FakeES(), cache)
+
+    payload = DashboardPayload.from_cache(cache.values[KEY_FRONTEND_DASHBOARD_PAYLOAD])
+    assert payload is not None
+    assert DashboardDataV1.model_validate_json(payload.identity) == result
+    assert payload.last_modified == "Fri, 15 May 2026 00:00:00 GMT"
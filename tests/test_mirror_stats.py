@@ -0,0 +1,98 @@
+import datetime
+from typing import Any
+
+import pytest
+
+from ruyi_backend.components.mirror_stats import (
+    MIRROR_CATEGORY_PATHS,
+    MIRROR_STATS_DATE_START,
+    mirror_download_totals,
+)
+
+from .helpers import FakeES
+
+
+def _bucket(date: str, **counts: int) -> dict[str, Any]:
+    return {
+        "key_as_string": date,
+        "categories": {
+            "buckets": {
+                category: {"doc_count": counts.get(category, 0)}
+                for category in MIRROR_CATEGORY_PATHS
+            },
+        },
+    }
+
+
+class FakeConn:
+    def __init__(self) -> None:
+        self.rows: dict[tuple[str, datetime.datetime], int] = {}
+        self.commits = 0
+
+    async def scalar(self, statement: Any) -> datetime.datetime | None:
+        assert "max(download_stats_daily_mirror.date)" in str(statement).lower()
+        return max((date for _, date in self.rows), default=None)
+
+    async def execute(
+        self, statement: Any, params: list[dict[str, Any]] | None = None
+    ) -> list[tuple[str, int]]:
+        sql = str(statement).lower()
+        if sql.startswith("insert ignore"):
+            for p in params or []:
+                self.rows.setdefault((p["category"], p["date"]), p["count"])
+            return []
+
+        assert "group by download_stats_daily_mirror.category" in sql
+        totals: dict[str, int] = {}
+        for (category, _), count in self.rows.items():
+            totals[category] = totals.get(category, 0) + count
+        return list(totals.items())
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+
+def _gte(search: dict[str, Any]) -> str:
+    [f] = search["query"]["bool"]["filter"]
+    return str(f["range"]["@timestamp"]["gte"])
+
+
+@pytest.mark.asyncio
+async def test_mirror_download_totals_persists_closed_days_only() -> None:
+    conn = FakeConn()
+    es = FakeES(
+        [
+            _bucket("2026-05-13", dist=1),
+            _bucket("2026-05-14", dist=2, ruyi=3),
+            _bucket("2026-05-15", dist=4),
+        ]
+    )
+    # 2026-05-15 00:30 in UTC+8, too soon for the 14th to be closed
+    now = datetime.datetime(2026, 5, 14, 16, 30, tzinfo=datetime.timezone.utc)
+
+    totals = await mirror_download_totals(conn, es, now)  # type: ignore[arg-type]
+
+    assert _gte(es.searches[0]) == f"{MIRROR_STATS_DATE_START}T00:00:00+08:00"
+    assert totals["dist"] == 7
+    assert totals["ruyi"] == 3
+    assert totals["humans"] == 0
+    assert set(totals) == set(MIRROR_CATEGORY_PATHS)
+    assert {date for _, date in conn.rows} == {datetime.datetime(2026, 5, 13)}
+
+
+@pytest.mark.asyncio
+async def test_mirror_download_totals_queries_only_days_not_persisted() -> None:
+    conn = FakeConn()
+    for category in MIRROR_CATEGORY_PATHS:
+        conn.rows[(category, datetime.datetime(2026, 5, 13))] = 10
+    es = FakeES([_bucket("2026-05-14", dist=2), _bucket("2026-05-15", dist=4)])
+    now = datetime.datetime(2026, 5, 15, 12, tzinfo=datetime.timezone.utc)
+
+    totals = await mirror_download_totals(conn, es, now)  # type: ignore[arg-type]
+
+    assert _gte(es.searches[0]) == "2026-05-14T00:00:00+08:00"
+    assert totals["dist"] == 16
+    assert totals["ruyi"] == 10
+    assert conn.rows[("dist", datetime.datetime(2026, 5, 14))] == 2
+    assert ("dist", datetime.datetime(2026, 5, 15)) not in conn.rows
+    assert conn.commits == 1
@@ -1,78 +1,36 @@
+import gzip
 import json
 from collections.abc import Iterator
-from types import TracebackType
+from pathlib import Path
 from typing import Any
 
 import pytest
 from fastapi.testclient import TestClient
+import zstandard
 
 from ruyi_backend import app
+from ruyi_backend.components.telemetry_admission import (
+    AdmissionController,
+    get_telemetry_admission,
+)
+from ruyi_backend.components.telemetry_dedup import (
+    SetNonceFilter,
+    get_telemetry_nonce_filter,
+)
+from ruyi_backend.components.telemetry_ingest import (
+    TelemetryWriteBuffer,
+    get_telemetry_write_buffer,
+)
+from ruyi_backend.components.telemetry_spool import TelemetrySpool, get_telemetry_spool
+from ruyi_backend.components.telemetry_stream import get_telemetry_upload_stream
+from ruyi_backend.config.env import (
+    TelemetryAdmissionConfig,
+    TelemetryNonceDedupConfig,
+)
+from ruyi_backend.db.conn import PoolWaitTracker
 from ruyi_backend.db.conn import get_main_db
-from ruyi_backend.schema.client_telemetry import UploadPayload
-
-
-UPLOAD_PAYLOAD: dict[str, Any] = {
-    "fmt": 1,
-    "nonce": "f051065f71d94b5bb7b336ba0b782983",
-    "ruyi_version": "0.44.0-beta.20251219",
-    "events": [
-        {
-            "time_bucket": "202604031223",
-            "kind": "cli:invocation-v1",
-            "params": [["key", "version"]],
-            "count": 1,
-        },
-        {
-            "time_bucket": "202605112234",
-            "kind": "cli:invocation-v1",
-            "params": [["key", "<bare>"]],
-            "count": 1,
-        },
-    ],
-    "installation": {
-        "v": 1,
-        "report_uuid": "7a5ac670847648f98fc9d453591d145e",
-        "arch": "x86_64",
-        "ci": "maybe-not",
-        "libc_name": "glibc",
-        "libc_ver": "2.41",
-        "os": "linux",
-        "os_release_id": "gentoo",
-        "os_release_version_id": "2.17",
-        "shell": "zsh",
-    },
-}
-
-
-class FakeConnection:
-    def __init__(self) -> None:
-        self.executions: list[tuple[str, dict[str, Any]]] = []
-        self.committed = False
-
-    async def __aenter__(self) -> "FakeConnection":
-        return self
-
-    async def __aexit__(
-        self,
-        exc_type: type[BaseException] | None,
-        exc_value: BaseException | None,
-        traceback: TracebackType | None,
-    ) -> None:
-        return None
-
-    async def execute(self, statement: Any, params: dict[str, Any]) -> None:
-        self.executions.append((str(statement), params))
-
-    async def commit(self) -> None:
-        self.committed = True
-
-
-class FakeEngine:
-    def __init__(self) -> None:
-        self.connection = FakeConnection()
 
-    def connect(self) -> FakeConnection:
-        return self.connection
+from .helpers import UPLOAD_PAYLOAD, FakeCache, FakeEngine, make_nonce
 
 
 @pytest.fixture(name="fake_db")
@@ -96,15 +54,310 @@ def test_telemetry_upload_accepts_json_object_and_json_string(
     resp = client.post("/telemetry/pm/upload-v1", json=request_json)
 
     assert resp.status_code == 204
-    assert fake_db.connection.committed is True
-    assert len(fake_db.connection.executions) == 3
-    assert fake_db.connection.executions[0][1] == {
-        "version": UPLOAD_PAYLOAD["ruyi_version"],
-    }
-
-    raw_upload_params = fake_db.connection.executions[-1][1]
-    assert raw_upload_params["nonce"] == UPLOAD_PAYLOAD["nonce"]
-    expected_raw_events = UploadPayload.model_validate(UPLOAD_PAYLOAD).model_dump(
-        mode="json",
+    [executions] = fake_db.commits
+    assert len(executions) == 3
+    version_counts = executions[0][1]
+    assert len(version_counts) == 1
+    assert version_counts[0]["version"] == UPLOAD_PAYLOAD["ruyi_version"]
+    assert version_counts[0]["count"] == 1
+    assert version_counts[0]["bucket"].minute == 0
+
+    # the payload is stored as-is, without round-tripping through the model
+    raw_upload_params = executions[-1][1]
+    assert len(raw_upload_params) == 1
+    assert raw_upload_params[0]["nonce"] == UPLOAD_PAYLOAD["nonce"]
+    assert json.loads(raw_upload_params[0]["raw_events"]) == UPLOAD_PAYLOAD
+
+    # and so is the installation info
+    ins_info_params = executions[1][1]
+    assert len(ins_info_params) == 1
+    assert ins_info_params[0]["raw"] in raw_upload_params[0]["raw_events"]
+    assert json.loads(ins_info_params[0]["raw"]) == UPLOAD_PAYLOAD["installation"]
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"fmt": 2},
+        {"nonce": "not-a-uuid"},
+        {"installation": {"report_uuid": "not-a-uuid"}},
+        {"events": ["not-an-object"]},
+    ],
+)
+def test_telemetry_upload_rejects_malformed_envelope(
+    overrides: dict[str, Any],
+    fake_db: FakeEngine,
+) -> None:
+    resp = client.post("/telemetry/pm/upload-v1", json=UPLOAD_PAYLOAD | overrides)
+
+    assert resp.status_code == 422
+    assert fake_db.commits == []
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"installation": UPLOAD_PAYLOAD["installation"] | {"v": 0}},
+        {"installation": {"report_uuid": "7a5ac670847648f98fc9d453591d145e"}},
+        {"events": [{"kind": "cli:invocation-v1", "params": [], "count": 1}]},
+    ],
+)
+def test_telemetry_upload_leaves_full_validation_to_processing(
+    overrides: dict[str, Any],
+    fake_db: FakeEngine,
+) -> None:
+    resp = client.post("/telemetry/pm/upload-v1", json=UPLOAD_PAYLOAD | overrides)
+
+    assert resp.status_code == 204
+    assert len(fake_db.commits) == 1
+
+
+def test_telemetry_upload_rejects_too_many_events(fake_db: FakeEngine) -> None:
+    events = UPLOAD_PAYLOAD["events"] * 10001
+    resp = client.post(
+        "/telemetry/pm/upload-v1",
+        json=UPLOAD_PAYLOAD | {"events": events},
+    )
+
+    assert resp.status_code == 413
+    assert fake_db.commits == []
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor().compress(data)
+
+
+_UPLOAD_BODY = json.dumps(UPLOAD_PAYLOAD).encode()
+
+
+@pytest.mark.parametrize(
+    ("body", "encoding"),
+    [
+        (gzip.compress(_UPLOAD_BODY), "gzip"),
+        (_zstd_compress(_UPLOAD_BODY), "zstd"),
+        # concatenated zstd frames
+        (
+            _zstd_compress(_UPLOAD_BODY[:100]) + _zstd_compress(_UPLOAD_BODY[100:]),
+            "zstd",
+        ),
+    ],
+)
+def test_telemetry_upload_accepts_compressed_body(
+    body: bytes,
+    encoding: str,
+    fake_db: FakeEngine,
+) -> None:
+    resp = client.post(
+        "/telemetry/pm/upload-v1",
+        content=body,
+        headers={"Content-Type": "application/json", "Content-Encoding": encoding},
+    )
+
+    assert resp.status_code == 204
+    raw_upload_params = fake_db.commits[0][-1][1]
+    assert json.loads(raw_upload_params[0]["raw_events"]) == UPLOAD_PAYLOAD
+
+
+@pytest.mark.parametrize(
+    ("body", "encoding", "status_code"),
+    [
+        # decompresses way beyond the limit
+        (gzip.compress(b" " * (64 * 1024 * 1024)), "gzip", 413),
+        (gzip.compress(_UPLOAD_BODY)[:-10], "gzip", 400),
+        (_zstd_compress(b" " * (64 * 1024 * 1024)), "zstd", 413),
+        (_zstd_compress(_UPLOAD_BODY)[:-10], "zstd", 400),
+        (b"not zstd at all", "zstd", 400),
+        (_UPLOAD_BODY, "br", 415),
+    ],
+)
+def test_telemetry_upload_rejects_bad_encoded_body(
+    body: bytes,
+    encoding: str,
+    status_code: int,
+    fake_db: FakeEngine,
+) -> None:
+    resp = client.post(
+        "/telemetry/pm/upload-v1",
+        content=body,
+        headers={"Content-Type": "application/json", "Content-Encoding": encoding},
+    )
+
+    assert resp.status_code == status_code
+    assert fake_db.commits == []
+
+
+def test_telemetry_batch_upload_reports_status_per_upload(fake_db: FakeEngine) -> None:
+    fake_db.select_rows = [("00000000-0000-0000-0000-000000000002",)]
+    lines = [json.dumps(UPLOAD_PAYLOAD | {"nonce": f"{i:032x}"}) for i in (1, 2, 1, 3)]
+    lines.insert(2, json.dumps(UPLOAD_PAYLOAD | {"fmt": 2}))
+    body = "\n".join(lines) + "\n\n"
+
+    resp = client.post(
+        "/telemetry/pm/upload-batch-v1",
+        content=gzip.compress(body.encode()),
+        headers={
+            "Content-Type": "application/x-ndjson",
+            "Content-Encoding": "gzip",
+        },
+    )
+
+    assert resp.status_code == 200
+    result = resp.json()
+    assert [r["status"] for r in result["results"]] == [
+        "accepted",
+        "duplicate",
+        "invalid",
+        "duplicate",
+        "accepted",
+    ]
+    assert (result["accepted"], result["duplicate"], result["invalid"]) == (2, 2, 1)
+
+    # one multi-row statement per table, with the new uploads only
+    [executions] = fake_db.commits
+    assert len(executions) == 3
+    raw_upload_params = executions[-1][1]
+    assert [p["nonce"] for p in raw_upload_params] == [f"{i:032x}" for i in (1, 3)]
+    assert executions[0][1][0]["count"] == 2
+
+
+def test_telemetry_batch_upload_goes_through_nonce_filter_and_ingest_mode(
+    fake_db: FakeEngine,
+) -> None:
+    buf = TelemetryWriteBuffer(
+        fake_db,  # type: ignore[arg-type]
+        flush_interval=3600,
+        max_rows=100,
+        max_pending_rows=100,
+    )
+    nonce_filter = SetNonceFilter(
+        FakeCache(),  # type: ignore[arg-type]
+        TelemetryNonceDedupConfig(mode="set"),
+    )
+    app.dependency_overrides[get_telemetry_write_buffer] = lambda: buf
+    app.dependency_overrides[get_telemetry_nonce_filter] = lambda: nonce_filter
+    try:
+        resp = client.post(
+            "/telemetry/pm/upload-v1",
+            json=UPLOAD_PAYLOAD | {"nonce": make_nonce(2)},
+        )
+        assert resp.status_code == 204
+
+        lines = [
+            json.dumps(UPLOAD_PAYLOAD | {"nonce": make_nonce(i)}) for i in (1, 2, 1)
+        ]
+        resp = client.post(
+            "/telemetry/pm/upload-batch-v1",
+            content="\n".join(lines).encode(),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+    finally:
+        app.dependency_overrides.pop(get_telemetry_write_buffer, None)
+        app.dependency_overrides.pop(get_telemetry_nonce_filter, None)
+
+    assert resp.status_code == 200
+    result = resp.json()
+    assert [r["status"] for r in result["results"]] == [
+        "accepted",
+        "duplicate",
+        "duplicate",
+    ]
+    assert (result["accepted"], result["duplicate"], result["invalid"]) == (1, 2, 0)
+    assert buf.pending_rows == 2
+    assert fake_db.commits == []
+
+
+def test_telemetry_batch_upload_rejects_too_many_uploads(fake_db: FakeEngine) -> None:
+    body = "\n".join([json.dumps(UPLOAD_PAYLOAD)] * 1001)
+    resp = client.post(
+        "/telemetry/pm/upload-batch-v1",
+        content=body.encode(),
+        headers={"Content-Type": "application/x-ndjson"},
     )
-    assert json.loads(raw_upload_params["raw_events"]) == expected_raw_events
+
+    assert resp.status_code == 413
+    assert fake_db.commits == []
+
+
+def test_telemetry_admission_sheds_with_retry_after(fake_db: FakeEngine) -> None:
+    pool_wait = PoolWaitTracker(half_life=3600)
+    ctl = AdmissionController(
+        TelemetryAdmissionConfig(max_in_flight=1, max_pool_wait_ms=100),
+        pool_wait,
+    )
+    app.dependency_overrides[get_telemetry_admission] = lambda: ctl
+    try:
+        assert (
+            client.post("/telemetry/pm/upload-v1", json=UPLOAD_PAYLOAD).status_code
+            == 204
+        )
+
+        ctl.admit()
+        resp = client.post("/telemetry/pm/upload-v1", json=UPLOAD_PAYLOAD)
+        assert resp.status_code == 429
+        assert resp.headers["Retry-After"] == "30"
+        ctl.release()
+
+        pool_wait.observe(1.0)
+        resp = client.post("/telemetry/pm/upload-v1", json=UPLOAD_PAYLOAD)
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "30"
+    finally:
+        app.dependency_overrides.pop(get_telemetry_admission, None)
+
+    assert ctl.stats.in_flight == 0
+    # including the request held in flight by the test itself
+    assert ctl.stats.accepted == 2
+    assert ctl.stats.shed_in_flight == 1
+    assert ctl.stats.shed_pool_wait == 1
+    assert ctl.stats.pool_wait_ms == pytest.approx(500, rel=0.01)
+
+
+def test_telemetry_upload_is_spooled_when_db_fails(
+    fake_db: FakeEngine,
+    tmp_path: Path,
+) -> None:
+    fake_db.fail = True
+    spool = TelemetrySpool(str(tmp_path), segment_max_bytes=1 << 20, fsync_interval=0)
+    spool.start()
+
+    app.dependency_overrides[get_telemetry_spool] = lambda: spool
+    try:
+        resp = client.post("/telemetry/pm/upload-v1", json=UPLOAD_PAYLOAD)
+    finally:
+        app.dependency_overrides.pop(get_telemetry_spool, None)
+
+    assert resp.status_code == 204
+    assert spool.stats.appended == 1
+    assert spool.stats.segments == 1
+
+
+class FullStreamCache:
+    async def xlen(self, name: str) -> int:
+        return 1000000
+
+
+def test_telemetry_upload_sheds_when_stream_is_full(
+    fake_db: FakeEngine,
+    tmp_path: Path,
+) -> None:
+    app.dependency_overrides[get_telemetry_upload_stream] = FullStreamCache
+    try:
+        resp = client.post("/telemetry/pm/upload-v1", json=UPLOAD_PAYLOAD)
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "30"
+
+        spool = TelemetrySpool(
+            str(tmp_path),
+            segment_max_bytes=1 << 20,
+            fsync_interval=0,
+        )
+        spool.start()
+        app.dependency_overrides[get_telemetry_spool] = lambda: spool
+        resp = client.post("/telemetry/pm/upload-v1", json=UPLOAD_PAYLOAD)
+        assert resp.status_code == 204
+        assert spool.stats.appended == 1
+    finally:
+        app.dependency_overrides.pop(get_telemetry_upload_stream, None)
+        app.dependency_overrides.pop(get_telemetry_spool, None)
+
+    assert fake_db.commits == []
@@ -0,0 +1,200 @@
+import datetime
+import gzip
+import json
+import os
+from typing import Any
+
+import pytest
+
+from ruyi_backend.components.telemetry_archive import (
+    SQL_DELETE_RAW_UPLOADS,
+    SQL_SELECT_ARCHIVABLE_RAW_UPLOADS,
+    INDEX_SUFFIX,
+    SEGMENT_SUFFIX,
+    ArchivedUpload,
+    TelemetryArchiver,
+    iter_archive,
+    list_segments,
+    read_segment,
+    segment_dir,
+)
+from ruyi_backend.components.telemetry_processor import SQL_SELECT_PROCESSING_WATERMARK
+from ruyi_backend.config.env import TelemetryArchiveConfig
+
+from .helpers import UPLOAD_PAYLOAD, FakeConnection, FakeResult
+
+NOW = datetime.datetime(2026, 8, 1, 12)
+
+
+class ArchiveConnection(FakeConnection):
+    def __init__(self, engine: "ArchiveEngine") -> None:
+        super().__init__(engine)
+        self.pending: list[int] = []
+
+    async def execute(self, statement: Any, params: Any = None) -> FakeResult:
+        engine = self.engine
+        if statement is SQL_SELECT_PROCESSING_WATERMARK:
+            return FakeResult([(engine.watermark,)])
+        if statement is SQL_SELECT_ARCHIVABLE_RAW_UPLOADS:
+            rows = [
+                row
+                for row in engine.rows
+                if params["after_id"] < row[0] <= params["watermark"]
+                and row[2] < params["before"]
+            ]
+            return FakeResult(rows[: params["limit"]])
+        if statement is SQL_DELETE_RAW_UPLOADS:
+            if engine.fail_deletes or engine.fail_delete_id in params["ids"]:
+                raise RuntimeError("DB is down")
+            engine.delete_batches.append(len(params["ids"]))
+            self.pending.extend(params["ids"])
+            return FakeResult()
+        raise AssertionError(f"unexpected statement {statement}")
+
+    async def commit(self) -> None:
+        ids = set(self.pending)
+        self.engine.rows = [row for row in self.engine.rows if row[0] not in ids]
+        self.pending = []
+
+    async def rollback(self) -> None:
+        self.pending = []
+
+
+class ArchiveEngine:
+    def __init__(self, days_ago: list[int], watermark: int) -> None:
+        self.rows = [
+            (
+                i + 1,
+                f"{i:032x}",
+                NOW - datetime.timedelta(days=d, hours=i),
+                json.dumps(UPLOAD_PAYLOAD | {"nonce": f"{i:032x}"}),
+            )
+            for i, d in enumerate(days_ago)
+        ]
+        self.watermark = watermark
+        self.delete_batches: list[int] = []
+        self.fail_deletes = False
+        self.fail_delete_id: int | None = None
+
+    def connect(self) -> ArchiveConnection:
+        return ArchiveConnection(self)
+
+
+def make_cfg(directory: str) -> TelemetryArchiveConfig:
+    return TelemetryArchiveConfig(
+        directory=directory,
+        retention_days=30,
+        batch_size=3,
+        delete_batch_size=2,
+    )
+
+
+@pytest.mark.asyncio
+async def test_archiver_moves_old_processed_uploads_to_segments(tmp_path: str) -> None:
+    # the last two are recent, the one before has not been processed yet
+    engine = ArchiveEngine([40, 40, 40, 35, 35, 31, 1, 1], watermark=5)
+    archived = engine.rows[:5]
+    archiver = TelemetryArchiver(engine, make_cfg(str(tmp_path)))  # type: ignore[arg-type]
+
+    assert await archiver.run(NOW) == 5
+    assert [row[0] for row in engine.rows] == [6, 7, 8]
+    assert engine.delete_batches == [2, 1, 2]
+
+    segments = list_segments(str(tmp_path))
+    dates = {os.path.relpath(os.path.dirname(p), tmp_path) for p in segments}
+    assert dates == {
+        os.path.join(f"{d:%Y}", f"{d:%m}", f"{d:%d}")
+        for d in {row[2].date() for row in archived}
+    }
+    assert list(iter_archive(str(tmp_path))) == [
+        ArchivedUpload(*row)
+        for row in sorted(archived, key=lambda r: (r[2].date(), r[0]))
+    ]
+
+    # nothing more to do
+    assert await archiver.run(NOW) == 0
+
+
+@pytest.mark.asyncio
+async def test_archive_segments_round_trip(tmp_path: str) -> None:
+    engine = ArchiveEngine([40] * 5, watermark=5)
+    archived = [ArchivedUpload(*row) for row in engine.rows]
+
+    assert await TelemetryArchiver(engine, make_cfg(str(tmp_path))).run(NOW) == 5  # type: ignore[arg-type]
+
+    segments = list_segments(str(tmp_path))
+    assert segments and all(p.endswith(".zst") for p in segments)
+    for path in segments:
+        with open(path, "rb") as f:
+            assert f.read(4) == b"\x28\xb5\x2f\xfd"
+    assert sorted(iter_archive(str(tmp_path))) == sorted(archived)
+
+
+def test_archive_reader_reads_gzip_segments(tmp_path: str) -> None:
+    uploads = [
+        ArchivedUpload(*row) for row in ArchiveEngine([40] * 3, watermark=3).rows
+    ]
+    path = os.path.join(
+        segment_dir(str(tmp_path), datetime.date(2026, 6, 1)),
+        f"{1:020d}{SEGMENT_SUFFIX}.gz",
+    )
+    os.makedirs(os.path.dirname(path))
+    offset = 0
+    with open(path, "wb") as f, open(path + INDEX_SUFFIX, "wb") as idx:
+        for u in uploads:
+            frame = gzip.compress(u.to_json_line())
+            f.write(frame)
+            entry = [u.id, u.id, offset, len(frame), 1]
+            idx.write(json.dumps(entry).encode("utf-8") + b"\n")
+            offset += len(frame)
+
+    assert list(iter_archive(str(tmp_path))) == uploads
+    assert [u.id for u in read_segment(path, min_id=2)] == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_archive_reader_seeks_and_skips_duplicates(tmp_path: str) -> None:
+    engine = ArchiveEngine([40] * 6, watermark=6)
+    engine.rows = [
+        (id, nonce, datetime.datetime(2026, 6, 1), raw)
+        for id, nonce, _, raw in engine.rows
+    ]
+    engine.fail_deletes = True
+    cfg = make_cfg(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        await TelemetryArchiver(engine, cfg).run(NOW)  # type: ignore[arg-type]
+
+    # archived again after a crash before deleting
+    engine.fail_deletes = False
+    assert await TelemetryArchiver(engine, cfg).run(NOW) == 6  # type: ignore[arg-type]
+
+    [segment] = list_segments(str(tmp_path))
+    with open(segment + INDEX_SUFFIX, "rb") as f:
+        assert len(f.readlines()) == 3
+    assert [u.id for u in read_segment(segment)] == [1, 2, 3, 1, 2, 3, 4, 5, 6]
+    assert [u.id for u in read_segment(segment, min_id=4)] == [4, 5, 6]
+    assert [u.id for u in iter_archive(str(tmp_path))] == [1, 2, 3, 4, 5, 6]
+    assert not list(iter_archive(str(tmp_path), date_end=datetime.date(2026, 6, 1)))
+
+
+@pytest.mark.asyncio
+async def test_archive_reader_skips_duplicates_in_later_segments(tmp_path: str) -> None:
+    engine = ArchiveEngine([40] * 6, watermark=6)
+    engine.rows = [
+        (id, nonce, datetime.datetime(2026, 6, 1), raw)
+        for id, nonce, _, raw in engine.rows
+    ]
+    # the crash leaves only the last upload of the second batch undeleted
+    engine.fail_delete_id = 6
+    cfg = make_cfg(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        await TelemetryArchiver(engine, cfg).run(NOW)  # type: ignore[arg-type]
+
+    engine.fail_delete_id = None
+    assert await TelemetryArchiver(engine, cfg).run(NOW) == 1  # type: ignore[arg-type]
+
+    # archived again into a new segment of the same date
+    first, second = list_segments(str(tmp_path))
+    assert [u.id for u in read_segment(first)] == [1, 2, 3, 4, 5, 6]
+    assert [u.id for u in read_segment(second)] == [6]
+    assert [u.id for u in iter_archive(str(tmp_path))] == [1, 2, 3, 4, 5, 6]
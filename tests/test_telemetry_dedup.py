@@ -0,0 +1,81 @@
+from typing import Any
+
+import pytest
+
+from ruyi_backend.components.telemetry_dedup import (
+    BloomNonceFilter,
+    NonceFilter,
+    SetNonceFilter,
+)
+from ruyi_backend.config.env import TelemetryNonceDedupConfig
+
+from .helpers import FakeCache, FakeEngine, make_nonce
+
+
+ENGINE: Any = FakeEngine()
+
+
+@pytest.mark.asyncio
+async def test_set_nonce_filter() -> None:
+    f = SetNonceFilter(FakeCache(), TelemetryNonceDedupConfig(mode="set"))  # type: ignore[arg-type]
+    nonce = make_nonce(1)
+
+    assert await f.check(nonce, ENGINE) is False
+    await f.commit(nonce)
+    assert await f.check(nonce, ENGINE) is True
+    # differently formatted nonces of the same UUID are duplicates too
+    assert await f.check("00000000-0000-0000-0000-000000000001", ENGINE) is True
+
+    # a nonce whose upload failed to get accepted is forgotten
+    other = make_nonce(2)
+    assert await f.check(other, ENGINE) is False
+    await f.rollback(other)
+    assert await f.check(other, ENGINE) is False
+
+    assert (f.stats.checks, f.stats.hits, f.stats.misses) == (5, 2, 3)
+
+
+@pytest.mark.asyncio
+async def test_bloom_nonce_filter() -> None:
+    f = BloomNonceFilter(
+        FakeCache(),  # type: ignore[arg-type]
+        TelemetryNonceDedupConfig(mode="bloom", bloom_bits=1 << 16),
+    )
+
+    for i in range(100):
+        assert await f.check(make_nonce(i), ENGINE) is False
+        await f.commit(make_nonce(i))
+
+    for i in range(100):
+        assert await f.check(make_nonce(i), ENGINE) is True
+
+    assert f.stats.hits == 100
+    assert f.stats.misses == 100
+
+
+@pytest.mark.asyncio
+async def test_nonce_filter_counts_false_positives_and_fails_open() -> None:
+    cache = FakeCache()
+    f = SetNonceFilter(
+        cache,  # type: ignore[arg-type]
+        TelemetryNonceDedupConfig(mode="set", verify_sample_rate=1.0),
+    )
+    nonce = make_nonce(1)
+    await f.check(nonce, ENGINE)
+
+    # the nonce is remembered, but the DB does not have it
+    assert await f.check(nonce, ENGINE) is False
+    assert f.stats.verified_hits == 1
+    assert f.stats.false_positives == 1
+
+    cache.broken = True
+    assert await f.check(make_nonce(2), ENGINE) is False
+    assert f.stats.errors == 1
+
+
+def test_nonce_filter_without_lookup_cannot_be_created() -> None:
+    class IncompleteNonceFilter(NonceFilter):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteNonceFilter(FakeCache(), TelemetryNonceDedupConfig(mode="set"))  # type: ignore[abstract, arg-type]
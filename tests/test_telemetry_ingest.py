@@ -0,0 +1,243 @@
+import asyncio
+import datetime
+import uuid
+
+import pytest
+
+from ruyi_backend.components.telemetry_dedup import NonceFilter
+from ruyi_backend.components.telemetry_ingest import (
+    TelemetryWriteBuffer,
+    WriteBufferFullError,
+    persist_upload_records,
+    raw_json_member,
+    write_upload_records,
+)
+from ruyi_backend.components.telemetry_installation_cache import (
+    InstallationInfoCache,
+    LRUInstallationInfoCache,
+)
+from ruyi_backend.config.env import (
+    TelemetryInstallationCacheConfig,
+    TelemetryNonceDedupConfig,
+)
+
+from .helpers import UPLOAD_PAYLOAD, FakeCache, FakeEngine, make_nonce, make_record
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_flushes_batches_as_multi_row_statements() -> None:
+    engine = FakeEngine()
+    buf = TelemetryWriteBuffer(
+        engine,  # type: ignore[arg-type]
+        flush_interval=3600,
+        max_rows=100,
+        max_pending_rows=100,
+    )
+    for i in range(3):
+        buf.put(make_record(make_nonce(i)))
+
+    assert await buf.flush() == 3
+    assert len(engine.commits) == 1
+    versions, ins_infos, raw_uploads = engine.commits[0]
+    # all three uploads are counted in one row
+    assert [p["count"] for p in versions[1]] == [3]
+    # all three uploads share the same report_uuid
+    assert len(ins_infos[1]) == 1
+    assert [p["nonce"] for p in raw_uploads[1]] == [make_nonce(i) for i in range(3)]
+
+    assert buf.stats.flushes == 1
+    assert buf.stats.rows_flushed == 3
+    assert buf.stats.last_flush_size == 3
+    assert buf.stats.pending_rows == 0
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_flushes_when_max_rows_reached() -> None:
+    engine = FakeEngine()
+    buf = TelemetryWriteBuffer(
+        engine,  # type: ignore[arg-type]
+        flush_interval=3600,
+        max_rows=2,
+        max_pending_rows=10,
+    )
+    buf.start()
+    buf.put(make_record(make_nonce(1)))
+    buf.put(make_record(make_nonce(2)))
+    for _ in range(100):
+        if engine.commits:
+            break
+        await asyncio.sleep(0.01)
+    await buf.close()
+
+    assert len(engine.commits) == 1
+    assert buf.stats.rows_flushed == 2
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_requeues_on_failure_and_drains_on_close() -> None:
+    engine = FakeEngine()
+    buf = TelemetryWriteBuffer(
+        engine,  # type: ignore[arg-type]
+        flush_interval=3600,
+        max_rows=2,
+        max_pending_rows=2,
+    )
+    buf.put(make_record(make_nonce(1)))
+    buf.put(make_record(make_nonce(2)))
+    with pytest.raises(WriteBufferFullError):
+        buf.put(make_record(make_nonce(3)))
+    assert buf.stats.rows_rejected == 1
+
+    engine.fail = True
+    with pytest.raises(RuntimeError):
+        await buf.flush()
+    assert buf.pending_rows == 2
+    assert buf.stats.failed_flushes == 1
+
+    engine.fail = False
+    await buf.close()
+    assert buf.pending_rows == 0
+    assert buf.stats.rows_flushed == 2
+
+
+class RecordingNonceFilter(NonceFilter):
+    def __init__(self) -> None:
+        super().__init__(FakeCache(), TelemetryNonceDedupConfig())  # type: ignore[arg-type]
+        self.committed: list[str] = []
+        self.rolled_back: list[str] = []
+
+    async def _lookup(self, nonce: str) -> bool:
+        return False
+
+    async def _commit(self, nonce: str) -> None:
+        self.committed.append(nonce)
+
+    async def _rollback(self, nonce: str) -> None:
+        self.rolled_back.append(nonce)
+
+
+@pytest.mark.asyncio
+async def test_write_buffer_settles_nonces_once_flushed_or_lost() -> None:
+    engine = FakeEngine()
+    nonce_filter = RecordingNonceFilter()
+    buf = TelemetryWriteBuffer(
+        engine,  # type: ignore[arg-type]
+        flush_interval=3600,
+        max_rows=10,
+        max_pending_rows=10,
+        nonce_filter=nonce_filter,
+    )
+    buf.put(make_record(make_nonce(1)))
+    assert nonce_filter.committed == []
+
+    await buf.flush()
+    assert nonce_filter.committed == [make_nonce(1)]
+
+    # not committed while failing to flush, and rolled back once lost
+    engine.fail = True
+    buf.put(make_record(make_nonce(2)))
+    with pytest.raises(RuntimeError):
+        await buf.flush()
+    await buf.close()
+    assert nonce_filter.committed == [make_nonce(1)]
+    assert nonce_filter.rolled_back == [make_nonce(2)]
+
+
+@pytest.mark.asyncio
+async def test_ruyi_versions_are_counted_per_hour() -> None:
+    engine = FakeEngine()
+    t0 = datetime.datetime(2026, 1, 1, 12, 34, 56)
+    records = [
+        make_record(make_nonce(1))._replace(received_at=t0),
+        make_record(make_nonce(2))._replace(received_at=t0.replace(minute=59)),
+        make_record(make_nonce(3))._replace(received_at=t0.replace(hour=13)),
+        make_record(make_nonce(4))._replace(received_at=t0, ruyi_version="0.1.0"),
+    ]
+    async with engine.connect() as conn:
+        await write_upload_records(conn, records)  # type: ignore[arg-type]
+        await conn.commit()
+
+    version_counts = engine.commits[0][0][1]
+    assert version_counts == [
+        {"bucket": datetime.datetime(2026, 1, 1, 12), "version": "0.1.0", "count": 1},
+        {
+            "bucket": datetime.datetime(2026, 1, 1, 12),
+            "version": UPLOAD_PAYLOAD["ruyi_version"],
+            "count": 2,
+        },
+        {
+            "bucket": datetime.datetime(2026, 1, 1, 13),
+            "version": UPLOAD_PAYLOAD["ruyi_version"],
+            "count": 1,
+        },
+    ]
+
+
+@pytest.mark.asyncio
+async def test_unchanged_installation_infos_are_not_upserted_again() -> None:
+    engine = FakeEngine()
+    cache = LRUInstallationInfoCache(TelemetryInstallationCacheConfig(mode="lru"))
+    record = make_record(make_nonce(1))
+
+    engine.fail = True
+    with pytest.raises(RuntimeError):
+        await persist_upload_records(engine, [record], cache)  # type: ignore[arg-type]
+
+    # nothing got remembered for the failed transaction
+    engine.fail = False
+    await persist_upload_records(engine, [record], cache)  # type: ignore[arg-type]
+    await persist_upload_records(engine, [record], cache)  # type: ignore[arg-type]
+    assert [len(c) for c in engine.commits] == [3, 2]
+
+    changed = record._replace(installation_raw='{"v": 1}')
+    await persist_upload_records(engine, [changed], cache)  # type: ignore[arg-type]
+    assert engine.commits[2][1][1] == [
+        {"report_uuid": record.report_uuid, "raw": '{"v": 1}'},
+    ]
+
+    assert cache.stats.lookups == 4
+    assert cache.stats.unchanged == 1
+    assert cache.stats.changed == 3
+
+
+@pytest.mark.asyncio
+async def test_lru_installation_info_cache_forgets_after_ttl() -> None:
+    cache = LRUInstallationInfoCache(
+        TelemetryInstallationCacheConfig(mode="lru", lru_ttl_seconds=0),
+    )
+    ins_infos = {uuid.uuid4(): '{"v": 1}'}
+
+    await cache.remember(ins_infos)
+    assert await cache.filter_changed(ins_infos) == ins_infos
+
+
+def test_installation_info_cache_without_storage_cannot_be_created() -> None:
+    class IncompleteInstallationInfoCache(InstallationInfoCache):
+        async def _get(self, keys: list[uuid.UUID]) -> list[bytes | None]:
+            return [None] * len(keys)
+
+    with pytest.raises(TypeError):
+        IncompleteInstallationInfoCache(TelemetryInstallationCacheConfig())  # type: ignore[abstract]
+
+
+@pytest.mark.parametrize(
+    ("doc", "expected"),
+    [
+        ('{"installation": {"a": [1, "}"]}, "x": 1}', '{"a": [1, "}"]}'),
+        (' { "x" : {"installation": 1} ,"installation" :null } ', "null"),
+        ('{"installation": 1, "installation": "2"}', '"2"'),
+        ('{"x": 1}', None),
+        ("{}", None),
+    ],
+)
+def test_raw_json_member_returns_json_text_as_is(
+    doc: str,
+    expected: str | None,
+) -> None:
+    assert raw_json_member(doc, "installation") == expected
+
+
+@pytest.mark.parametrize("doc", ["[]", '{"x" 1}', '{"x": 1,}', '{"x": }', "{"])
+def test_raw_json_member_rejects_malformed_objects(doc: str) -> None:
+    with pytest.raises(ValueError):
+        raw_json_member(doc, "installation")
@@ -0,0 +1,484 @@
+import datetime
+import json
+import time
+from typing import Any
+from unittest.mock import ANY
+
+import pytest
+from pydantic import ValidationError
+
+from ruyi_backend.cache import KEY_TELEMETRY_COMMAND_TOTALS, KEY_TELEMETRY_INSTALLS
+from ruyi_backend.components.telemetry_processor import (
+    SQL_ADVANCE_PROCESSING_WATERMARK,
+    SQL_GET_LOCK,
+    SQL_INIT_PROCESSING_WATERMARK,
+    SQL_INSERT_INVALID_RAW_UPLOADS,
+    SQL_INSERT_PROCESSING_LEDGER,
+    SQL_RELEASE_LOCK,
+    SQL_SELECT_PARTITION_PROCESSED_UPTO,
+    SQL_SELECT_PROCESSED_CHAIN_END,
+    SQL_SELECT_PROCESSING_UPPER_ID,
+    SQL_SELECT_PROCESSING_WATERMARK,
+    SQL_SELECT_RAW_UPLOADS_BETWEEN,
+    BULK_UPSERT_AGGREGATED_EVENTS,
+    BULK_UPSERT_AGGREGATED_EVENT_ROLLUPS,
+    BULK_UPSERT_RISCV_MACHINE_INFOS,
+    InvalidPayload,
+    Partition,
+    PayloadValidator,
+    params_hash,
+    plan_partitions,
+    riscv_machine_fingerprint,
+    validate_payloads,
+    process_raw_uploads,
+    process_telemetry_data,
+)
+from ruyi_backend.components.telemetry_rollup import GRAIN_DAILY, GRAIN_MONTHLY
+from ruyi_backend.config.env import TelemetryProcessingConfig
+from ruyi_backend.schema.admin import ReqProcessTelemetry
+from ruyi_backend.schema.client_telemetry import RISCVMachineInfo, UploadPayload
+
+from .helpers import (
+    UPLOAD_PAYLOAD,
+    FakeCache,
+    FakeConnection,
+    FakeResult,
+    make_nonce,
+)
+
+
+class ProcessingConnection(FakeConnection):
+    def __init__(self, engine: "ProcessingEngine") -> None:
+        super().__init__(engine)
+        self.pending: list[tuple[Any, Any]] = []
+
+    async def execute(self, statement: Any, params: Any = None) -> FakeResult:
+        engine = self.engine
+        if statement is SQL_SELECT_PROCESSING_UPPER_ID:
+            engine.time_end = params["time_end"]
+            return FakeResult([(max(engine.ids),)] if engine.ids else [])
+        if statement is SQL_SELECT_PROCESSING_WATERMARK:
+            return FakeResult([(engine.watermark,)])
+        if statement is SQL_SELECT_PROCESSED_CHAIN_END:
+            chain_end = None
+            ends = dict(engine.ledger)
+            while (chain_end or engine.watermark) + 1 in ends:
+                chain_end = ends[(chain_end or engine.watermark) + 1]
+            return FakeResult([(chain_end,)])
+        if statement is SQL_GET_LOCK:
+            if params["lock"] in engine.locks:
+                return FakeResult([(0,)])
+            engine.locks.add(params["lock"])
+            return FakeResult([(1,)])
+        if statement is SQL_RELEASE_LOCK:
+            engine.locks.remove(params["lock"])
+            return FakeResult([(1,)])
+        if statement is SQL_SELECT_PARTITION_PROCESSED_UPTO:
+            ends = [
+                last
+                for first, last in engine.ledger
+                if first > params["part_start"] and last <= params["part_end"]
+            ]
+            return FakeResult([(max(ends, default=None),)])
+        if statement is SQL_SELECT_RAW_UPLOADS_BETWEEN:
+            engine.selects += 1
+            if params["last_id"] == engine.fail_at_id:
+                raise RuntimeError("DB is down")
+            return FakeResult(
+                [
+                    (
+                        id,
+                        datetime.datetime(2026, 5, 15),
+                        engine.raws.get(id, json.dumps(UPLOAD_PAYLOAD)),
+                    )
+                    for id in engine.ids
+                    if params["after_id"] < id <= params["last_id"]
+                ]
+            )
+
+        self.executions.append((str(statement), params))
+        self.pending.append((statement, params))
+        return FakeResult()
+
+    async def commit(self) -> None:
+        engine = self.engine
+        for statement, params in self.pending:
+            if statement is SQL_INIT_PROCESSING_WATERMARK and engine.watermark is None:
+                engine.watermark = 0
+            elif statement is SQL_ADVANCE_PROCESSING_WATERMARK:
+                engine.watermark = max(engine.watermark or 0, params["last_id"])
+            elif statement is SQL_INSERT_PROCESSING_LEDGER:
+                engine.ledger.append((params["first_id"], params["last_id"]))
+            elif statement is BULK_UPSERT_AGGREGATED_EVENTS.sql:
+                engine.events_counted += sum(p["count"] for p in params)
+            elif statement is SQL_INSERT_INVALID_RAW_UPLOADS:
+                engine.invalid.update((p["raw_upload_id"], p["error"]) for p in params)
+        self.pending = []
+
+    async def rollback(self) -> None:
+        self.pending = []
+
+
+class ProcessingEngine:
+    def __init__(self, ids: list[int]) -> None:
+        self.ids = sorted(ids)
+        self.raws: dict[int, str] = {}
+        self.invalid: dict[int, str] = {}
+        self.watermark: int | None = None
+        self.ledger: list[tuple[int, int]] = []
+        self.locks: set[str] = set()
+        self.events_counted = 0
+        self.selects = 0
+        self.fail_at_id: int | None = None
+        self.time_end: datetime.datetime | None = None
+
+    def connect(self) -> ProcessingConnection:
+        return ProcessingConnection(self)
+
+
+async def run(
+    engine: ProcessingEngine,
+    concurrency: int = 1,
+    cache: FakeCache | None = None,
+    time_end: datetime.datetime | None = None,
+) -> int:
+    return await process_raw_uploads(
+        engine,  # type: ignore[arg-type]
+        time_end or datetime.datetime.now(),
+        TelemetryProcessingConfig(chunk_size=3, concurrency=concurrency),
+        cache,  # type: ignore[arg-type]
+    )
+
+
+def test_plan_partitions_aligns_to_fixed_boundaries() -> None:
+    assert plan_partitions(4, 11, 3) == [
+        Partition(3, 6, 4, 6),
+        Partition(6, 9, 6, 9),
+        Partition(9, 12, 9, 11),
+    ]
+    assert plan_partitions(11, 11, 3) == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("concurrency", [1, 3])
+async def test_process_raw_uploads_commits_per_partition(concurrency: int) -> None:
+    # gaps in ids are fine
+    engine = ProcessingEngine([1, 2, 5, 6, 7, 10, 11])
+
+    assert await run(engine, concurrency) == 7
+    assert sorted(engine.ledger) == [(1, 3), (4, 6), (7, 9), (10, 11)]
+    assert engine.watermark == 11
+    assert not engine.locks
+
+    # nothing new to do
+    assert await run(engine, concurrency) == 0
+    assert engine.selects == 4
+
+
+@pytest.mark.asyncio
+async def test_process_raw_uploads_binds_time_end_as_local_time(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    engine = ProcessingEngine([1])
+    time_end = datetime.datetime(2026, 5, 16, tzinfo=datetime.timezone.utc)
+
+    monkeypatch.setenv("TZ", "Asia/Shanghai")
+    time.tzset()
+    try:
+        await run(engine, time_end=time_end)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    # the DB stores naive local times
+    assert engine.time_end == datetime.datetime(2026, 5, 16, 8)
+
+
+@pytest.mark.asyncio
+async def test_process_raw_uploads_skips_partitions_claimed_by_others() -> None:
+    engine = ProcessingEngine(list(range(1, 8)))
+    engine.locks.add("ruyi-backend:telemetry-processing:3")
+
+    assert await run(engine) == 4
+    assert engine.ledger == [(1, 3), (7, 7)]
+    # the watermark stops right before the partition being processed
+    assert engine.watermark == 3
+
+    engine.locks.clear()
+    assert await run(engine) == 3
+    assert engine.watermark == 7
+    assert engine.events_counted == 2 * 7
+
+
+@pytest.mark.asyncio
+async def test_process_raw_uploads_retries_crashed_run_idempotently() -> None:
+    engine = ProcessingEngine(list(range(1, 8)))
+    engine.fail_at_id = 6
+    with pytest.raises(RuntimeError):
+        await run(engine)
+    assert engine.watermark == 3
+    assert engine.ledger == [(1, 3)]
+    assert not engine.locks
+
+    engine.fail_at_id = None
+    assert await run(engine) == 4
+    assert engine.ledger == [(1, 3), (4, 6), (7, 7)]
+    # the two events of each upload, all counted exactly once
+    assert engine.events_counted == 2 * 7
+
+
+@pytest.mark.asyncio
+async def test_process_raw_uploads_skips_and_records_invalid_uploads() -> None:
+    engine = ProcessingEngine(list(range(1, 8)))
+    engine.raws[5] = json.dumps(UPLOAD_PAYLOAD | {"events": [{"kind": "x"}]})
+
+    assert await run(engine) == 7
+    # the partition with the invalid upload is not stuck
+    assert engine.watermark == 7
+    assert engine.ledger == [(1, 3), (4, 6), (7, 7)]
+    assert engine.events_counted == 2 * 6
+    assert list(engine.invalid) == [5]
+    assert "time_bucket" in engine.invalid[5]
+
+
+@pytest.mark.asyncio
+async def test_process_raw_uploads_counts_commands_once_committed() -> None:
+    engine = ProcessingEngine(list(range(1, 8)))
+    engine.fail_at_id = 6
+    cache = FakeCache()
+    with pytest.raises(RuntimeError):
+        await run(engine, cache=cache)
+    assert cache.values[KEY_TELEMETRY_COMMAND_TOTALS] == {"version": 3, "<bare>": 3}
+
+    engine.fail_at_id = None
+    assert await run(engine, cache=cache) == 4
+    assert cache.values[KEY_TELEMETRY_COMMAND_TOTALS] == {"version": 7, "<bare>": 7}
+    assert cache.values[KEY_TELEMETRY_INSTALLS] == {
+        UPLOAD_PAYLOAD["installation"]["report_uuid"]
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("processes", [0, 2])
+async def test_payload_validator(processes: int) -> None:
+    raws = [json.dumps(UPLOAD_PAYLOAD | {"nonce": f"{i:032x}"}) for i in range(5)]
+    # stored as a JSON string containing the payload
+    raws.append(json.dumps(json.dumps(UPLOAD_PAYLOAD)))
+    # invalid documents do not fail the others of their chunk
+    raws[1] = json.dumps(UPLOAD_PAYLOAD | {"events": [{"kind": "x"}]})
+    raws[4] = "{"
+
+    validator = PayloadValidator(processes, chunk_size=2)
+    try:
+        results = await validator.validate(raws)
+    finally:
+        validator.close()
+
+    assert [r.nonce if isinstance(r, UploadPayload) else r for r in results] == [
+        make_nonce(0),
+        InvalidPayload(ANY),
+        make_nonce(2),
+        make_nonce(3),
+        InvalidPayload(ANY),
+        UPLOAD_PAYLOAD["nonce"],
+    ]
+
+
+@pytest.mark.parametrize(
+    ("update", "error"),
+    [
+        (
+            {
+                "events": [
+                    {"time_bucket": "2" * 256, "kind": "x", "params": [], "count": 1}
+                ]
+            },
+            "time_bucket",
+        ),
+        (
+            {
+                "events": [
+                    {"time_bucket": "2026", "kind": "x", "params": [], "count": 1 << 63}
+                ]
+            },
+            "count",
+        ),
+        ({"installation": UPLOAD_PAYLOAD["installation"] | {"arch": "x" * 33}}, "arch"),
+        (
+            {
+                "installation": UPLOAD_PAYLOAD["installation"]
+                | {
+                    "riscv_machine": {
+                        "model_name": "Milk-V Pioneer",
+                        "cpu_count": 1 << 31,
+                        "isa": "rv64gc",
+                        "uarch": "c920",
+                        "uarch_csr": "unknown",
+                        "mmu": "sv39",
+                    }
+                }
+            },
+            "cpu_count",
+        ),
+    ],
+)
+def test_validate_payloads_rejects_values_not_fitting_columns(
+    update: dict[str, Any],
+    error: str,
+) -> None:
+    [result] = validate_payloads([json.dumps(UPLOAD_PAYLOAD | update)])
+    assert isinstance(result, InvalidPayload)
+    assert result.error.startswith(error)
+
+
+@pytest.mark.asyncio
+async def test_process_telemetry_data_counts_bare_report_uuids_as_active() -> None:
+    bare_uuid = "0f2a4d3c9b8e4f6a8d7c6b5a49382716"
+    payloads = [
+        UploadPayload.model_validate(UPLOAD_PAYLOAD),
+        UploadPayload.model_validate(
+            {k: v for k, v in UPLOAD_PAYLOAD.items() if k != "installation"}
+            | {"report_uuid": bare_uuid}
+        ),
+    ]
+    conn = ProcessingConnection(ProcessingEngine([]))
+
+    deltas = await process_telemetry_data(
+        conn,  # type: ignore[arg-type]
+        payloads,
+        [datetime.datetime(2026, 5, 15)] * 2,
+    )
+
+    assert deltas.active_installs == {
+        datetime.date(2026, 5, 15): {
+            UPLOAD_PAYLOAD["installation"]["report_uuid"],
+            bare_uuid,
+        }
+    }
+
+
+@pytest.mark.asyncio
+async def test_process_telemetry_data_sums_identical_events_across_uploads() -> None:
+    event = {
+        "time_bucket": "202604031223",
+        "kind": "cli:invocation-v1",
+        "params": [["key", "install"], ["arg", "gcc"]],
+        "count": 2,
+    }
+    payloads = [
+        UploadPayload.model_validate(UPLOAD_PAYLOAD | {"events": [event]}),
+        UploadPayload.model_validate(
+            UPLOAD_PAYLOAD | {"events": [event | {"count": 3}]},
+        ),
+        # params in another order make another row, as they always did
+        UploadPayload.model_validate(
+            UPLOAD_PAYLOAD
+            | {"events": [event | {"params": event["params"][::-1], "count": 7}]}
+        ),
+    ]
+    conn = ProcessingConnection(ProcessingEngine([]))
+
+    await process_telemetry_data(conn, payloads)  # type: ignore[arg-type]
+
+    rows = [
+        p for sql, p in conn.executions if sql == str(BULK_UPSERT_AGGREGATED_EVENTS.sql)
+    ]
+    reversed_kv_raw = '[["arg", "gcc"], ["key", "install"]]'
+    params_kv_raw = '[["key", "install"], ["arg", "gcc"]]'
+    assert rows == [
+        [
+            {
+                "time_bucket": "202604031223",
+                "kind": "cli:invocation-v1",
+                "params_kv_raw": reversed_kv_raw,
+                "params_hash": params_hash(reversed_kv_raw),
+                "command_key": "install",
+                "count": 7,
+            },
+            {
+                "time_bucket": "202604031223",
+                "kind": "cli:invocation-v1",
+                "params_kv_raw": params_kv_raw,
+                "params_hash": params_hash(params_kv_raw),
+                "command_key": "install",
+                "count": 5,
+            },
+        ]
+    ]
+
+
+@pytest.mark.asyncio
+async def test_process_telemetry_data_rolls_up_events_by_grain() -> None:
+    event = {
+        "kind": "cli:invocation-v1",
+        "params": [["key", "install"]],
+        "count": 1,
+    }
+    payload = UploadPayload.model_validate(
+        UPLOAD_PAYLOAD
+        | {
+            "events": [
+                event | {"time_bucket": "202604031223"},
+                event | {"time_bucket": "202604031224", "count": 2},
+                # arriving late
+                event | {"time_bucket": "202603311159", "count": 4},
+            ]
+        }
+    )
+    conn = ProcessingConnection(ProcessingEngine([]))
+
+    await process_telemetry_data(conn, [payload])  # type: ignore[arg-type]
+
+    def counts(grain: Any) -> dict[str, int]:
+        sql = str(BULK_UPSERT_AGGREGATED_EVENT_ROLLUPS[grain].sql)
+        [rows] = [p for s, p in conn.executions if s == sql]
+        return {row["time_bucket"]: row["count"] for row in rows}
+
+    assert counts(GRAIN_DAILY) == {"20260331": 4, "20260403": 3}
+    assert counts(GRAIN_MONTHLY) == {"202603": 4, "202604": 3}
+
+
+@pytest.mark.asyncio
+async def test_process_telemetry_data_counts_distinct_riscv_machines() -> None:
+    machine = {
+        "model_name": "Milk-V Pioneer",
+        "cpu_count": 64,
+        "isa": "rv64imafdcv",
+        "uarch": "thead,c920",
+        "uarch_csr": "5b7:0:0",
+        "mmu": "sv39",
+    }
+    installation = UPLOAD_PAYLOAD["installation"] | {"riscv_machine": machine}
+    payloads = [
+        UploadPayload.model_validate(UPLOAD_PAYLOAD | {"installation": inst})
+        for inst in [
+            installation,
+            installation,
+            installation | {"riscv_machine": machine | {"cpu_count": 32}},
+        ]
+    ]
+    t = [datetime.datetime(2026, 5, d) for d in (16, 14, 15)]
+    conn = ProcessingConnection(ProcessingEngine([]))
+
+    await process_telemetry_data(conn, payloads, t)  # type: ignore[arg-type]
+
+    [rows] = [
+        p
+        for sql, p in conn.executions
+        if sql == str(BULK_UPSERT_RISCV_MACHINE_INFOS.sql)
+    ]
+    by_fp = {row["fingerprint"]: row for row in rows}
+    assert len(by_fp) == 2
+
+    report_uuid = payloads[0].installation.report_uuid  # type: ignore[union-attr]
+    row = by_fp[riscv_machine_fingerprint(report_uuid, RISCVMachineInfo(**machine))]
+    assert (row["first_seen"], row["last_seen"], row["count"]) == (t[1], t[0], 2)
+
+
+def test_process_telemetry_request_refuses_time_start() -> None:
+    req = ReqProcessTelemetry.model_validate({"time_end": "2026-05-16T00:00:00"})
+    assert req.time_end == datetime.datetime(2026, 5, 16)
+
+    # processing resumes after the last processed upload; a start is not honored
+    with pytest.raises(ValidationError):
+        ReqProcessTelemetry.model_validate({"time_start": "2026-05-15T00:00:00"})
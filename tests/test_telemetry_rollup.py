@@ -0,0 +1,63 @@
+import datetime
+
+from ruyi_backend.components.telemetry_rollup import (
+    GRAIN_DAILY,
+    GRAIN_HOURLY,
+    GRAIN_MINUTE,
+    GRAIN_MONTHLY,
+    RollupRead,
+    plan_rollup_reads,
+    select_command_counts,
+)
+
+
+def test_plan_rollup_reads_uses_coarsest_grains() -> None:
+    start = datetime.datetime(2025, 11, 29, 22, 30)
+    end = datetime.datetime(2026, 3, 2, 1, 15)
+
+    assert plan_rollup_reads(start, end) == [
+        RollupRead(GRAIN_MINUTE, "202511292230", "202511292300"),
+        RollupRead(GRAIN_HOURLY, "2025112923", "2025113000"),
+        RollupRead(GRAIN_DAILY, "20251130", "20251201"),
+        RollupRead(GRAIN_MONTHLY, "202512", "202603"),
+        RollupRead(GRAIN_DAILY, "20260301", "20260302"),
+        RollupRead(GRAIN_HOURLY, "2026030200", "2026030201"),
+        RollupRead(GRAIN_MINUTE, "202603020100", "202603020115"),
+    ]
+
+
+def test_plan_rollup_reads_within_one_day_and_unbounded() -> None:
+    start = datetime.datetime(2026, 5, 15, 10)
+    end = datetime.datetime(2026, 5, 15, 12)
+
+    assert plan_rollup_reads(start, end) == [
+        RollupRead(GRAIN_HOURLY, "2026051510", "2026051512"),
+    ]
+    assert plan_rollup_reads(None, None) == [RollupRead(GRAIN_MONTHLY, "", None)]
+    assert plan_rollup_reads(None, end) == [
+        RollupRead(GRAIN_MONTHLY, "", "202605"),
+        RollupRead(GRAIN_DAILY, "20260501", "20260515"),
+        RollupRead(GRAIN_HOURLY, "2026051500", "2026051512"),
+    ]
+    assert plan_rollup_reads(end, start) == []
+
+
+def test_select_command_counts_of_all_time_reads_monthly_rollup() -> None:
+    sql = str(select_command_counts("cli:invocation-v1", limit=10))
+
+    assert "FROM telemetry_aggregated_events_monthly" in sql
+    assert "UNION" not in sql
+
+
+def test_select_command_counts_of_time_range_sums_reads_of_all_grains() -> None:
+    sql = str(
+        select_command_counts(
+            "cli:invocation-v1",
+            datetime.datetime(2026, 4, 30, 23),
+            datetime.datetime(2026, 6, 1),
+        )
+    )
+
+    assert "FROM telemetry_aggregated_events_hourly" in sql
+    assert "FROM telemetry_aggregated_events_monthly" in sql
+    assert "UNION ALL" in sql
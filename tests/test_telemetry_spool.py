@@ -0,0 +1,94 @@
+import errno
+import os
+from pathlib import Path
+
+import pytest
+
+from ruyi_backend.components.telemetry_spool import TelemetrySpool
+
+from .helpers import FakeEngine, make_nonce, make_record
+
+
+@pytest.mark.asyncio
+async def test_spool_appends_and_replays_segments(tmp_path: Path) -> None:
+    spool = TelemetrySpool(str(tmp_path), segment_max_bytes=1, fsync_interval=0)
+    spool.start()
+    await spool.append([make_record(make_nonce(1)), make_record(make_nonce(2))])
+    await spool.append([make_record(make_nonce(3))])
+
+    # every append went to a new segment, as each exceeds segment_max_bytes
+    assert spool.stats.segments == 2
+    assert spool.stats.appended == 3
+
+    engine = FakeEngine()
+    engine.fail = True
+    with pytest.raises(RuntimeError):
+        await spool.replay(engine, batch_size=10)  # type: ignore[arg-type]
+    assert spool.stats.segments == 2
+
+    engine.fail = False
+    assert await spool.replay(engine, batch_size=10) == 3  # type: ignore[arg-type]
+    raw_uploads = [c[-1][1] for c in engine.commits]
+    assert [[p["nonce"] for p in c] for c in raw_uploads] == [
+        [make_nonce(1), make_nonce(2)],
+        [make_nonce(3)],
+    ]
+    assert spool.stats.segments == 0
+    assert spool.stats.replayed == 3
+
+    await spool.close()
+
+
+@pytest.mark.asyncio
+async def test_spool_replay_stops_at_torn_tail(tmp_path: Path) -> None:
+    spool = TelemetrySpool(str(tmp_path), segment_max_bytes=1 << 20, fsync_interval=0)
+    spool.start()
+    record = make_record(make_nonce(1))
+    await spool.append([record, make_record(make_nonce(2))])
+    await spool.close()
+
+    # simulate a crash in the middle of writing the second record
+    (segment,) = tmp_path.iterdir()
+    size = segment.stat().st_size
+    os.truncate(segment, size - 10)
+
+    engine = FakeEngine()
+    assert await spool.replay(engine, batch_size=10) == 1  # type: ignore[arg-type]
+    assert engine.commits[0][-1][1][0]["nonce"] == make_nonce(1)
+    # the receive time survives the round trip
+    assert engine.commits[0][0][1][0]["bucket"] == record.received_at.replace(
+        minute=0, second=0, microsecond=0
+    )
+
+
+@pytest.mark.asyncio
+async def test_spool_append_failing_midway_leaves_no_torn_frame(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    spool = TelemetrySpool(str(tmp_path), segment_max_bytes=1 << 20, fsync_interval=0)
+    spool.start()
+    await spool.append([make_record(make_nonce(1))])
+
+    real_write = os.write
+
+    def write_then_fail(fd: int, data: bytes) -> int:
+        # the disk fills up after part of the frame is written
+        real_write(fd, data[: len(data) // 2])
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(os, "write", write_then_fail)
+    with pytest.raises(OSError):
+        await spool.append([make_record(make_nonce(2))])
+    monkeypatch.setattr(os, "write", real_write)
+
+    await spool.append([make_record(make_nonce(3))])
+    await spool.close()
+
+    engine = FakeEngine()
+    assert await spool.replay(engine, batch_size=10) == 2  # type: ignore[arg-type]
+    raw_uploads = [c[-1][1] for c in engine.commits]
+    assert [[p["nonce"] for p in c] for c in raw_uploads] == [
+        [make_nonce(1)],
+        [make_nonce(3)],
+    ]
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import logging
+from typing import Any
+
+import pytest
+
+from ruyi_backend.cache import KEY_TELEMETRY_UPLOAD_STREAM
+from ruyi_backend.components.telemetry_stream import (
+    STREAM_FIELD_PAYLOAD,
+    TelemetryStreamConsumer,
+    UploadStreamFullError,
+    enqueue_upload,
+)
+from ruyi_backend.config.env import TelemetryStreamConfig
+
+from .helpers import UPLOAD_PAYLOAD, FakeEngine, make_nonce
+
+
+class FakeStreamCache:
+    def __init__(self, entries: list[tuple[bytes, dict[bytes, bytes] | None]]) -> None:
+        self.entries = entries
+        self.acked: list[bytes] = []
+
+    async def xgroup_ensure(self, name: str, group: str) -> None:
+        assert name == KEY_TELEMETRY_UPLOAD_STREAM
+
+    async def xautoclaim(self, *_: Any, **__: Any) -> tuple[bytes, list[Any]]:
+        return b"0-0", []
+
+    async def xreadgroup(self, *_: Any, count: int, **__: Any) -> list[Any]:
+        batch, self.entries = self.entries[:count], self.entries[count:]
+        return batch
+
+    async def xack_and_delete(self, name: str, group: str, ids: list[bytes]) -> None:
+        self.acked.extend(ids)
+
+    async def xlen(self, name: str) -> int:
+        return len(self.entries)
+
+    async def xadd(
+        self,
+        name: str,
+        fields: dict[str, bytes],
+        maxlen: int | None = None,
+    ) -> bytes:
+        entry_id = f"{len(self.entries) + 1}-0".encode()
+        self.entries.append((entry_id, fields))
+        return entry_id
+
+
+def make_entry(entry_id: bytes, nonce: str) -> tuple[bytes, dict[bytes, bytes]]:
+    payload = json.dumps(UPLOAD_PAYLOAD | {"nonce": nonce}).encode()
+    return entry_id, {STREAM_FIELD_PAYLOAD.encode(): payload}
+
+
+@pytest.mark.asyncio
+async def test_stream_consumer_writes_batches_and_acks() -> None:
+    cache = FakeStreamCache(
+        [
+            make_entry(b"1-0", make_nonce(1)),
+            make_entry(b"2-0", make_nonce(2)),
+            (b"3-0", {b"payload": b"not json"}),
+            (b"4-0", None),
+            make_entry(b"5-0", make_nonce(3)),
+        ]
+    )
+    engine = FakeEngine()
+    consumer = TelemetryStreamConsumer(
+        logging.getLogger("test"),
+        cache,  # type: ignore[arg-type]
+        engine,  # type: ignore[arg-type]
+        TelemetryStreamConfig(batch_size=4),
+        "test-consumer",
+    )
+
+    assert await consumer.run(asyncio.Event(), drain=True) == 0
+
+    # malformed and deleted entries are acknowledged too
+    assert cache.acked == [b"1-0", b"2-0", b"3-0", b"4-0", b"5-0"]
+    assert consumer.uploads_written == 3
+    assert len(engine.commits) == 2
+    raw_uploads = engine.commits[0][-1][1]
+    assert [p["nonce"] for p in raw_uploads] == [make_nonce(1), make_nonce(2)]
+
+
+@pytest.mark.asyncio
+async def test_stream_consumer_leaves_entries_pending_on_db_failure() -> None:
+    cache = FakeStreamCache([make_entry(b"1-0", make_nonce(1))])
+    engine = FakeEngine()
+    engine.fail = True
+    consumer = TelemetryStreamConsumer(
+        logging.getLogger("test"),
+        cache,  # type: ignore[arg-type]
+        engine,  # type: ignore[arg-type]
+        TelemetryStreamConfig(),
+        "test-consumer",
+    )
+
+    with pytest.raises(RuntimeError):
+        await consumer.consume(await cache.xreadgroup(count=10))
+    assert cache.acked == []
+
+
+@pytest.mark.asyncio
+async def test_enqueue_upload_refuses_uploads_beyond_max_len() -> None:
+    cache = FakeStreamCache([])
+    payload = json.dumps(UPLOAD_PAYLOAD).encode()
+
+    await enqueue_upload(cache, payload, 2)  # type: ignore[arg-type]
+    await enqueue_upload(cache, payload, 2)  # type: ignore[arg-type]
+    with pytest.raises(UploadStreamFullError):
+        await enqueue_upload(cache, payload, 2)  # type: ignore[arg-type]
+    assert len(cache.entries) == 2
+
+    # room is made as the consumers catch up
+    cache.entries.pop(0)
+    await enqueue_upload(cache, payload, 2)  # type: ignore[arg-type]
+    assert len(cache.entries) == 2